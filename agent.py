@@ -1,18 +1,34 @@
+import asyncio
 import logging
 import os
-import feedparser
-import requests
-from datetime import datetime
+import time
 from livekit.agents import (
     Agent,
     AgentSession,
     JobContext,
+    JobProcess,
     RoomInputOptions,
+    RunContext,
     WorkerOptions,
     cli,
+    function_tool,
 )
 from livekit.plugins import google
 
+import async_mongodb_client
+import metrics
+import modal_vocab_client
+import vocab_snapshot
+from feed_store import get_feed_store
+from lesson_pool import LessonPool
+from lesson_templates import render_lesson_prompt, render_session_instructions
+from news_cache import get_news_cache
+from news_fetcher import get_news_fetcher
+from session_events import SessionEventLog, get_session_event_log
+from session_vocabulary import SessionVocabulary, format_word_line
+from vocab_cache import AsyncCachedVocabularyClient
+from vocab_writeback import WriteBehindBuffer
+
 # ========== ЛОГИРОВАНИЕ ==========
 logging.basicConfig(
     level=logging.INFO,
@@ -29,183 +45,174 @@ if not google_api_key:
 
 logger.info("Google API Key found")
 
-# ========== N8N WEBHOOK CONFIGURATION ==========
-N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL", "http://localhost:5678/webhook/get-news")
+# Время на прогрев пула уроков в prewarm (должно быть меньше
+# WorkerOptions.initialize_process_timeout, по умолчанию 10 секунд)
+PREWARM_DEADLINE = float(os.getenv("PREWARM_DEADLINE", "5"))
 
-# ========== RSS ИСТОЧНИКИ ==========
-RSS_FEEDS = [
-    "https://techcrunch.com/feed/",  # Technology news
-    "http://feeds.bbci.co.uk/news/technology/rss.xml",  # BBC Tech
-    "https://www.theverge.com/rss/index.xml",  # The Verge
-]
+# Словарь: "mongodb" — напрямую в MongoDB (асинхронный клиент Motor),
+# "snapshot" — весь словарь в памяти процесса с синхронизацией из MongoDB,
+# "modal" — через Modal vocabulary API
+VOCABULARY_BACKEND = os.getenv("VOCABULARY_BACKEND", "mongodb")
 
-# ========== ФУНКЦИЯ ПОЛУЧЕНИЯ НОВОСТЕЙ ==========
-def fetch_latest_news(feed_url: str = None) -> dict:
-    """
-    Получает последнюю новость из RSS фида
-
-    Returns:
-        dict: {
-            'title': str,
-            'summary': str,
-            'link': str,
-            'published': str
-        }
-    """
-    if feed_url is None:
-        feed_url = RSS_FEEDS[0]  # По умолчанию TechCrunch
 
-    try:
-        logger.info(f"Fetching news from: {feed_url}")
-        feed = feedparser.parse(feed_url)
+def get_vocabulary_client():
+    """Клиент словаря выбранного бэкенда (общий на процесс)"""
+    if VOCABULARY_BACKEND == "modal":
+        return modal_vocab_client.get_vocabulary_client()
+    if VOCABULARY_BACKEND == "snapshot":
+        return vocab_snapshot.get_snapshot_client()
+    return async_mongodb_client.get_vocabulary_client()
 
-        if not feed.entries:
-            logger.warning("No entries found in RSS feed")
-            return None
 
-        # Берем первую (самую свежую) новость
-        entry = feed.entries[0]
+async def close_vocabulary_client(vocabulary):
+    """Закрыть соединения словаря, привязанные к текущему event loop"""
+    if isinstance(vocabulary, AsyncCachedVocabularyClient):
+        await vocabulary.close()
 
-        news = {
-            'title': entry.get('title', 'No title'),
-            'summary': entry.get('summary', entry.get('description', 'No summary')),
-            'link': entry.get('link', ''),
-            'published': entry.get('published', 'Unknown date')
-        }
+# ========== GEMINI AGENT CLASS ==========
+def build_realtime_model() -> google.beta.realtime.RealtimeModel:
+    """Конфигурация Gemini Realtime Model (создаётся один раз на процесс в prewarm)"""
+    return google.beta.realtime.RealtimeModel(
+        model="gemini-live-2.5-flash-preview",
+        voice="Aoede",
+        temperature=0.7,
+        api_key=google_api_key,
+    )
 
-        logger.info(f"Got news: {news['title'][:50]}...")
-        return news
 
-    except Exception as e:
-        logger.error(f"Failed to fetch RSS: {e}")
-        return None
+class EnglishTutorAgent(Agent):
+    """Голосовой репетитор английского на базе Google Gemini Realtime Model"""
 
-def fetch_news_from_n8n() -> dict:
+    def __init__(
+        self,
+        instructions: str = None,
+        llm: google.beta.realtime.RealtimeModel = None,
+        vocabulary: SessionVocabulary = None,
+        trained_words: WriteBehindBuffer = None,
+    ) -> None:
+        super().__init__(
+            instructions=instructions or render_lesson_prompt(None).instructions,
+            llm=llm or build_realtime_model(),
+        )
+        # Слова сессии в памяти: инструменты ниже не делают сетевых запросов
+        self.vocabulary = vocabulary or SessionVocabulary([])
+        # Отработанные слова записываются в словарь как повторения (SM-2) пачками в фоне
+        self.trained_words = trained_words
+        logger.info(f"EnglishTutorAgent initialized ({len(self.vocabulary)} target words)")
+
+    @function_tool()
+    async def lookup_word(self, context: RunContext, word: str) -> str:
+        """Look up a target word of today's lesson: its pronunciation and Russian translation.
+
+        Args:
+            word: The English word to look up
+        """
+        word_data = self.vocabulary.lookup(word)
+        if word_data is None:
+            return f"'{word}' is not in today's word list."
+        return format_word_line(word_data)
+
+    @function_tool()
+    async def mark_word_practiced(self, context: RunContext, word: str) -> str:
+        """Record that the user has correctly used a target word of today's lesson.
+
+        Args:
+            word: The English word the user used correctly
+        """
+        if not self.vocabulary.mark_practiced(word):
+            return f"'{word}' is not in today's word list."
+        if self.trained_words is not None:
+            self.trained_words.record(self.vocabulary.lookup(word)["word"])
+        remaining = self.vocabulary.remaining()
+        if not remaining:
+            return "Great, all target words are practiced."
+        return f"Recorded. Words left to practice: {', '.join(remaining)}."
+
+# ========== PREWARM ==========
+def prewarm(proc: JobProcess):
     """
-    Получает случайную обработанную новость из N8N webhook
+    Загружает общие ресурсы один раз на процесс, до назначения задачи
 
-    Returns:
-        dict: News object или None если ошибка
+    LiveKit держит пул прогретых процессов, поэтому эта работа не попадает
+    на критический путь подключения к комнате.
     """
-    try:
-        logger.info(f"Fetching news from N8N webhook: {N8N_WEBHOOK_URL}")
-        response = requests.get(N8N_WEBHOOK_URL, timeout=10)
+    proc.userdata["realtime_model"] = build_realtime_model()
+    proc.userdata["news_cache"] = get_news_cache()
+    proc.userdata["news_fetcher"] = get_news_fetcher()
+    proc.userdata["vocabulary"] = get_vocabulary_client()
+    proc.userdata["session_events"] = get_session_event_log()
+    proc.userdata["trained_words"] = WriteBehindBuffer(proc.userdata["vocabulary"].review_words)
+    proc.userdata["lesson_pool"] = LessonPool(
+        proc.userdata["news_fetcher"],
+        proc.userdata["vocabulary"],
+    )
 
-        if response.status_code == 200:
-            news = response.json()
+    # Кэш новостей, хранилище фидов и подборка сервиса новостей читаются с диска здесь,
+    # а не в первой сессии
+    proc.userdata["news_cache"].load()
+    get_feed_store().load()
+    if proc.userdata["news_fetcher"].service is not None:
+        proc.userdata["news_fetcher"].service.load()
+    if isinstance(proc.userdata["vocabulary"], vocab_snapshot.SnapshotVocabularyClient):
+        proc.userdata["vocabulary"].load()
 
-            # Проверка на ошибку от N8N
-            if news.get('error') or news.get('fallback'):
-                logger.warning(f"N8N returned error: {news.get('error', 'No news available')}")
-                return None
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Event loop задачи ещё не создан — собираем уроки во временном
+        asyncio.run(_warm_lesson_pool(
+            proc.userdata["lesson_pool"],
+            proc.userdata["news_fetcher"],
+            proc.userdata["vocabulary"],
+        ))
 
-            logger.info(f"Got news from N8N: {news.get('title', '')[:50]}...")
-            return news
-        else:
-            logger.error(f"N8N webhook failed: HTTP {response.status_code}")
-            return None
-
-    except requests.exceptions.Timeout:
-        logger.error("N8N webhook timeout")
-        return None
-    except requests.exceptions.ConnectionError:
-        logger.error("Cannot connect to N8N webhook (N8N may not be ready yet)")
-        return None
-    except Exception as e:
-        logger.error(f"Failed to fetch from N8N: {e}")
-        return None
+    render_lesson_prompt(None)
 
-def format_lesson_from_news(news: dict) -> str:
-    """
-    Форматирует новость в текст урока
-    """
-    if not news:
-        # Fallback на hardcoded текст
-        return """
-Welcome to your English practice.
-Today's topic is Artificial Intelligence.
-AI is rapidly transforming the modern workplace.
-Instead of replacing jobs, experts suggest AI will augment human capabilities.
-I am ready to discuss this with you. What do you think?
-"""
-
-    # Очищаем HTML теги из summary (feedparser может оставлять их)
-    import re
-    summary = re.sub(r'<[^>]+>', '', news['summary'])
-
-    # Ограничиваем длину summary (макс 500 символов)
-    if len(summary) > 500:
-        summary = summary[:500] + "..."
-
-    lesson_text = f"""
-Welcome to your English practice.
-
-Today's news: {news['title']}
-
-{summary}
-
-I am ready to discuss this article with you. What are your thoughts on this topic?
-"""
-    return lesson_text
-
-# ========== HARDCODED ТЕКСТ УРОКА (FALLBACK) ==========
-LESSON_TEXT = """
-Welcome to your English practice.
-Today's topic is Artificial Intelligence.
-AI is rapidly transforming the modern workplace.
-Instead of replacing jobs, experts suggest AI will augment human capabilities.
-I am ready to discuss this with you. What do you think?
-"""
-
-# ========== СИСТЕМНЫЙ ПРОМПТ ==========
-AGENT_INSTRUCTION = f"""
-You are an English Tutor with video capability.
-Your task is to read the lesson text below to the user clearly and slowly.
-
-LESSON TEXT:
-"{LESSON_TEXT.strip()}"
-
-After reading, engage in a conversation about it.
-Correct the user if they make grammar mistakes.
-Keep responses conversational and natural for voice interaction.
-Speak clearly and at a moderate pace suitable for English learners.
-
-You can see and analyze video/images when users share their screen or camera.
-If you see anything on video, acknowledge it and use it in conversation.
-"""
-
-SESSION_INSTRUCTION = """
-Greet the user warmly.
-Tell them you're ready to help them practice English.
-Then read the lesson text about AI in the workplace.
-After that, ask them what they think about the topic.
-"""
+    logger.info("Worker process prewarmed")
 
-# ========== GEMINI AGENT CLASS ==========
-class EnglishTutorAgent(Agent):
-    """Голосовой репетитор английского на базе Google Gemini Realtime Model"""
 
-    def __init__(self) -> None:
-        super().__init__(
-            instructions=AGENT_INSTRUCTION,
-            llm=google.beta.realtime.RealtimeModel(
-                model="gemini-live-2.5-flash-preview",
-                voice="Aoede",
-                temperature=0.7,
-                api_key=google_api_key,
-            ),
-        )
-        logger.info("EnglishTutorAgent initialized")
+async def _warm_lesson_pool(lesson_pool: LessonPool, news_fetcher, vocabulary):
+    """Собирает уроки (и прогревает кэш новостей) до первой сессии"""
+    try:
+        async with asyncio.timeout(PREWARM_DEADLINE):
+            await lesson_pool.fill()
+    except TimeoutError:
+        logger.warning(f"Lesson pool prewarm exceeded {PREWARM_DEADLINE:.1f}s ({len(lesson_pool)} ready)")
+    finally:
+        # HTTP сессия и клиент MongoDB привязаны к временному loop — закрываем их вместе с ним
+        await news_fetcher.close()
+        await close_vocabulary_client(vocabulary)
+
+
+def _process_resource(ctx: JobContext, key: str, factory):
+    """Ресурс из prewarm или созданный на месте, если prewarm не выполнялся"""
+    resource = ctx.proc.userdata.get(key)
+    if resource is None:
+        resource = ctx.proc.userdata[key] = factory()
+    return resource
 
 # ========== ОБРАБОТЧИКИ СОБЫТИЙ ==========
-def setup_session_events(session: AgentSession):
-    """Мониторинг работы агента"""
+def setup_session_events(session: AgentSession, events: SessionEventLog = None, **context):
+    """
+    Мониторинг работы агента
+
+    Полные транскрипты и реплики уходят в журнал событий (без I/O в обработчике);
+    без журнала — как раньше, в лог.
+
+    Args:
+        events: Журнал событий сессий (None — только лог)
+        context: Поля, добавляемые к каждому событию (room, job_id)
+    """
 
     @session.on("user_input_transcribed")
     def on_user_transcribed(event):
         transcript = getattr(event, 'transcript', '')
         is_final = getattr(event, 'is_final', False)
-        if is_final:
+        if not is_final:
+            return
+        if events is not None:
+            events.record("user_input_transcribed", transcript=transcript, **context)
+        else:
             logger.info(f"👤 USER: {transcript}")
 
     @session.on("conversation_item_added")
@@ -214,12 +221,18 @@ def setup_session_events(session: AgentSession):
         if item:
             role = getattr(item, 'role', 'unknown')
             content = getattr(item, 'text_content', '')
-            if content:
+            if not content:
+                return
+            if events is not None:
+                events.record("conversation_item_added", role=role, content=content, **context)
+            else:
                 logger.info(f"💬 {role.upper()}: {content[:100]}...")
 
     @session.on("error")
     def on_error(event):
         error = getattr(event, 'error', str(event))
+        if events is not None:
+            events.record("error", error=str(error), **context)
         logger.error(f"ERROR: {error}")
 
     logger.info("Event handlers configured")
@@ -228,70 +241,100 @@ def setup_session_events(session: AgentSession):
 async def entrypoint(ctx: JobContext):
     """Точка входа агента"""
     logger.info("Starting English Tutor Agent")
+    started = time.perf_counter()
+    # Длительность этапов старта и fallback'и; снимок метрик процесса
+    # собирает основной процесс воркера для /metrics
+    session_metrics = metrics.get_metrics()
+    session_metrics.inc("tutor_sessions_total")
+    ctx.add_shutdown_callback(session_metrics.flush)
+
+    # Сервис новостей (или N8N) → прямой RSS, без блокировки event loop и с общим
+    # дедлайном. Новости берутся из памяти процесса, источники обновляются в фоне
+    news_cache = _process_resource(ctx, "news_cache", get_news_cache)
+    news_cache.ensure_refresher()
+    news_fetcher = _process_resource(ctx, "news_fetcher", get_news_fetcher)
+    if news_fetcher.service is not None:
+        news_fetcher.service.ensure_scheduler()
+        ctx.add_shutdown_callback(news_fetcher.service.stop_scheduler)
+    lesson_pool = _process_resource(
+        ctx, "lesson_pool", lambda: LessonPool(news_fetcher, get_vocabulary_client())
+    )
+    ctx.add_shutdown_callback(lesson_pool.stop)
+    ctx.add_shutdown_callback(news_cache.stop_refresher)
+    ctx.add_shutdown_callback(news_fetcher.close)
+
+    # Урок собран заранее в фоне; на критическом пути — только если пул пуст
+    lesson = lesson_pool.lease()
+    session_metrics.inc("tutor_lesson_pool_total", result="hit" if lesson else "miss")
+    if lesson is None:
+        logger.info("Lesson pool empty, building lesson for this session")
+        lesson = await lesson_pool.build_lesson()
+    prompt = lesson.prompt
+    logger.info(f"📊 Lesson pool: {lesson_pool.stats()}, news cache: {news_cache.stats()}")
+
+    # Слова урока загружены одним запросом вместе с уроком и дальше живут в сессии
+    session_vocabulary = SessionVocabulary(lesson.words)
+    vocabulary_client = _process_resource(ctx, "vocabulary", get_vocabulary_client)
+    # Write-behind: инструмент только кладёт слово в буфер, повторения (SM-2)
+    # пишутся в словарь одной пачкой по размеру/таймеру и обязательно при завершении задачи
+    trained_words = _process_resource(
+        ctx, "trained_words", lambda: WriteBehindBuffer(vocabulary_client.review_words)
+    )
+    trained_words.start()
+    ctx.add_shutdown_callback(trained_words.stop)
 
-    # Пытаемся получить новость из N8N сначала
-    news = fetch_news_from_n8n()
-
-    # Если N8N не ответил, используем прямой RSS парсинг
-    if not news:
-        logger.info("Falling back to direct RSS fetch")
-        news = fetch_latest_news()
-
-    lesson_text = format_lesson_from_news(news)
-
-    # Создаем кастомный промпт с новостью
-    custom_instruction = f"""
-You are an English Tutor with video capability.
-Your task is to read the lesson text below to the user clearly and slowly.
-
-LESSON TEXT:
-"{lesson_text.strip()}"
-
-After reading, engage in a conversation about it.
-Correct the user if they make grammar mistakes.
-Keep responses conversational and natural for voice interaction.
-Speak clearly and at a moderate pace suitable for English learners.
+    async def close_vocabulary():
+        await close_vocabulary_client(vocabulary_client)
 
-You can see and analyze video/images when users share their screen or camera.
-If you see anything on video, acknowledge it and use it in conversation.
-"""
+    ctx.add_shutdown_callback(close_vocabulary)
 
-    custom_session_instruction = """
-Greet the user warmly.
-Tell them you're ready to help them practice English.
-Then read today's news article to them.
-After that, ask them what they think about the topic.
-"""
+    agent = EnglishTutorAgent(
+        instructions=render_session_instructions(prompt, session_vocabulary.words),
+        llm=_process_resource(ctx, "realtime_model", build_realtime_model),
+        vocabulary=session_vocabulary,
+        trained_words=trained_words,
+    )
 
-    # Создаем агента с кастомными инструкциями
-    agent = EnglishTutorAgent()
-    agent._instructions = custom_instruction  # Обновляем инструкции для этой сессии
+    # Журнал событий: обработчики только кладут событие в очередь, запись — в фоне
+    session_events = _process_resource(ctx, "session_events", get_session_event_log)
+    if session_events is not None:
+        session_events.start()
+        ctx.add_shutdown_callback(session_events.stop)
 
     session = AgentSession()
-    setup_session_events(session)
-
-    await session.start(
-        room=ctx.room,
-        agent=agent,
-        room_input_options=RoomInputOptions(
-            video_enabled=True,
-        ),
-    )
+    setup_session_events(session, session_events, room=ctx.job.room.name, job_id=ctx.job.id)
+
+    with session_metrics.timer(stage="session_start"):
+        await session.start(
+            room=ctx.room,
+            agent=agent,
+            room_input_options=RoomInputOptions(
+                video_enabled=True,
+            ),
+        )
 
-    await ctx.connect()
+    with session_metrics.timer(stage="connect"):
+        await ctx.connect()
     logger.info("Agent connected to LiveKit room")
 
     try:
-        await session.generate_reply(instructions=custom_session_instruction)
+        with session_metrics.timer(stage="greeting"):
+            await session.generate_reply(instructions=prompt.session_instruction)
+        session_metrics.observe("tutor_time_to_greeting_seconds", time.perf_counter() - started)
         logger.info("Initial greeting delivered")
     except Exception as e:
+        session_metrics.inc("tutor_greeting_failures_total")
         logger.warning(f"Greeting failed: {e}")
 
+    await session_metrics.flush()
     logger.info("Agent ready")
 
 # ========== MAIN ==========
 if __name__ == "__main__":
+    # /metrics на порту health check (снимки процессов задач суммируются)
+    metrics.setup_worker_metrics()
     cli.run_app(WorkerOptions(
         entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
         port=7860  # Hugging Face Spaces health check port
     ))
@@ -0,0 +1,458 @@
+"""
+Асинхронный MongoDB клиент словаря (Motor)
+
+Тот же API, что у VocabularyClient, но методы — корутины и не блокируют
+event loop агента. Пул соединений и таймауты заданы явно; клиент Motor
+создаётся лениво внутри event loop, в котором используется, и закрывается
+вместе с задачей.
+"""
+import asyncio
+import logging
+import os
+import weakref
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
+
+import mongodb_indexes
+import spaced_repetition
+import vocab_queries
+import vocab_sampling
+import vocab_stats
+from mongodb_client import MONGODB_COLLECTION, MONGODB_DB, MONGODB_URI
+from session_vocabulary import format_word_for_lesson
+from vocab_cache import AsyncCachedVocabularyClient
+
+logger = logging.getLogger(__name__)
+
+# ========== POOL CONFIGURATION ==========
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "10"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "1"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "2000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "2000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "5000"))
+
+
+class AsyncVocabularyClient:
+    """Асинхронный клиент словаря в MongoDB"""
+
+    def __init__(self, uri: Optional[str] = MONGODB_URI):
+        self.uri = uri
+        # Позиция обхода не тренированных слов по кругу (ключ rand)
+        self._untrained_after = vocab_sampling.random_key()
+        # Клиент Motor привязан к event loop, в котором создан
+        self._clients = weakref.WeakKeyDictionary()
+
+        if not self.uri:
+            logger.warning("⚠️ MONGODB_URI not set, vocabulary features disabled")
+
+    def is_connected(self) -> bool:
+        """Настроено ли подключение к MongoDB (без сетевого запроса)"""
+        return bool(self.uri)
+
+    def _get_client(self) -> AsyncIOMotorClient:
+        """Клиент Motor для текущего event loop"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = AsyncIOMotorClient(
+                self.uri,
+                maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                minPoolSize=MONGODB_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+                serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+                io_loop=loop,
+            )
+            logger.info(f"✅ Motor client created: {MONGODB_DB}.{MONGODB_COLLECTION}")
+        return client
+
+    @property
+    def collection(self):
+        """Коллекция словаря (клиент текущего event loop)"""
+        return self._get_client()[MONGODB_DB][MONGODB_COLLECTION]
+
+    @property
+    def stats_collection(self):
+        """Коллекция счётчиков словаря (см. vocab_stats)"""
+        return self._get_client()[MONGODB_DB][vocab_stats.MONGODB_STATS_COLLECTION]
+
+    async def get_random_words(self, count: int = 5, trained: bool = False) -> List[Dict]:
+        """
+        Получить случайные слова из словаря
+
+        Args:
+            count: Количество слов
+            trained: Только тренированные слова (traini=True)
+
+        Returns:
+            List[Dict]: Список словарей со словами
+        """
+        if not self.is_connected() or count < 1:
+            return []
+
+        try:
+            query = vocab_queries.random_query(trained)
+            collection = self.collection
+            found = {}
+            for _ in range(vocab_sampling.SAMPLE_MAX_ROUNDS):
+                missing = count - len(found)
+                if missing <= 0:
+                    break
+                cursor = collection.aggregate(vocab_sampling.sample_pipeline(query, missing))
+                vocab_sampling.merge_unique(found, await cursor.to_list(length=missing))
+            words = list(found.values())[:count]
+
+            logger.info(f"📚 Retrieved {len(words)} words from MongoDB")
+            return words
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get random words: {e}")
+            return []
+
+    async def get_untrained_words(self, count: int = 10) -> List[Dict]:
+        """Получить не тренированные слова (traini=False), обходя словарь по кругу"""
+        if not self.is_connected():
+            return []
+
+        try:
+            collection = self.collection
+            after_cursor, wrapped = vocab_sampling.rotation_queries(vocab_queries.UNTRAINED_QUERY, self._untrained_after)
+            words = await collection.find(after_cursor).sort(
+                vocab_sampling.RANDOM_FIELD, 1
+            ).limit(count).to_list(length=count)
+            if len(words) < count:
+                missing = count - len(words)
+                words += await collection.find(wrapped).sort(
+                    vocab_sampling.RANDOM_FIELD, 1
+                ).limit(missing).to_list(length=missing)
+            if words:
+                self._untrained_after = words[-1][vocab_sampling.RANDOM_FIELD]
+            else:
+                # Ключи rand ещё не выданы (нет миграции) — первые слова как раньше
+                words = await collection.find(vocab_queries.UNTRAINED_QUERY).limit(count).to_list(length=count)
+
+            logger.info(f"📖 Retrieved {len(words)} untrained words")
+            return words
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get untrained words: {e}")
+            return []
+
+    async def get_due_words(self, count: int = 5) -> List[Dict]:
+        """Получить слова, которые пора повторить (по индексу due)"""
+        if not self.is_connected():
+            return []
+
+        try:
+            words = await self.collection.find(
+                spaced_repetition.due_query(datetime.utcnow())
+            ).sort(spaced_repetition.DUE_FIELD, 1).limit(count).to_list(length=count)
+
+            logger.info(f"🗓 Retrieved {len(words)} due words")
+            return words
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get due words: {e}")
+            return []
+
+    async def review_words(
+        self,
+        words: List[str],
+        quality: int = spaced_repetition.SRS_PRACTICED_QUALITY,
+        reviewed_at: Optional[Dict[str, datetime]] = None,
+    ) -> bool:
+        """
+        Записать повторение пачки слов (SM-2): один find и один bulk_write
+
+        Args:
+            reviewed_at: Время практики по словам (UTC); по умолчанию — сейчас
+
+        Returns:
+            bool: Выполнена ли запись (не найденные слова не считаются ошибкой)
+        """
+        if not words:
+            return True
+        if not self.is_connected():
+            return False
+
+        try:
+            now = datetime.utcnow()
+            collection = self.collection
+            documents = await collection.find(
+                vocab_queries.words_query(words), spaced_repetition.REVIEW_PROJECTION
+            ).to_list(length=len(words))
+            repeats, first_reviews = spaced_repetition.review_operations(
+                documents, quality, now, reviewed_at
+            )
+            if repeats:
+                await collection.bulk_write(repeats, ordered=False)
+            newly_trained = 0
+            if first_reviews:
+                # Считаем только совпавшие записи: слово мог уже отметить другой процесс
+                newly_trained = (await collection.bulk_write(first_reviews, ordered=False)).matched_count
+            if newly_trained:
+                await self._increment_stats(trained=newly_trained)
+            logger.info(f"🗓 Reviewed {len(repeats) + len(first_reviews)} words ({newly_trained} new)")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Failed to review words: {e}")
+            return False
+
+    async def mark_word_as_trained(self, word: str) -> bool:
+        """
+        Отметить слово как тренированное
+
+        Returns:
+            bool: Успешно ли обновлено
+        """
+        if not self.is_connected():
+            return False
+
+        try:
+            now = datetime.utcnow()
+            # Переход в traini=True учитывается в счётчиках, повторная тренировка — нет
+            result = await self.collection.update_one(
+                vocab_queries.word_untrained_query(word),
+                vocab_queries.mark_trained_update(now)
+            )
+            if result.modified_count > 0:
+                await self._increment_stats(trained=1)
+            else:
+                result = await self.collection.update_one(
+                    vocab_queries.word_query(word),
+                    vocab_queries.retrain_update(now)
+                )
+
+            if result.modified_count > 0:
+                logger.info(f"✅ Marked word '{word}' as trained")
+                return True
+            logger.warning(f"⚠️ Word '{word}' not found or already trained")
+            return False
+
+        except Exception as e:
+            logger.error(f"❌ Failed to mark word as trained: {e}")
+            return False
+
+    async def mark_words_as_trained(self, words: List[str]) -> bool:
+        """
+        Отметить несколько слов как тренированные (два update_many на пачку)
+
+        Returns:
+            bool: Выполнена ли запись (не найденные слова не считаются ошибкой)
+        """
+        if not words:
+            return True
+        if not self.is_connected():
+            return False
+
+        try:
+            now = datetime.utcnow()
+            await self.collection.update_many(
+                vocab_queries.words_trained_query(words),
+                vocab_queries.retrain_update(now)
+            )
+            result = await self.collection.update_many(
+                vocab_queries.words_untrained_query(words),
+                vocab_queries.mark_trained_update(now)
+            )
+            if result.modified_count:
+                await self._increment_stats(trained=result.modified_count)
+            logger.info(f"✅ Marked {len(words)} words as trained ({result.modified_count} new)")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Failed to mark words as trained: {e}")
+            return False
+
+    async def add_word(self, word: str, translate: str = "", transcript: str = "") -> bool:
+        """
+        Добавить слово в словарь (не тренированным)
+
+        Returns:
+            bool: True, если слово добавлено (False — уже есть или ошибка)
+        """
+        if not self.is_connected():
+            return False
+
+        try:
+            await self.collection.insert_one({
+                "word": word,
+                "translate": translate,
+                "transcript": transcript,
+                "traini": False,
+                "trainDate": None,
+                vocab_sampling.RANDOM_FIELD: vocab_sampling.random_key(),
+            })
+            await self._increment_stats(total=1)
+            logger.info(f"➕ Added word '{word}'")
+            return True
+
+        except DuplicateKeyError:
+            logger.warning(f"⚠️ Word '{word}' already in vocabulary")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Failed to add word: {e}")
+            return False
+
+    async def ensure_indexes(self) -> bool:
+        """
+        Миграции, индексы и проверка планов запросов (см. mongodb_indexes)
+
+        Миграции и explain написаны на pymongo, поэтому выполняются
+        в отдельном потоке через синхронное соединение.
+
+        Returns:
+            bool: Индексы на месте и ни один запрос не делает COLLSCAN
+        """
+        if not self.is_connected():
+            return False
+
+        def prepare() -> bool:
+            client = MongoClient(self.uri)
+            try:
+                return mongodb_indexes.prepare_collection(client[MONGODB_DB][MONGODB_COLLECTION])
+            finally:
+                client.close()
+
+        try:
+            return await asyncio.to_thread(prepare)
+        except Exception as e:
+            logger.error(f"❌ Failed to ensure indexes: {e}")
+            return False
+
+    async def search_word(self, word: str) -> Optional[Dict]:
+        """
+        Найти слово в словаре
+
+        Returns:
+            Optional[Dict]: Словарь с данными слова или None
+        """
+        if not self.is_connected():
+            return None
+
+        try:
+            word_data = await self.collection.find_one(vocab_queries.word_query(word))
+
+            if word_data:
+                logger.info(f"🔍 Found word '{word}': {word_data.get('translate')}")
+                return word_data
+            logger.info(f"❌ Word '{word}' not found in vocabulary")
+            return None
+
+        except Exception as e:
+            logger.error(f"❌ Failed to search word: {e}")
+            return None
+
+    async def search_words(self, words: List[str]) -> Dict[str, Optional[Dict]]:
+        """Найти несколько слов одним запросом (None для отсутствующих)"""
+        result: Dict[str, Optional[Dict]] = {word: None for word in words}
+        if not self.is_connected() or not words:
+            return result
+
+        try:
+            async for word_data in self.collection.find(vocab_queries.words_query(words)):
+                result[word_data["word"]] = word_data
+            return result
+
+        except Exception as e:
+            logger.error(f"❌ Failed to search words: {e}")
+            return result
+
+    async def get_word_count(self) -> Dict[str, int]:
+        """
+        Получить статистику словаря
+
+        Returns:
+            Dict[str, int]: {"total": X, "trained": Y, "untrained": Z}
+        """
+        if not self.is_connected():
+            return dict(vocab_stats.EMPTY_STATS)
+
+        try:
+            # Один поиск по _id; документ создаётся и сверяется полным подсчётом
+            document = await self.stats_collection.find_one(vocab_stats.stats_key(MONGODB_COLLECTION))
+            if vocab_stats.needs_reconcile(document):
+                return await self.reconcile_stats()
+            stats = vocab_stats.stats_from_document(document)
+
+            logger.info(f"📊 Vocabulary stats: {stats}")
+            return stats
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get word count: {e}")
+            return dict(vocab_stats.EMPTY_STATS)
+
+    async def get_estimated_total(self) -> int:
+        """Приблизительное число слов по метаданным коллекции (без подсчёта)"""
+        if not self.is_connected():
+            return 0
+
+        try:
+            return await self.collection.estimated_document_count()
+        except Exception as e:
+            logger.error(f"❌ Failed to estimate word count: {e}")
+            return 0
+
+    async def reconcile_stats(self) -> Dict[str, int]:
+        """Пересчитать счётчики словаря полным подсчётом"""
+        if not self.is_connected():
+            return dict(vocab_stats.EMPTY_STATS)
+
+        try:
+            collection = self.collection
+            total, trained = await asyncio.gather(
+                collection.count_documents({}),
+                collection.count_documents(vocab_queries.TRAINED_QUERY),
+            )
+            await self.stats_collection.update_one(
+                vocab_stats.stats_key(MONGODB_COLLECTION),
+                vocab_stats.reconcile_update(total, trained),
+                upsert=True
+            )
+            stats = {"total": total, "trained": trained, "untrained": total - trained}
+            logger.info(f"📊 Vocabulary stats reconciled: {stats}")
+            return stats
+
+        except Exception as e:
+            logger.error(f"❌ Failed to reconcile stats: {e}")
+            return dict(vocab_stats.EMPTY_STATS)
+
+    async def _increment_stats(self, total: int = 0, trained: int = 0):
+        """Атомарно изменить счётчики (документ создаёт только сверка)"""
+        try:
+            await self.stats_collection.update_one(
+                vocab_stats.stats_key(MONGODB_COLLECTION),
+                vocab_stats.increment_update(total, trained)
+            )
+        except Exception as e:
+            logger.error(f"❌ Failed to update stats: {e}")
+
+    def format_word_for_lesson(self, word_data: Dict) -> str:
+        """Форматировать слово для урока"""
+        return format_word_for_lesson(word_data)
+
+    async def close(self):
+        """Закрыть клиент текущего event loop (вызывается при завершении задачи)"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            client.close()
+            logger.info("🔌 MongoDB connection closed")
+
+
+# ========== SINGLETON INSTANCE ==========
+_vocabulary_client = None
+
+
+def get_vocabulary_client() -> AsyncCachedVocabularyClient:
+    """Получить глобальный instance AsyncVocabularyClient (с кэшем поиска слов)"""
+    global _vocabulary_client
+    if _vocabulary_client is None:
+        _vocabulary_client = AsyncCachedVocabularyClient(AsyncVocabularyClient())
+    return _vocabulary_client
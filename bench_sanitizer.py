@@ -0,0 +1,77 @@
+"""
+Микро-бенчмарк очистки HTML для TTS: старый regex подход против text_sanitizer
+
+Запуск: python bench_sanitizer.py
+"""
+import re
+import timeit
+
+from text_sanitizer import sanitize_for_speech
+
+_LEGACY_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def legacy_sanitize(summary: str, max_chars: int = 500) -> str:
+    """Прежняя логика format_lesson_from_news: удалить теги и отрезать 500 символов"""
+    summary = re.sub(r'<[^>]+>', '', summary)
+    if len(summary) > max_chars:
+        summary = summary[:max_chars] + "..."
+    return summary
+
+
+def legacy_sanitize_compiled(summary: str, max_chars: int = 500) -> str:
+    """Прежняя логика с заранее скомпилированным regex"""
+    summary = _LEGACY_TAG_RE.sub('', summary)
+    if len(summary) > max_chars:
+        summary = summary[:max_chars] + "..."
+    return summary
+
+
+PARAGRAPH = (
+    "<p>Apple&#8217;s new <a href=\"https://example.com/x?a=1&amp;b=2\">chip</a> "
+    "is    faster &mdash; and cheaper.&nbsp;Analysts say it will <em>reshape</em> "
+    "the laptop market.</p>\n"
+)
+SCRIPT = "<script type=\"text/javascript\">var x = '<p>' + 1 < 2;</script>"
+
+
+def make_summary(paragraphs: int) -> str:
+    return (PARAGRAPH * (paragraphs // 2)) + SCRIPT + (PARAGRAPH * (paragraphs - paragraphs // 2))
+
+
+CASES = {
+    "short (1 paragraph)": make_summary(1),
+    "typical (6 paragraphs)": make_summary(6),
+    "large (200 paragraphs)": make_summary(200),
+    "huge (20k paragraphs)": make_summary(20_000),
+}
+
+
+def bench(func, text: str) -> float:
+    """Среднее время одного вызова в микросекундах"""
+    timer = timeit.Timer(lambda: func(text))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=number))
+    return best / number * 1e6
+
+
+def main():
+    print("=" * 78)
+    print(f"{'case':<26}{'input':>10}{'legacy re':>14}{'compiled re':>14}{'sanitizer':>14}")
+    print("=" * 78)
+    for name, text in CASES.items():
+        legacy = bench(legacy_sanitize, text)
+        compiled = bench(legacy_sanitize_compiled, text)
+        sanitizer = bench(sanitize_for_speech, text)
+        print(f"{name:<26}{len(text):>10}{legacy:>12.1f}us{compiled:>12.1f}us{sanitizer:>12.1f}us")
+    print("=" * 78)
+
+    sample = CASES["typical (6 paragraphs)"]
+    print("\nLEGACY OUTPUT (tail):")
+    print(f"  ...{legacy_sanitize(sample)[-120:]!r}")
+    print("SANITIZER OUTPUT (tail):")
+    print(f"  ...{sanitize_for_speech(sample)[-120:]!r}")
+
+
+if __name__ == "__main__":
+    main()
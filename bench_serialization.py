@@ -0,0 +1,87 @@
+"""
+Микро-бенчмарк ответа vocabulary API: полные документы + str(_id) + JSONResponse
+против проекции в MongoDB + класса ответа, которым отвечает vocab_api
+
+Запуск: python bench_serialization.py  (нужны pymongo и fastapi)
+"""
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from vocab_api import response_class
+from vocab_serialization import PUBLIC_FIELDS
+
+COUNTS = (5, 100, 1000)
+
+
+def make_document(i: int) -> dict:
+    """Слово, как оно лежит в коллекции (со служебными полями)"""
+    return {
+        "_id": ObjectId(),
+        "word": f"word{i}",
+        "translate": f"перевод {i}",
+        "transcript": f"[wɜːd{i}]",
+        "traini": i % 3 == 0,
+        "trainDate": datetime(2024, 1, 1) + timedelta(minutes=i),
+        "rand": random.random(),
+    }
+
+
+def project(document: dict) -> dict:
+    """Что возвращает MongoDB с PUBLIC_PROJECTION ($toString выполняется на сервере)"""
+    projected = {"_id": str(document["_id"])}
+    projected.update((field, document[field]) for field in PUBLIC_FIELDS)
+    return projected
+
+
+def legacy_response(documents: list) -> bytes:
+    """Прежний путь: str(_id) в цикле, затем кодировщик FastAPI по умолчанию"""
+    words = [dict(document) for document in documents]
+    for word in words:
+        word["_id"] = str(word["_id"])
+    return JSONResponse(jsonable_encoder({"words": words, "count": len(words)})).body
+
+
+def fast_response(words: list) -> bytes:
+    """Путь vocab_api: документы уже спроецированы, ответ — vocab_api.response_class()"""
+    return response_class()({"words": words, "count": len(words)}).body
+
+
+def bench(func, payload) -> float:
+    """Среднее время одного вызова в микросекундах"""
+    timer = timeit.Timer(lambda: func(payload))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=number))
+    return best / number * 1e6
+
+
+def main():
+    print("=" * 78)
+    print(f"{'count':>8}{'legacy':>14}{'projected':>14}{'speedup':>10}{'legacy size':>16}{'size':>12}")
+    print("=" * 78)
+    for count in COUNTS:
+        documents = [make_document(i) for i in range(count)]
+        projected = [project(document) for document in documents]
+        legacy = bench(legacy_response, documents)
+        fast = bench(fast_response, projected)
+        legacy_size = len(legacy_response(documents))
+        fast_size = len(fast_response(projected))
+        print(
+            f"{count:>8}{legacy:>12.1f}us{fast:>12.1f}us{legacy / fast:>9.1f}x"
+            f"{legacy_size:>14} B{fast_size:>10} B"
+        )
+    print("=" * 78)
+
+    sample = make_document(0)
+    print("\nLEGACY WORD:")
+    print(f"  {legacy_response([sample]).decode('utf-8')}")
+    print("PROJECTED WORD:")
+    print(f"  {fast_response([project(sample)]).decode('utf-8')}")
+
+
+if __name__ == "__main__":
+    main()
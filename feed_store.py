@@ -0,0 +1,169 @@
+"""
+Persistent хранилище RSS фидов (JSON-lines)
+
+Одна строка на фид: валидаторы HTTP (ETag / Last-Modified), время загрузки
+и уже распарсенные записи. Позволяет делать conditional GET (304 без
+повторного парсинга) и прогревать агент с диска после рестарта контейнера.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ========== FEED STORE CONFIGURATION ==========
+FEED_STORE_PATH = os.getenv("FEED_STORE_PATH", os.path.join("data", "feed_store.jsonl"))
+# Записи моложе этого возраста (секунды) отдаются с диска без запроса к фиду
+FEED_STORE_FRESH_SECONDS = float(os.getenv("FEED_STORE_FRESH_SECONDS", "600"))
+FEED_STORE_MAX_ENTRIES = int(os.getenv("FEED_STORE_MAX_ENTRIES", "30"))
+
+
+class FeedStore:
+    """Хранилище валидаторов и записей RSS фидов на диске"""
+
+    def __init__(
+        self,
+        path: str = FEED_STORE_PATH,
+        fresh_seconds: float = FEED_STORE_FRESH_SECONDS,
+        max_entries: int = FEED_STORE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.max_entries = max_entries
+        self._records: Dict[str, Dict] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """Прочитано ли хранилище с диска"""
+        return self._loaded
+
+    def load(self):
+        """Прочитать хранилище с диска (один раз за процесс)"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+
+        records = self._read()
+        if records:
+            self._merge(records)
+            logger.info(f"📂 Loaded {len(records)} feed(s) from {self.path}")
+
+    def _read(self) -> Dict[str, Dict]:
+        """Записи из файла по URL (пусто, если файла нет или он битый)"""
+        if not os.path.exists(self.path):
+            return {}
+        records = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    records[record["url"]] = record
+        except Exception as e:
+            # Битый файл не должен ломать агент — просто начинаем с сети
+            logger.error(f"❌ Failed to load feed store {self.path}: {e}")
+            return {}
+        return records
+
+    def _merge(self, records: Dict[str, Dict]):
+        """Взять записи из файла, которые новее своих (по fetched_at)"""
+        with self._lock:
+            for url, record in records.items():
+                own = self._records.get(url)
+                if own is None or record.get("fetched_at", 0) > own.get("fetched_at", 0):
+                    self._records[url] = record
+
+    def save(self):
+        """
+        Атомарно записать хранилище на диск
+
+        Файл делят процессы джобов: перед записью он перечитывается, и более
+        новые записи других процессов (ETag, записи фида) сохраняются.
+        """
+        with self._save_lock:
+            self._merge(self._read())
+            with self._lock:
+                lines = [json.dumps(record, ensure_ascii=False) for record in self._records.values()]
+            self._write(lines)
+
+    def _write(self, lines: List[str]):
+        # Хранилище делят процессы джобов: у каждого свой tmp файл
+        # (внутри процесса записи упорядочены _save_lock)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"❌ Failed to save feed store {self.path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Запись фида: {'url', 'etag', 'modified', 'fetched_at', 'entries'} или None"""
+        return self._records.get(url)
+
+    def is_fresh(self, url: str) -> bool:
+        """Загружался ли фид недавно (можно не ходить в сеть)"""
+        record = self._records.get(url)
+        return record is not None and time.time() - record["fetched_at"] < self.fresh_seconds
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Заголовки If-None-Match / If-Modified-Since для conditional GET"""
+        record = self._records.get(url)
+        headers = {}
+        if record is not None:
+            if record.get("etag"):
+                headers["If-None-Match"] = record["etag"]
+            if record.get("modified"):
+                headers["If-Modified-Since"] = record["modified"]
+        return headers
+
+    def entries(self, url: str) -> List[Dict]:
+        """Сохранённые записи фида"""
+        record = self._records.get(url)
+        return list(record["entries"]) if record is not None else []
+
+    def update(self, url: str, entries: List[Dict], etag: Optional[str], modified: Optional[str]):
+        """Сохранить новый ответ фида (200 OK)"""
+        with self._lock:
+            self._records[url] = {
+                "url": url,
+                "etag": etag,
+                "modified": modified,
+                "fetched_at": time.time(),
+                "entries": entries[:self.max_entries],
+            }
+
+    def touch(self, url: str):
+        """Отметить, что фид не изменился (304 Not Modified)"""
+        with self._lock:
+            record = self._records.get(url)
+            if record is not None:
+                record["fetched_at"] = time.time()
+
+
+# ========== SINGLETON INSTANCE ==========
+_feed_store = None
+
+
+def get_feed_store() -> FeedStore:
+    """Получить глобальный instance FeedStore"""
+    global _feed_store
+    if _feed_store is None:
+        _feed_store = FeedStore()
+    return _feed_store
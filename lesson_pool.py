@@ -0,0 +1,204 @@
+"""
+Пул заранее собранных уроков
+
+Урок (очищенный текст новости, отрендеренные инструкции и слова из словаря)
+собирается в фоне. entrypoint только забирает готовый урок из очереди за O(1),
+а пул пополняется, когда уроков остаётся меньше порога.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+from lesson_templates import LessonPrompt, render_lesson_prompt
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# ========== LESSON POOL CONFIGURATION ==========
+# Каждая задача LiveKit живёт в своём процессе и забирает один урок: больший
+# пул собирается в prewarm и выбрасывается вместе с процессом. Порог 1
+# готовит урок для следующей задачи, если процесс переиспользуется
+# (num_idle_processes); 0 отключает пополнение
+LESSON_POOL_SIZE = int(os.getenv("LESSON_POOL_SIZE", "1"))
+LESSON_POOL_REFILL_THRESHOLD = int(os.getenv("LESSON_POOL_REFILL_THRESHOLD", "1"))
+LESSON_POOL_MAX_AGE = float(os.getenv("LESSON_POOL_MAX_AGE", "1800"))
+# Урок без новости (hardcoded текст) живёт недолго, чтобы пул быстро
+# переключился на новости, когда источники снова доступны
+LESSON_POOL_FALLBACK_MAX_AGE = float(os.getenv("LESSON_POOL_FALLBACK_MAX_AGE", "60"))
+LESSON_WORDS_COUNT = int(os.getenv("LESSON_WORDS_COUNT", "5"))
+VOCABULARY_TIMEOUT = float(os.getenv("VOCABULARY_TIMEOUT", "2"))
+
+
+def _merge_words(words: List[Dict], extra: List[Dict]) -> List[Dict]:
+    """Дополнить список слов без повторов"""
+    seen = {word_data.get("word") for word_data in words}
+    return words + [word_data for word_data in extra if word_data.get("word") not in seen]
+
+
+class Lesson(NamedTuple):
+    """Готовый к выдаче урок"""
+    prompt: LessonPrompt
+    words: List[Dict]
+    expires_at: float
+
+
+class LessonPool:
+    """Ротируемый пул готовых уроков с пополнением в фоне и вытеснением по возрасту"""
+
+    def __init__(
+        self,
+        news_fetcher,
+        vocabulary=None,
+        size: int = LESSON_POOL_SIZE,
+        refill_threshold: int = LESSON_POOL_REFILL_THRESHOLD,
+        max_age: float = LESSON_POOL_MAX_AGE,
+        words_count: int = LESSON_WORDS_COUNT,
+    ):
+        self.news_fetcher = news_fetcher
+        self.vocabulary = vocabulary
+        self.size = size
+        self.refill_threshold = refill_threshold
+        self.max_age = max_age
+        self.words_count = words_count
+
+        self._lessons = deque()
+        self._lock = threading.Lock()
+        # Задача пополнения привязана к своему event loop
+        self._refills = weakref.WeakKeyDictionary()
+
+        self._counters = {"leased": 0, "empty": 0, "built": 0, "evicted": 0, "build_errors": 0}
+
+    def __len__(self) -> int:
+        return len(self._lessons)
+
+    def lease(self) -> Optional[Lesson]:
+        """
+        Забрать готовый урок
+
+        Returns:
+            Optional[Lesson]: Самый старый не просроченный урок или None, если пул пуст
+        """
+        lesson = None
+        now = time.monotonic()
+        with self._lock:
+            while self._lessons:
+                candidate = self._lessons.popleft()
+                if now < candidate.expires_at:
+                    lesson = candidate
+                    break
+                self._counters["evicted"] += 1
+            self._counters["leased" if lesson else "empty"] += 1
+
+        if len(self._lessons) < self.refill_threshold:
+            self.ensure_refill()
+        return lesson
+
+    async def build_lesson(self) -> Lesson:
+        """Собрать один урок: новость → промпты, плюс слова из словаря"""
+        metrics = get_metrics()
+        with metrics.timer(stage="lesson_build"):
+            news, words = await asyncio.gather(self.news_fetcher.fetch_news(), self._fetch_words())
+            with metrics.timer(stage="lesson_render"):
+                prompt = render_lesson_prompt(news)
+        max_age = self.max_age if news else min(self.max_age, LESSON_POOL_FALLBACK_MAX_AGE)
+        return Lesson(
+            prompt=prompt,
+            words=words,
+            expires_at=time.monotonic() + max_age,
+        )
+
+    async def _fetch_words(self) -> List[Dict]:
+        """
+        Слова для урока: сначала те, что пора повторить, остальные — случайные
+
+        Синхронные клиенты словаря вызываются в thread pool; клиент Modal API
+        отдаёт всё одним запросом (get_session_bootstrap).
+        """
+        if self.vocabulary is None or not self.words_count:
+            return []
+        if asyncio.iscoroutinefunction(self.vocabulary.get_random_words):
+            words = self._get_words_async()
+        else:
+            words = asyncio.to_thread(self._get_words)
+        try:
+            return await asyncio.wait_for(words, VOCABULARY_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Vocabulary lookup exceeded {VOCABULARY_TIMEOUT:.1f}s, lesson without words")
+            return []
+
+    def _get_words(self) -> List[Dict]:
+        bootstrap = getattr(self.vocabulary, "get_session_bootstrap", None)
+        if bootstrap is not None:
+            # Modal API: один запрос вместо is_connected + due + random
+            data = bootstrap(count=self.words_count, untrained_count=0, due_count=self.words_count)
+            return _merge_words(data["due_words"], data["random_words"])[:self.words_count]
+
+        if not self.vocabulary.is_connected():
+            return []
+        words = self.vocabulary.get_due_words(self.words_count)
+        if len(words) < self.words_count:
+            words = _merge_words(words, self.vocabulary.get_random_words(self.words_count))
+        return words[:self.words_count]
+
+    async def _get_words_async(self) -> List[Dict]:
+        if not self.vocabulary.is_connected():
+            return []
+        words = await self.vocabulary.get_due_words(self.words_count)
+        if len(words) < self.words_count:
+            words = _merge_words(words, await self.vocabulary.get_random_words(self.words_count))
+        return words[:self.words_count]
+
+    async def fill(self):
+        """Пополнить пул до размера"""
+        self._evict_expired()
+        while len(self._lessons) < self.size:
+            try:
+                lesson = await self.build_lesson()
+            except Exception as e:
+                self._counters["build_errors"] += 1
+                logger.error(f"Failed to build lesson: {e}")
+                return
+            with self._lock:
+                self._lessons.append(lesson)
+                self._counters["built"] += 1
+        logger.info(f"📚 Lesson pool filled: {len(self._lessons)} lesson(s)")
+
+    def _evict_expired(self):
+        """Удалить просроченные уроки"""
+        now = time.monotonic()
+        with self._lock:
+            fresh = deque(lesson for lesson in self._lessons if now < lesson.expires_at)
+            self._counters["evicted"] += len(self._lessons) - len(fresh)
+            self._lessons = fresh
+
+    def ensure_refill(self):
+        """Запустить пополнение в фоне текущего event loop (идемпотентно)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = self._refills.get(loop)
+        if task is None or task.done():
+            self._refills[loop] = loop.create_task(self.fill())
+
+    async def stop(self):
+        """Остановить пополнение текущего event loop"""
+        task = self._refills.pop(asyncio.get_running_loop(), None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики пула: size, leased, empty, built, evicted, build_errors"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._lessons)
+        return stats
@@ -0,0 +1,207 @@
+"""
+Шаблоны уроков и системных промптов агента
+
+Шаблоны компилируются один раз при импорте. Готовые промпты кэшируются
+по идентичности новости (ссылка или хэш содержимого): комнаты, получившие
+одну и ту же статью, используют один отрендеренный промпт.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from string import Template
+from typing import Dict, List, NamedTuple, Optional
+
+from session_vocabulary import format_word_line
+from text_sanitizer import sanitize_for_speech
+
+logger = logging.getLogger(__name__)
+
+# ========== TEMPLATES CONFIGURATION ==========
+LESSON_PROMPT_CACHE_SIZE = int(os.getenv("LESSON_PROMPT_CACHE_SIZE", "64"))
+LESSON_SUMMARY_MAX_CHARS = 500
+LESSON_TITLE_MAX_CHARS = 200
+
+# ========== ШАБЛОНЫ ==========
+TEMPLATES: Dict[str, Template] = {
+    # Hardcoded текст урока (fallback, если новость недоступна)
+    "lesson_fallback": Template("""
+Welcome to your English practice.
+Today's topic is Artificial Intelligence.
+AI is rapidly transforming the modern workplace.
+Instead of replacing jobs, experts suggest AI will augment human capabilities.
+I am ready to discuss this with you. What do you think?
+"""),
+    "lesson_news": Template("""
+Welcome to your English practice.
+
+Today's news: $title
+
+$summary
+
+I am ready to discuss this article with you. What are your thoughts on this topic?
+"""),
+    # Системный промпт агента
+    "agent_instruction": Template("""
+You are an English Tutor with video capability.
+Your task is to read the lesson text below to the user clearly and slowly.
+
+LESSON TEXT:
+"$lesson_text"
+
+After reading, engage in a conversation about it.
+Correct the user if they make grammar mistakes.
+Keep responses conversational and natural for voice interaction.
+Speak clearly and at a moderate pace suitable for English learners.
+
+You can see and analyze video/images when users share their screen or camera.
+If you see anything on video, acknowledge it and use it in conversation.
+"""),
+    # Целевые слова сессии (добавляются к системному промпту)
+    "vocabulary_section": Template("""
+TARGET VOCABULARY FOR THIS LESSON:
+$word_lines
+
+Weave these words naturally into the conversation about the lesson.
+Ask the user to use each of them in a sentence and gently correct mistakes.
+If the user asks about one of these words, call lookup_word.
+When the user uses one of these words correctly, call mark_word_practiced with it.
+"""),
+    # Инструкция для первого ответа (приветствия)
+    "session_fallback": Template("""
+Greet the user warmly.
+Tell them you're ready to help them practice English.
+Then read the lesson text about AI in the workplace.
+After that, ask them what they think about the topic.
+"""),
+    "session_news": Template("""
+Greet the user warmly.
+Tell them you're ready to help them practice English.
+Then read today's news article to them.
+After that, ask them what they think about the topic.
+"""),
+}
+
+
+class LessonPrompt(NamedTuple):
+    """Готовый набор текстов для одной сессии"""
+    key: str
+    lesson_text: str
+    instructions: str
+    session_instruction: str
+
+
+def render(name: str, **fields) -> str:
+    """Отрендерить именованный шаблон"""
+    return TEMPLATES[name].substitute(**fields)
+
+
+def news_key(news: Optional[Dict]) -> str:
+    """
+    Идентичность новости для кэша промптов
+
+    Returns:
+        str: Ссылка на статью, хэш заголовка и текста или "fallback"
+    """
+    if not news:
+        return "fallback"
+    if news.get('link'):
+        return news['link']
+    content = f"{news.get('title', '')}\n{news.get('summary', '')}"
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def format_lesson_from_news(news: Optional[Dict]) -> str:
+    """
+    Форматирует новость в текст урока
+    """
+    if not news:
+        # Fallback на hardcoded текст
+        return render("lesson_fallback")
+
+    # Очищаем HTML (feedparser оставляет теги и entities) и обрезаем
+    # по границе предложения, чтобы TTS не читал обрывки
+    title = sanitize_for_speech(news['title'], LESSON_TITLE_MAX_CHARS)
+    summary = sanitize_for_speech(news['summary'], LESSON_SUMMARY_MAX_CHARS)
+
+    return render("lesson_news", title=title, summary=summary)
+
+
+class _PromptCache:
+    """LRU кэш отрендеренных промптов по идентичности новости"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, LessonPrompt]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[LessonPrompt]:
+        with self._lock:
+            prompt = self._items.get(key)
+            if prompt is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return prompt
+
+    def put(self, prompt: LessonPrompt):
+        with self._lock:
+            self._items[prompt.key] = prompt
+            self._items.move_to_end(prompt.key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+_prompt_cache = _PromptCache(LESSON_PROMPT_CACHE_SIZE)
+
+
+def render_lesson_prompt(news: Optional[Dict]) -> LessonPrompt:
+    """
+    Промпты сессии для новости (с мемоизацией)
+
+    Args:
+        news: Новость или None для hardcoded урока
+
+    Returns:
+        LessonPrompt: Текст урока, системный промпт агента и инструкция приветствия
+    """
+    key = news_key(news)
+    prompt = _prompt_cache.get(key)
+    if prompt is not None:
+        return prompt
+
+    lesson_text = format_lesson_from_news(news)
+    prompt = LessonPrompt(
+        key=key,
+        lesson_text=lesson_text,
+        instructions=render("agent_instruction", lesson_text=lesson_text.strip()),
+        session_instruction=render("session_news" if news else "session_fallback"),
+    )
+    _prompt_cache.put(prompt)
+    return prompt
+
+
+def render_session_instructions(prompt: LessonPrompt, words: List[Dict]) -> str:
+    """
+    Системный промпт сессии: промпт урока плюс целевые слова
+
+    Часть с новостью берётся из кэша промптов, слова добавляются
+    простой конкатенацией — у каждой сессии они свои.
+    """
+    if not words:
+        return prompt.instructions
+    word_lines = "\n".join(f"- {format_word_line(word_data)}" for word_data in words)
+    return prompt.instructions + render("vocabulary_section", word_lines=word_lines)
+
+
+def prompt_cache_stats() -> Dict[str, int]:
+    """Счётчики кэша промптов: hits, misses, size"""
+    return {
+        "hits": _prompt_cache.hits,
+        "misses": _prompt_cache.misses,
+        "size": len(_prompt_cache._items),
+    }
@@ -0,0 +1,359 @@
+"""
+Нагрузочный тест воркера без сети: N одновременных сессий через entrypoint
+
+Запускает настоящий entrypoint агента для N поддельных JobContext в одном
+event loop (как thread executor LiveKit) с заглушками realtime модели и
+AgentSession. Внешние сервисы заменены локальными:
+    - RSS фид (и N8N webhook для --news-source n8n) — aiohttp сервер в отдельном потоке;
+    - MongoDB — mongomock (словарь в режиме snapshot).
+
+Отчёт: p50/p95/p99 времени старта сессии (до доставленного приветствия),
+задержка event loop и память на сессию. Среднее время этапов берётся из
+метрик entrypoint (см. metrics.py).
+
+Зависимости (mongomock, psutil) — в requirements-dev.txt:
+    pip install -r requirements-dev.txt
+
+Запуск:
+    python loadtest.py --sessions 50
+    python loadtest.py --sessions 200 --ramp 5 --max-p95 2   # код выхода 1 при превышении (CI)
+"""
+import argparse
+import asyncio
+import contextvars
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List
+
+# Конфигурация модулей агента читается при импорте — задаём до него
+_WORKDIR = tempfile.mkdtemp(prefix="tutor-loadtest-")
+os.environ.setdefault("GOOGLE_API_KEY", "loadtest")
+os.environ["VOCABULARY_BACKEND"] = "snapshot"
+os.environ["VOCAB_SNAPSHOT_SYNC"] = "off"
+os.environ["METRICS_DIR"] = os.path.join(_WORKDIR, "metrics")
+os.environ["SESSION_EVENTS_PATH"] = os.path.join(_WORKDIR, "session_events.jsonl")
+os.environ["FEED_STORE_PATH"] = os.path.join(_WORKDIR, "feed_store.jsonl")
+os.environ["NEWS_CACHE_PATH"] = os.path.join(_WORKDIR, "news_cache.json")
+os.environ["NEWS_SERVICE_PATH"] = os.path.join(_WORKDIR, "processed_news.json")
+
+import mongomock
+import psutil
+from aiohttp import web
+
+import agent
+import feed_store
+import metrics
+import mongodb_client
+import news_cache
+import news_fetcher
+import news_service
+import vocab_snapshot
+
+# ========== LOCAL STAND-INS ==========
+RSS_ITEM = """<item><title>Local story {i}</title><link>http://localhost/story/{i}</link>
+<description>&lt;p&gt;Scientists in a small town built a &lt;b&gt;solar&lt;/b&gt; boat. Story {i}.&lt;/p&gt;</description>
+<pubDate>Mon, 06 Jan 2025 10:{i:02d}:00 GMT</pubDate></item>"""
+RSS_BODY = (
+    '<?xml version="1.0"?><rss version="2.0"><channel><title>Local feed</title>'
+    + "".join(RSS_ITEM.format(i=i) for i in range(20))
+    + "</channel></rss>"
+)
+
+
+class StandIns:
+    """N8N webhook и RSS фид на локальном aiohttp сервере в отдельном потоке"""
+
+    def __init__(self, n8n_latency: float, n8n_failure_rate: float, rss_latency: float):
+        self.n8n_latency = n8n_latency
+        self.n8n_failure_rate = n8n_failure_rate
+        self.rss_latency = rss_latency
+        self.port = None
+        self.requests = {"n8n": 0, "rss": 0}
+        self._ready = threading.Event()
+        self._loop = None
+
+    async def _n8n(self, _request):
+        self.requests["n8n"] += 1
+        await asyncio.sleep(self.n8n_latency)
+        if random.random() < self.n8n_failure_rate:
+            return web.json_response({"error": "No news available", "fallback": True})
+        i = random.randrange(20)
+        return web.json_response({
+            "title": f"N8N story {i}",
+            "content": f"A local council opened a new library. Story {i}.",
+            "link": f"http://localhost/n8n/{i}",
+            "published": "Mon, 06 Jan 2025 10:00:00 GMT",
+        })
+
+    async def _rss(self, _request):
+        self.requests["rss"] += 1
+        await asyncio.sleep(self.rss_latency)
+        return web.Response(text=RSS_BODY, content_type="application/rss+xml")
+
+    def start(self):
+        threading.Thread(target=self._serve, name="loadtest-stand-ins", daemon=True).start()
+        self._ready.wait()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.add_routes([web.get("/webhook/get-news", self._n8n), web.get("/feed.xml", self._rss)])
+        runner = web.AppRunner(app)
+        self._loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+
+def seed_vocabulary(words: int) -> vocab_snapshot.SnapshotVocabularyClient:
+    """Словарь на mongomock: часть слов тренирована и ждёт повторения"""
+    mongodb_client.MONGODB_URI = "mongodb://loadtest"
+    mongodb_client.MongoClient = mongomock.MongoClient
+    client = mongodb_client.VocabularyClient()
+    now = datetime.utcnow()
+    client.collection.insert_many([
+        {
+            "word": f"word{i}",
+            "translate": f"слово {i}",
+            "transcript": f"wɜːd{i}",
+            "traini": i % 4 == 0,
+            "trainDate": None,
+            "rand": random.random(),
+            **({"due": now - timedelta(seconds=random.randrange(86400)), "ease": 2.5, "interval": 1, "reps": 1, "lapses": 0}
+               if i % 4 == 0 else {}),
+        }
+        for i in range(words)
+    ])
+    return vocab_snapshot.SnapshotVocabularyClient(client, sync="off")
+
+
+# ========== FAKE LIVEKIT ==========
+# JobContext задачи, внутри которой создаётся AgentSession (entrypoint
+# выполняется в задаче run_session, поэтому контекст наследуется)
+_current_job = contextvars.ContextVar("loadtest_job")
+
+
+class FakeRealtimeModel:
+    """Заглушка Gemini Realtime: entrypoint только передаёт её в агента"""
+
+
+class FakeAgentSession:
+    """AgentSession без медиа: старт и приветствие занимают заданное время"""
+
+    start_latency = 0.02
+    greeting_latency = 0.3
+
+    def __init__(self, **_kwargs):
+        self.agent = None
+        self._handlers: Dict[str, List] = {}
+        _current_job.get().sessions.append(self)
+
+    def on(self, event: str):
+        def register(handler):
+            self._handlers.setdefault(event, []).append(handler)
+            return handler
+        return register
+
+    def emit(self, event: str, payload):
+        for handler in self._handlers.get(event, []):
+            handler(payload)
+
+    async def start(self, room=None, agent=None, room_input_options=None):
+        await asyncio.sleep(self.start_latency)
+        self.agent = agent
+
+    async def generate_reply(self, instructions: str = None):
+        await asyncio.sleep(self.greeting_latency)
+        self.emit("conversation_item_added", SimpleNamespace(
+            item=SimpleNamespace(role="assistant", text_content=instructions or "")
+        ))
+
+
+class FakeJobContext:
+    """Поля JobContext, которые использует entrypoint"""
+
+    connect_latency = 0.05
+
+    def __init__(self, index: int, proc):
+        self.proc = proc
+        self.job = SimpleNamespace(id=f"job-{index}", room=SimpleNamespace(name=f"room-{index}"))
+        self.room = self.job.room
+        self.sessions: List[FakeAgentSession] = []
+        self._shutdown_callbacks = []
+
+    def add_shutdown_callback(self, callback):
+        self._shutdown_callbacks.append(callback)
+
+    async def connect(self):
+        await asyncio.sleep(self.connect_latency)
+
+    async def shutdown(self):
+        for callback in self._shutdown_callbacks:
+            result = callback()
+            if asyncio.iscoroutine(result):
+                await result
+
+
+# ========== RUN ==========
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+async def monitor_loop_lag(lags: List[float], stop: asyncio.Event, interval: float = 0.01):
+    """Задержка event loop: насколько sleep(interval) просыпается позже положенного"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+
+async def run_session(ctx: FakeJobContext, delay: float, hold: float, all_started: asyncio.Event, result: Dict):
+    """Одна сессия: entrypoint, короткий разговор после старта всех сессий, shutdown"""
+    await asyncio.sleep(delay)
+    _current_job.set(ctx)
+    started = time.perf_counter()
+    try:
+        await agent.entrypoint(ctx)
+        result["latencies"].append(time.perf_counter() - started)
+    except Exception as e:
+        result["errors"].append(f"{ctx.job.id}: {e!r}")
+    finally:
+        result["done"] += 1
+        if result["done"] == result["total"]:
+            all_started.set()
+
+    # Разговор: реплики ученика и отработанные слова (write-behind буфер)
+    await all_started.wait()
+    for _ in range(3):
+        await asyncio.sleep(hold / 3)
+        for session in ctx.sessions:
+            session.emit("user_input_transcribed", SimpleNamespace(transcript="I like this story", is_final=True))
+            remaining = session.agent.vocabulary.remaining() if session.agent else []
+            if remaining:
+                await session.agent.mark_word_practiced(None, remaining[0])
+    await ctx.shutdown()
+
+
+async def run(args) -> Dict:
+    proc = SimpleNamespace(userdata={})
+    result = {"latencies": [], "errors": [], "done": 0, "total": args.sessions}
+
+    if not args.cold:
+        # prewarm выполняется до назначения задач (в своём потоке, как в процессе LiveKit)
+        await asyncio.to_thread(agent.prewarm, proc)
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lags, stop))
+
+    process = psutil.Process()
+    baseline_rss = process.memory_info().rss
+    all_started = asyncio.Event()
+    step = args.ramp / args.sessions if args.sessions else 0
+
+    tasks = [
+        asyncio.create_task(run_session(FakeJobContext(index, proc), index * step, args.hold, all_started, result))
+        for index in range(args.sessions)
+    ]
+    await all_started.wait()
+    peak_rss = process.memory_info().rss
+    await asyncio.gather(*tasks)
+
+    stop.set()
+    await monitor
+    result.update(lags=lags, baseline_rss=baseline_rss, peak_rss=peak_rss)
+    return result
+
+
+def report(args, result: Dict, stand_ins: StandIns) -> int:
+    latencies = result["latencies"]
+    lags = result["lags"]
+    sessions = max(1, len(latencies))
+    per_session = (result["peak_rss"] - result["baseline_rss"]) / sessions
+
+    print("=" * 78)
+    print(f"sessions: {len(latencies)}/{args.sessions} started, {len(result['errors'])} failed, "
+          f"ramp {args.ramp:.1f}s, {'cold' if args.cold else 'prewarmed'}")
+    print("=" * 78)
+    print(f"{'session start (s)':<26}{'p50':>12}{'p95':>12}{'p99':>12}{'max':>12}")
+    print(f"{'':<26}{percentile(latencies, 50):>12.3f}{percentile(latencies, 95):>12.3f}"
+          f"{percentile(latencies, 99):>12.3f}{max(latencies, default=0):>12.3f}")
+    print(f"{'event loop lag (ms)':<26}{percentile(lags, 50) * 1000:>12.1f}{percentile(lags, 95) * 1000:>12.1f}"
+          f"{percentile(lags, 99) * 1000:>12.1f}{max(lags, default=0) * 1000:>12.1f}")
+    print(f"{'memory':<26}{'baseline':>12}{'peak':>12}{'per session':>24}")
+    print(f"{'':<26}{result['baseline_rss'] / 2**20:>10.1f}MB{result['peak_rss'] / 2**20:>10.1f}MB"
+          f"{per_session / 2**10:>22.1f}KB")
+    print("=" * 78)
+
+    snapshot = metrics.get_metrics().snapshot()
+    print("STAGES (mean, from entrypoint metrics):")
+    for labels, data in sorted(snapshot["histograms"].get("tutor_stage_duration_seconds", {}).items()):
+        print(f"  {labels:<30}{data['sum'] / data['count'] * 1000:>10.1f}ms  x{data['count']}")
+    for name, series in sorted(snapshot["counters"].items()):
+        for labels, value in sorted(series.items()):
+            print(f"  {name}{{{labels}}} {value:g}")
+    print(f"  stand-in requests: {stand_ins.requests}")
+
+    for error in result["errors"][:10]:
+        print(f"❌ {error}")
+
+    p95 = percentile(latencies, 95)
+    if result["errors"] or (args.max_p95 and p95 > args.max_p95):
+        if args.max_p95 and p95 > args.max_p95:
+            print(f"❌ p95 {p95:.3f}s exceeds --max-p95 {args.max_p95:.3f}s")
+        return 1
+    return 0
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Offline load test for agent.py entrypoint")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent sessions")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which sessions start")
+    parser.add_argument("--hold", type=float, default=1.0, help="seconds each session stays open after all started")
+    parser.add_argument("--cold", action="store_true", help="skip prewarm (empty lesson pool)")
+    parser.add_argument("--words", type=int, default=2000, help="vocabulary size")
+    parser.add_argument("--news-source", choices=("service", "n8n"), default=news_fetcher.NEWS_SOURCE)
+    parser.add_argument("--n8n-latency", type=float, default=0.05)
+    parser.add_argument("--n8n-failure-rate", type=float, default=0.0)
+    parser.add_argument("--rss-latency", type=float, default=0.1)
+    parser.add_argument("--greeting-latency", type=float, default=FakeAgentSession.greeting_latency)
+    parser.add_argument("--max-p95", type=float, default=0.0, help="fail (exit 1) if p95 session start exceeds it")
+    args = parser.parse_args(argv)
+
+    stand_ins = StandIns(args.n8n_latency, args.n8n_failure_rate, args.rss_latency)
+    stand_ins.start()
+    base_url = f"http://127.0.0.1:{stand_ins.port}"
+
+    # Заглушки LiveKit/Gemini и локальные источники вместо сети
+    FakeAgentSession.greeting_latency = args.greeting_latency
+    agent.AgentSession = FakeAgentSession
+    agent.build_realtime_model = FakeRealtimeModel
+    news_fetcher.RSS_FEEDS[:] = [f"{base_url}/feed.xml"]
+    fetcher = news_fetcher.NewsFetcher(
+        n8n_url=f"{base_url}/webhook/get-news", cache=news_cache.get_news_cache(), store=feed_store.get_feed_store()
+    )
+    if args.news_source == "service":
+        fetcher.service = news_service.NewsService(fetcher)
+    news_fetcher._news_fetcher = fetcher
+    vocab_snapshot._snapshot_client = seed_vocabulary(args.words)
+
+    result = asyncio.run(run(args))
+    return report(args, result, stand_ins)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,358 @@
+"""
+Метрики старта сессии в формате Prometheus
+
+Гистограммы длительности этапов entrypoint (новости N8N / RSS, сборка урока,
+session.start, ctx.connect, приветствие) и счётчики fallback'ов и ошибок.
+
+Задачи LiveKit выполняются в отдельных процессах, поэтому каждый процесс
+пишет снимок своих метрик в файл (<METRICS_DIR>/<pid>-<start>.json), а
+основной процесс воркера на запрос /metrics суммирует все снимки. Снимки
+завершившихся процессов при этом сворачиваются в один файл finished.json и
+удаляются, так что число файлов не растёт с числом сессий. /metrics
+добавляется к HTTP серверу воркера (порт 7860, health check); если это
+невозможно, метрики отдаются отдельным сервером на METRICS_PORT.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# ========== METRICS CONFIGURATION ==========
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "english-tutor-metrics"))
+# Порт отдельного сервера /metrics (если не удалось подключиться к серверу воркера)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Сумма снимков завершившихся процессов
+FINISHED_SNAPSHOT = "finished.json"
+
+# ========== МЕТРИКИ ==========
+HISTOGRAMS = {
+    "tutor_stage_duration_seconds": "Duration of session start stages",
+    "tutor_time_to_greeting_seconds": "Time from job start to the delivered greeting",
+}
+COUNTERS = {
+    "tutor_news_fallbacks_total": "News source fallbacks (to=rss|hardcoded)",
+    "tutor_lesson_pool_total": "Lesson pool leases (result=hit|miss)",
+    "tutor_news_cache_total": "News cache events (event=hits|misses|stale_hits|refreshes|refresh_errors|disk_loads)",
+    "tutor_greeting_failures_total": "Greetings that raised an error",
+    "tutor_sessions_total": "Sessions started",
+}
+
+
+def _label_key(labels: Dict[str, str]) -> str:
+    """Метки в виде строки Prometheus: stage="connect" (ключ в снимке)"""
+    return ",".join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """Гистограммы и счётчики процесса со снимком в файл"""
+
+    def __init__(self, directory: str = METRICS_DIR, buckets=BUCKETS):
+        self.directory = directory
+        self.buckets = tuple(buckets)
+        # {name: {labels: {"counts": [...], "sum": s, "count": n}}}, counts — по бакетам и +Inf
+        self._histograms: Dict[str, Dict[str, Dict]] = {}
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        # Снимок пишут параллельные flush() сессий процесса
+        self._write_lock = threading.Lock()
+        self._path = os.path.join(directory, f"{os.getpid()}-{int(time.time() * 1000)}.json")
+
+    def observe(self, name: str, value: float, **labels):
+        """Добавить наблюдение в гистограмму"""
+        position = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._histograms.setdefault(name, {}).setdefault(
+                _label_key(labels), {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            )
+            series["counts"][position] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Увеличить счётчик"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str = "tutor_stage_duration_seconds", **labels):
+        """Замерить блок (в том числе с await внутри) и записать в гистограмму"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "histograms": json.loads(json.dumps(self._histograms)),
+                "counters": json.loads(json.dumps(self._counters)),
+            }
+
+    def write_snapshot(self):
+        """Записать снимок процесса атомарно (tmp + rename)"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._write_lock:
+                _write_json(self._path, self.snapshot())
+        except Exception as e:
+            logger.error(f"❌ Failed to write metrics snapshot: {e}")
+
+    async def flush(self):
+        """Записать снимок, не блокируя event loop"""
+        await asyncio.to_thread(self.write_snapshot)
+
+
+# ========== АГРЕГАЦИЯ И ФОРМАТ ==========
+# Сворачивание снимков и чтение для /metrics (параллельные запросы /metrics)
+_aggregate_lock = threading.Lock()
+
+
+def _write_json(path: str, content: Dict):
+    """Атомарная запись JSON через tmp файл процесса (tmp + rename)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(content, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _read_snapshot(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Skipping metrics snapshot {path}: {e}")
+        return None
+
+
+def _merge(total: Dict, snapshot: Dict):
+    """Добавить снимок к сумме (снимки с другими бакетами пропускаются)"""
+    if snapshot.get("buckets") != total["buckets"]:
+        return
+
+    for name, series in snapshot.get("histograms", {}).items():
+        for labels, data in series.items():
+            merged = total["histograms"].setdefault(name, {}).setdefault(
+                labels, {"counts": [0] * len(data["counts"]), "sum": 0.0, "count": 0}
+            )
+            merged["counts"] = [a + b for a, b in zip(merged["counts"], data["counts"])]
+            merged["sum"] += data["sum"]
+            merged["count"] += data["count"]
+    for name, series in snapshot.get("counters", {}).items():
+        for labels, value in series.items():
+            merged = total["counters"].setdefault(name, {})
+            merged[labels] = merged.get(labels, 0) + value
+
+
+def _empty_snapshot() -> Dict:
+    return {"buckets": list(BUCKETS), "histograms": {}, "counters": {}}
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def fold_finished(directory: str = METRICS_DIR) -> int:
+    """
+    Свернуть снимки завершившихся процессов в finished.json и удалить их
+
+    Процесс пишет последний снимок до выхода, поэтому снимок процесса,
+    которого уже нет, окончательный. Возвращает число свёрнутых снимков.
+    """
+    finished_path = os.path.join(directory, FINISHED_SNAPSHOT)
+    dead = []
+    for path in glob.glob(os.path.join(directory, "*-*.json")):
+        pid = os.path.basename(path).split("-", 1)[0]
+        if pid.isdigit() and not _process_alive(int(pid)):
+            dead.append(path)
+    if not dead:
+        return 0
+
+    total = _empty_snapshot()
+    if os.path.exists(finished_path):
+        snapshot = _read_snapshot(finished_path)
+        if snapshot is not None:
+            _merge(total, snapshot)
+    for path in dead:
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            _merge(total, snapshot)
+
+    try:
+        _write_json(finished_path, total)
+    except Exception as e:
+        logger.error(f"❌ Failed to fold metrics snapshots: {e}")
+        return 0
+    for path in dead:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return len(dead)
+
+
+def aggregate(directory: str = METRICS_DIR) -> Dict:
+    """Сумма снимков всех процессов воркера (завершившиеся — из finished.json)"""
+    with _aggregate_lock:
+        fold_finished(directory)
+        total = _empty_snapshot()
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                _merge(total, snapshot)
+        return total
+
+
+def _series(name: str, labels: str, extra: str = "") -> str:
+    inner = ",".join(part for part in (labels, extra) if part)
+    return f"{name}{{{inner}}}" if inner else name
+
+
+def render(snapshot: Dict) -> str:
+    """Снимок в текстовом формате Prometheus 0.0.4"""
+    lines: List[str] = []
+    bounds = [str(bound) for bound in snapshot["buckets"]] + ["+Inf"]
+
+    for name, help_text in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, data in sorted(snapshot["histograms"].get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip(bounds, data["counts"]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{_series(name + '_bucket', labels, le)} {cumulative}")
+            lines.append(f"{_series(name + '_sum', labels)} {data['sum']}")
+            lines.append(f"{_series(name + '_count', labels)} {data['count']}")
+
+    for name, help_text in COUNTERS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in sorted(snapshot["counters"].get(name, {}).items()):
+            lines.append(f"{_series(name, labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def clear_snapshots(directory: str = METRICS_DIR):
+    """Удалить снимки прошлого запуска воркера (и tmp файлы прерванных записей)"""
+    for path in glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.tmp")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ========== /metrics ==========
+async def _metrics_handler(_request):
+    from aiohttp import web
+
+    body = await asyncio.to_thread(lambda: render(aggregate()).encode("utf-8"))
+    return web.Response(body=body, headers={"Content-Type": CONTENT_TYPE})
+
+
+def install_metrics_route() -> bool:
+    """
+    Добавить /metrics к HTTP серверу воркера LiveKit (вызывается до cli.run_app)
+
+    Сервер создаётся внутри Worker, поэтому подменяется класс HttpServer
+    модуля livekit.agents.utils.http_server. Если внутренняя структура SDK
+    не та, что ожидается, ничего не меняется и возвращается False.
+    """
+    try:
+        from aiohttp import web
+        from livekit.agents.utils import http_server
+    except ImportError:
+        return False
+
+    base = getattr(http_server, "HttpServer", None)
+    if base is None or not isinstance(getattr(base, "app", None), property):
+        return False
+    if getattr(base, "serves_tutor_metrics", False):
+        return True
+
+    class MetricsHttpServer(base):
+        serves_tutor_metrics = True
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.app.add_routes([web.get("/metrics", _metrics_handler)])
+
+    http_server.HttpServer = MetricsHttpServer
+    return True
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render(aggregate()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    """Отдельный сервер /metrics в фоновом потоке (fallback)"""
+    server = ThreadingHTTPServer(("", port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"📈 Metrics served on :{port}/metrics")
+    return server
+
+
+def setup_worker_metrics():
+    """Основной процесс воркера: очистить старые снимки и подключить /metrics"""
+    clear_snapshots()
+    if install_metrics_route():
+        logger.info("📈 Metrics served on the worker health port at /metrics")
+    else:
+        logger.warning("⚠️ Worker HTTP server not patchable, starting a separate metrics server")
+        start_metrics_server()
+
+
+# ========== SINGLETON INSTANCE ==========
+_metrics = None
+
+
+def get_metrics() -> MetricsRegistry:
+    """Получить глобальный instance MetricsRegistry (один на процесс)"""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
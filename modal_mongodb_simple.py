@@ -1,6 +1,11 @@
 """
 Simplified MongoDB API - Modal.com Deployment
-Using web_endpoint instead of asgi_app to avoid encoding issues
+
+One FastAPI app (vocab_api.create_app) served with @modal.asgi_app: every
+route the client calls lives under a single URL. The app is built on a class:
+the MongoClient is created once per container (@modal.enter) and reused by
+every request the container serves, so warm requests skip SRV lookup, TLS
+handshake and server discovery.
 """
 import os
 import modal
@@ -10,87 +15,90 @@ image = modal.Image.debian_slim(python_version="3.11").pip_install(
     "pymongo==4.10.1",
     "dnspython==2.7.0",
     "fastapi==0.115.0",
+    "orjson==3.10.12",
+).add_local_python_source(
+    "spaced_repetition", "vocab_api", "vocab_queries", "vocab_sampling", "vocab_serialization", "vocab_stats"
 )
 
 app = modal.App("vocab-api", image=image)
 
-@app.function(
-    secrets=[modal.Secret.from_name("mongodb-credentials")],
-)
-@modal.fastapi_endpoint(method="GET")
-def health():
-    """Health check endpoint"""
-    return {"status": "ok", "service": "vocabulary-api"}
-
-
-@app.function(
-    secrets=[modal.Secret.from_name("mongodb-credentials")],
-)
-@modal.fastapi_endpoint(method="GET")
-def stats():
-    """Get vocabulary statistics"""
-    from pymongo import MongoClient
-
-    MONGODB_URI = os.getenv("MONGODB_URI")
-    MONGODB_DB = os.getenv("MONGODB_DB", "cluster0")
-    MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "words")
-
-    if not MONGODB_URI:
-        return {"error": "MongoDB not configured"}, 503
-
-    try:
-        client = MongoClient(MONGODB_URI)
-        db = client[MONGODB_DB]
-        collection = db[MONGODB_COLLECTION]
-
-        total = collection.count_documents({})
-        trained = collection.count_documents({"traini": True})
-        untrained = total - trained
+# URL: https://{workspace}--mongodb-vocabulary-api-fastapi-app.modal.run (MODAL_API_URL клиента)
+ASGI_LABEL = "mongodb-vocabulary-api-fastapi-app"
 
-        client.close()
+# Тёплые контейнеры и конкурентность (читаются при `modal deploy`)
+MODAL_MIN_CONTAINERS = int(os.getenv("MODAL_MIN_CONTAINERS", "0"))
+MODAL_SCALEDOWN_WINDOW = int(os.getenv("MODAL_SCALEDOWN_WINDOW", "300"))
+MODAL_MAX_INPUTS = int(os.getenv("MODAL_MAX_INPUTS", "8"))
 
-        return {
-            "total": total,
-            "trained": trained,
-            "untrained": untrained
-        }
-    except Exception as e:
-        return {"error": str(e)}, 500
+MONGODB_SECRETS = [modal.Secret.from_name("mongodb-credentials")]
 
 
 @app.function(
-    secrets=[modal.Secret.from_name("mongodb-credentials")],
+    secrets=MONGODB_SECRETS,
+    schedule=modal.Period(hours=int(os.getenv("STATS_RECONCILE_HOURS", "6"))),
 )
-@modal.fastapi_endpoint(method="GET")
-def random_words(count: int = 5, trained: bool = False):
-    """Get random words from vocabulary"""
+def reconcile_stats():
+    """Periodic reconciliation of the vocabulary counters (fixes drift)"""
     from pymongo import MongoClient
+    from vocab_stats import reconcile_stats as reconcile
 
     MONGODB_URI = os.getenv("MONGODB_URI")
     MONGODB_DB = os.getenv("MONGODB_DB", "cluster0")
     MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "words")
+    MONGODB_STATS_COLLECTION = os.getenv("MONGODB_STATS_COLLECTION", "vocab_stats")
 
     if not MONGODB_URI:
-        return {"error": "MongoDB not configured"}, 503
+        return {"error": "MongoDB not configured"}
 
+    client = MongoClient(MONGODB_URI)
     try:
-        client = MongoClient(MONGODB_URI)
         db = client[MONGODB_DB]
-        collection = db[MONGODB_COLLECTION]
-
-        query = {"traini": True} if trained else {}
-        words = list(collection.aggregate([
-            {"$match": query},
-            {"$sample": {"size": count}}
-        ]))
-
-        # Convert ObjectId to string
-        for word in words:
-            if "_id" in word:
-                word["_id"] = str(word["_id"])
-
+        result = reconcile(db[MONGODB_COLLECTION], db[MONGODB_STATS_COLLECTION])
+        print(f"Vocabulary stats reconciled: {result}")
+        return result
+    finally:
         client.close()
 
-        return {"words": words, "count": len(words)}
-    except Exception as e:
-        return {"error": str(e)}, 500
+
+@app.cls(
+    secrets=MONGODB_SECRETS,
+    min_containers=MODAL_MIN_CONTAINERS,
+    scaledown_window=MODAL_SCALEDOWN_WINDOW,
+)
+@modal.concurrent(max_inputs=MODAL_MAX_INPUTS)
+class VocabAPI:
+    """Vocabulary API with one MongoDB client per container"""
+
+    @modal.enter()
+    def connect(self):
+        """Create the MongoDB client once when the container starts"""
+        from pymongo import MongoClient
+
+        uri = os.getenv("MONGODB_URI")
+        self.client = None
+        if not uri:
+            print("MONGODB_URI not set, vocabulary endpoints disabled")
+            return
+
+        collection_name = os.getenv("MONGODB_COLLECTION", "words")
+        # Пул рассчитан на одновременные запросы контейнера
+        self.client = MongoClient(uri, maxPoolSize=MODAL_MAX_INPUTS, serverSelectionTimeoutMS=5000)
+        db = self.client[os.getenv("MONGODB_DB", "cluster0")]
+        self.collection = db[collection_name]
+        self.stats_collection = db[os.getenv("MONGODB_STATS_COLLECTION", "vocab_stats")]
+        # Discovery и TLS здесь, а не в первом запросе
+        self.client.admin.command("ping")
+
+    @modal.exit()
+    def disconnect(self):
+        if self.client is not None:
+            self.client.close()
+
+    @modal.asgi_app(label=ASGI_LABEL)
+    def fastapi_app(self):
+        """The vocabulary API app, bound to this container's collections"""
+        from vocab_api import create_app
+
+        return create_app(
+            lambda: (self.collection, self.stats_collection) if self.client is not None else None
+        )
@@ -1,30 +1,115 @@
 """
 Modal MongoDB API Client
 HTTP client for vocabulary operations via Modal.com API
+
+All calls go through one pooled requests.Session: connections are kept
+alive between calls, idempotent GETs are retried with jittered backoff,
+and the API health state is cached instead of probed on every call.
 """
+import os
+import threading
+import time
 import requests
 import logging
+from datetime import datetime
 from typing import List, Dict, Optional
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from session_vocabulary import format_word_for_lesson
+from vocab_cache import CachedVocabularyClient
+
 logger = logging.getLogger(__name__)
 
 # Modal API base URL - replace with your actual Modal deployment URL
+# (the single FastAPI app of modal_mongodb_simple.py, routes in vocab_api.py)
 # Format: https://{workspace}--mongodb-vocabulary-api-fastapi-app.modal.run
-MODAL_API_URL = "https://sergey070373--mongodb-vocabulary-api-fastapi-app.modal.run"
+MODAL_API_URL = os.getenv(
+    "MODAL_API_URL", "https://sergey070373--mongodb-vocabulary-api-fastapi-app.modal.run"
+)
+
+# ========== TRANSPORT CONFIGURATION ==========
+MODAL_POOL_SIZE = int(os.getenv("MODAL_POOL_SIZE", "10"))
+MODAL_CONNECT_TIMEOUT = float(os.getenv("MODAL_CONNECT_TIMEOUT", "3"))
+MODAL_READ_TIMEOUT = float(os.getenv("MODAL_READ_TIMEOUT", "10"))
+MODAL_RETRIES = int(os.getenv("MODAL_RETRIES", "3"))
+MODAL_RETRY_BACKOFF = float(os.getenv("MODAL_RETRY_BACKOFF", "0.3"))
+MODAL_RETRY_JITTER = float(os.getenv("MODAL_RETRY_JITTER", "0.3"))
+# How long a health check result (or the outcome of a real call) is trusted
+MODAL_HEALTH_TTL = float(os.getenv("MODAL_HEALTH_TTL", "30"))
+# Words per batch request (the API accepts at most 200)
+MODAL_BATCH_SIZE = int(os.getenv("MODAL_BATCH_SIZE", "100"))
+
+
+def build_session(pool_size: int = MODAL_POOL_SIZE, retries: int = MODAL_RETRIES) -> requests.Session:
+    """
+    Pooled session for the vocabulary API
+
+    Only GET/HEAD are retried (on connection errors, 429 and 5xx):
+    POSTs change data and are retried by their callers (write-behind buffer).
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=MODAL_RETRY_BACKOFF,
+        backoff_jitter=MODAL_RETRY_JITTER,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class ModalVocabularyClient:
     """Client for vocabulary operations via Modal API"""
 
-    def __init__(self, api_url: str = MODAL_API_URL):
+    def __init__(self, api_url: str = MODAL_API_URL, session: Optional[requests.Session] = None):
         self.api_url = api_url
-        self.timeout = 10
+        self.timeout = (MODAL_CONNECT_TIMEOUT, MODAL_READ_TIMEOUT)
+        self.session = session or build_session()
+
+        # Cached health state: (healthy, checked_at)
+        self._health = (False, float("-inf"))
+        self._health_lock = threading.Lock()
+
+    def _get(self, path: str, **params) -> requests.Response:
+        return self._request("GET", path, params)
+
+    def _post(self, path: str, json: Optional[Dict] = None, **params) -> requests.Response:
+        return self._request("POST", path, params, json)
+
+    def _request(self, method: str, path: str, params: Dict, json: Optional[Dict] = None) -> requests.Response:
+        """Request through the pooled session; the outcome refreshes the health state"""
+        try:
+            response = self.session.request(
+                method, f"{self.api_url}{path}", params=params or None, json=json, timeout=self.timeout
+            )
+        except requests.exceptions.RequestException:
+            self._set_health(False)
+            raise
+        self._set_health(response.status_code < 500)
+        return response
+
+    def _set_health(self, healthy: bool):
+        with self._health_lock:
+            self._health = (healthy, time.monotonic())
 
     def is_connected(self) -> bool:
-        """Check if Modal API is available"""
+        """Check if Modal API is available (cached for MODAL_HEALTH_TTL seconds)"""
+        healthy, checked_at = self._health
+        if time.monotonic() - checked_at < MODAL_HEALTH_TTL:
+            return healthy
+
         try:
-            response = requests.get(f"{self.api_url}/", timeout=self.timeout)
-            return response.status_code == 200
+            return self._get("/").status_code == 200
         except Exception as e:
             logger.error(f"Failed to connect to Modal API: {e}")
             return False
@@ -32,7 +117,7 @@ class ModalVocabularyClient:
     def get_stats(self) -> Dict[str, int]:
         """Get vocabulary statistics"""
         try:
-            response = requests.get(f"{self.api_url}/stats", timeout=self.timeout)
+            response = self._get("/stats")
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -42,12 +127,7 @@ class ModalVocabularyClient:
     def get_random_words(self, count: int = 5, trained: bool = False) -> List[Dict]:
         """Get random words from vocabulary"""
         try:
-            params = {"count": count, "trained": trained}
-            response = requests.get(
-                f"{self.api_url}/words/random",
-                params=params,
-                timeout=self.timeout
-            )
+            response = self._get("/words/random", count=count, trained=trained)
             response.raise_for_status()
             data = response.json()
             return data.get("words", [])
@@ -58,12 +138,7 @@ class ModalVocabularyClient:
     def get_untrained_words(self, count: int = 10) -> List[Dict]:
         """Get untrained words"""
         try:
-            params = {"count": count}
-            response = requests.get(
-                f"{self.api_url}/words/untrained",
-                params=params,
-                timeout=self.timeout
-            )
+            response = self._get("/words/untrained", count=count)
             response.raise_for_status()
             data = response.json()
             return data.get("words", [])
@@ -74,12 +149,7 @@ class ModalVocabularyClient:
     def search_word(self, word: str) -> Optional[Dict]:
         """Search for a specific word"""
         try:
-            params = {"word": word}
-            response = requests.get(
-                f"{self.api_url}/words/search",
-                params=params,
-                timeout=self.timeout
-            )
+            response = self._get("/words/search", word=word)
             response.raise_for_status()
             data = response.json()
             return data.get("word")
@@ -96,11 +166,7 @@ class ModalVocabularyClient:
     def mark_word_as_trained(self, word: str) -> bool:
         """Mark word as trained"""
         try:
-            response = requests.post(
-                f"{self.api_url}/words/mark-trained",
-                params={"word": word},
-                timeout=self.timeout
-            )
+            response = self._post("/words/mark-trained", word=word)
             response.raise_for_status()
             data = response.json()
             return data.get("success", False)
@@ -108,32 +174,123 @@ class ModalVocabularyClient:
             logger.error(f"Failed to mark word as trained: {e}")
             return False
 
-    def format_word_for_lesson(self, word_data: Dict) -> str:
-        """Format word for lesson"""
-        word = word_data.get("word", "")
-        translate = word_data.get("translate", "")
-        transcript = word_data.get("transcript", "")
+    def search_words(self, words: List[str]) -> Dict[str, Optional[Dict]]:
+        """Look up many words in one request (None for words not in vocabulary)"""
+        result: Dict[str, Optional[Dict]] = {word: None for word in words}
+        try:
+            for start in range(0, len(words), MODAL_BATCH_SIZE):
+                batch = words[start:start + MODAL_BATCH_SIZE]
+                response = self._get("/words/lookup", words=",".join(batch))
+                response.raise_for_status()
+                result.update(response.json().get("words", {}))
+            return result
+        except Exception as e:
+            logger.error(f"Failed to look up words: {e}")
+            return result
+
+    def mark_words_as_trained(self, words: List[str]) -> bool:
+        """Mark several words as trained (one request per batch)"""
+        try:
+            for start in range(0, len(words), MODAL_BATCH_SIZE):
+                batch = words[start:start + MODAL_BATCH_SIZE]
+                response = self._post("/words/mark-trained-batch", json={"words": batch})
+                response.raise_for_status()
+                data = response.json()
+                if not data.get("success", False):
+                    return False
+                logger.info(f"Marked {len(batch)} words as trained ({data.get('newly_trained', 0)} new)")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to mark words as trained: {e}")
+            return False
 
-        text = f"Let's practice the word '{word}'."
+    def get_due_words(self, count: int = 5) -> List[Dict]:
+        """Get words whose review is due (most overdue first)"""
+        try:
+            response = self._get("/words/due", count=count)
+            response.raise_for_status()
+            return response.json().get("words", [])
+        except Exception as e:
+            logger.error(f"Failed to get due words: {e}")
+            return []
 
-        if transcript:
-            text += f" The pronunciation is [{transcript}]."
+    def review_words(
+        self,
+        words: List[str],
+        quality: Optional[int] = None,
+        reviewed_at: Optional[Dict[str, datetime]] = None,
+    ) -> bool:
+        """Record reviews of several words (one request per batch), at their practice times (UTC) if given"""
+        try:
+            for start in range(0, len(words), MODAL_BATCH_SIZE):
+                batch = words[start:start + MODAL_BATCH_SIZE]
+                body = {"words": batch}
+                if quality is not None:
+                    body["quality"] = quality
+                if reviewed_at:
+                    body["reviewed_at"] = {
+                        word: reviewed_at[word].isoformat() for word in batch if word in reviewed_at
+                    }
+                response = self._post("/words/review-batch", json=body)
+                if response.status_code != 200:
+                    # Пачку повторит write-behind буфер; ответ сервера — в лог, а не молча
+                    logger.error(
+                        f"Review batch of {len(batch)} words rejected: "
+                        f"HTTP {response.status_code} {response.text[:200]}"
+                    )
+                    return False
+                data = response.json()
+                if not data.get("success", False):
+                    logger.error(f"Review batch of {len(batch)} words not applied: {data}")
+                    return False
+                logger.info(f"Reviewed {data.get('reviewed', 0)} words ({data.get('newly_trained', 0)} new)")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to review {len(words)} words: {e}")
+            return False
 
-        if translate:
-            text += f" In Russian, it means '{translate}'."
+    def get_session_bootstrap(
+        self, count: int = 5, untrained_count: int = 10, trained: bool = False, due_count: int = 0
+    ) -> Dict:
+        """Stats, due, random and untrained words for a lesson in one request"""
+        try:
+            response = self._get(
+                "/session/bootstrap",
+                count=count, untrained_count=untrained_count, trained=trained, due_count=due_count,
+            )
+            response.raise_for_status()
+            data = response.json()
+            return {
+                "stats": data.get("stats", {"total": 0, "trained": 0, "untrained": 0}),
+                "due_words": data.get("due_words", []),
+                "random_words": data.get("random_words", []),
+                "untrained_words": data.get("untrained_words", []),
+            }
+        except Exception as e:
+            logger.error(f"Failed to bootstrap session: {e}")
+            return {
+                "stats": {"total": 0, "trained": 0, "untrained": 0},
+                "due_words": [],
+                "random_words": [],
+                "untrained_words": [],
+            }
 
-        text += f" Can you use '{word}' in a sentence?"
+    def format_word_for_lesson(self, word_data: Dict) -> str:
+        """Format word for lesson"""
+        return format_word_for_lesson(word_data)
 
-        return text
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
 
 
 # Singleton instance
 _vocab_client = None
 
 
-def get_vocabulary_client() -> ModalVocabularyClient:
-    """Get global instance of ModalVocabularyClient"""
+def get_vocabulary_client() -> CachedVocabularyClient:
+    """Get global instance of ModalVocabularyClient (with word lookup cache)"""
     global _vocab_client
     if _vocab_client is None:
-        _vocab_client = ModalVocabularyClient()
+        _vocab_client = CachedVocabularyClient(ModalVocabularyClient())
     return _vocab_client
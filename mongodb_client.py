@@ -5,9 +5,18 @@ import os
 import logging
 from typing import List, Dict, Optional
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 from dotenv import load_dotenv
 
+import mongodb_indexes
+import spaced_repetition
+import vocab_queries
+import vocab_sampling
+import vocab_stats
+from session_vocabulary import format_word_for_lesson
+from vocab_cache import CachedVocabularyClient
+
 # Загружаем .env файл
 load_dotenv()
 
@@ -23,28 +32,51 @@ class VocabularyClient:
     """Клиент для работы со словарём в MongoDB"""
 
     def __init__(self):
+        # Позиция обхода не тренированных слов по кругу (ключ rand)
+        self._untrained_after = vocab_sampling.random_key()
+
         if not MONGODB_URI:
             logger.warning("⚠️ MONGODB_URI not set, vocabulary features disabled")
             self.client = None
             self.db = None
             self.collection = None
+            self.stats_collection = None
             return
 
         try:
             self.client = MongoClient(MONGODB_URI)
             self.db = self.client[MONGODB_DB]
             self.collection = self.db[MONGODB_COLLECTION]
+            self.stats_collection = self.db[vocab_stats.MONGODB_STATS_COLLECTION]
             logger.info(f"✅ Connected to MongoDB: {MONGODB_DB}.{MONGODB_COLLECTION}")
         except Exception as e:
             logger.error(f"❌ Failed to connect to MongoDB: {e}")
             self.client = None
             self.db = None
             self.collection = None
+            self.stats_collection = None
 
     def is_connected(self) -> bool:
         """Проверка подключения к MongoDB"""
         return self.collection is not None
 
+    def ensure_indexes(self) -> bool:
+        """
+        Выдать словам ключи выборки и состояние повторения, создать индексы
+        и проверить планы горячих запросов
+
+        Returns:
+            bool: Индексы на месте и ни один запрос не делает COLLSCAN
+        """
+        if not self.is_connected():
+            return False
+
+        try:
+            return mongodb_indexes.prepare_collection(self.collection)
+        except Exception as e:
+            logger.error(f"❌ Failed to ensure indexes: {e}")
+            return False
+
     def get_random_words(self, count: int = 5, trained: bool = False) -> List[Dict]:
         """
         Получить случайные слова из словаря
@@ -56,15 +88,20 @@ class VocabularyClient:
         Returns:
             List[Dict]: Список словарей со словами
         """
-        if not self.is_connected():
+        if not self.is_connected() or count < 1:
             return []
 
         try:
-            query = {"traini": True} if trained else {}
-            words = list(self.collection.aggregate([
-                {"$match": query},
-                {"$sample": {"size": count}}
-            ]))
+            query = vocab_queries.random_query(trained)
+            found = {}
+            for _ in range(vocab_sampling.SAMPLE_MAX_ROUNDS):
+                missing = count - len(found)
+                if missing <= 0:
+                    break
+                vocab_sampling.merge_unique(found, self.collection.aggregate(
+                    vocab_sampling.sample_pipeline(query, missing)
+                ))
+            words = list(found.values())[:count]
 
             logger.info(f"📚 Retrieved {len(words)} words from MongoDB")
             return words
@@ -74,14 +111,30 @@ class VocabularyClient:
             return []
 
     def get_untrained_words(self, count: int = 10) -> List[Dict]:
-        """Получить не тренированные слова (traini=False)"""
+        """
+        Получить не тренированные слова (traini=False)
+
+        Слова идут страницами в случайном, но стабильном порядке ключа rand:
+        каждый вызов продолжает с места предыдущего, а после конца словаря
+        обход начинается сначала.
+        """
         if not self.is_connected():
             return []
 
         try:
-            words = list(self.collection.find(
-                {"traini": False}
+            after_cursor, wrapped = vocab_sampling.rotation_queries(vocab_queries.UNTRAINED_QUERY, self._untrained_after)
+            words = list(self.collection.find(after_cursor).sort(
+                vocab_sampling.RANDOM_FIELD, 1
             ).limit(count))
+            if len(words) < count:
+                words += list(self.collection.find(wrapped).sort(
+                    vocab_sampling.RANDOM_FIELD, 1
+                ).limit(count - len(words)))
+            if words:
+                self._untrained_after = words[-1][vocab_sampling.RANDOM_FIELD]
+            else:
+                # Ключи rand ещё не выданы (нет миграции) — первые слова как раньше
+                words = list(self.collection.find(vocab_queries.UNTRAINED_QUERY).limit(count))
 
             logger.info(f"📖 Retrieved {len(words)} untrained words")
             return words
@@ -90,6 +143,72 @@ class VocabularyClient:
             logger.error(f"❌ Failed to get untrained words: {e}")
             return []
 
+    def get_due_words(self, count: int = 5) -> List[Dict]:
+        """
+        Получить слова, которые пора повторить (самые просроченные первыми)
+
+        Запрос идёт по индексу due: O(k log n) без скана коллекции.
+        """
+        if not self.is_connected():
+            return []
+
+        try:
+            words = list(self.collection.find(
+                spaced_repetition.due_query(datetime.utcnow())
+            ).sort(spaced_repetition.DUE_FIELD, 1).limit(count))
+
+            logger.info(f"🗓 Retrieved {len(words)} due words")
+            return words
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get due words: {e}")
+            return []
+
+    def review_words(
+        self,
+        words: List[str],
+        quality: int = spaced_repetition.SRS_PRACTICED_QUALITY,
+        reviewed_at: Optional[Dict[str, datetime]] = None,
+    ) -> bool:
+        """
+        Записать повторение пачки слов (SM-2): один find и один bulk_write
+
+        Args:
+            words: Английские слова
+            quality: Оценка ответа 0-5
+            reviewed_at: Время практики по словам (UTC); по умолчанию — сейчас
+
+        Returns:
+            bool: Выполнена ли запись (не найденные слова не считаются ошибкой)
+        """
+        if not words:
+            return True
+        if not self.is_connected():
+            return False
+
+        try:
+            now = datetime.utcnow()
+            documents = self.collection.find(
+                vocab_queries.words_query(words), spaced_repetition.REVIEW_PROJECTION
+            )
+            repeats, first_reviews = spaced_repetition.review_operations(
+                documents, quality, now, reviewed_at
+            )
+            if repeats:
+                self.collection.bulk_write(repeats, ordered=False)
+            newly_trained = 0
+            if first_reviews:
+                # Считаем только совпавшие записи: слово мог уже отметить другой процесс
+                newly_trained = self.collection.bulk_write(first_reviews, ordered=False).matched_count
+            if newly_trained:
+                self._increment_stats(trained=newly_trained)
+            logger.info(f"🗓 Reviewed {len(repeats) + len(first_reviews)} words ({newly_trained} new)")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Failed to review words: {e}")
+            return False
+
     def mark_word_as_trained(self, word: str) -> bool:
         """
         Отметить слово как тренированное
@@ -104,15 +223,20 @@ class VocabularyClient:
             return False
 
         try:
+            now = datetime.utcnow()
+            # Фильтр по traini отделяет переход "не тренировано → тренировано"
+            # (его учитываем в счётчиках) от обновления даты повторной тренировки
             result = self.collection.update_one(
-                {"word": word},
-                {
-                    "$set": {
-                        "traini": True,
-                        "trainDate": datetime.utcnow()
-                    }
-                }
+                vocab_queries.word_untrained_query(word),
+                vocab_queries.mark_trained_update(now)
             )
+            if result.modified_count > 0:
+                self._increment_stats(trained=1)
+            else:
+                result = self.collection.update_one(
+                    vocab_queries.word_query(word),
+                    vocab_queries.retrain_update(now)
+                )
 
             if result.modified_count > 0:
                 logger.info(f"✅ Marked word '{word}' as trained")
@@ -125,6 +249,72 @@ class VocabularyClient:
             logger.error(f"❌ Failed to mark word as trained: {e}")
             return False
 
+    def mark_words_as_trained(self, words: List[str]) -> bool:
+        """
+        Отметить несколько слов как тренированные одним bulk_write
+
+        Args:
+            words: Английские слова
+
+        Returns:
+            bool: Выполнена ли запись (не найденные слова не считаются ошибкой)
+        """
+        if not words:
+            return True
+        if not self.is_connected():
+            return False
+
+        try:
+            now = datetime.utcnow()
+            # Сначала дата повторной тренировки, затем переходы в traini=True:
+            # modified_count второго запроса — ровно прирост счётчика trained
+            self.collection.update_many(
+                vocab_queries.words_trained_query(words),
+                vocab_queries.retrain_update(now)
+            )
+            result = self.collection.update_many(
+                vocab_queries.words_untrained_query(words),
+                vocab_queries.mark_trained_update(now)
+            )
+            if result.modified_count:
+                self._increment_stats(trained=result.modified_count)
+            logger.info(f"✅ Marked {len(words)} words as trained ({result.modified_count} new)")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Failed to mark words as trained: {e}")
+            return False
+
+    def add_word(self, word: str, translate: str = "", transcript: str = "") -> bool:
+        """
+        Добавить слово в словарь (не тренированным)
+
+        Returns:
+            bool: True, если слово добавлено (False — уже есть или ошибка)
+        """
+        if not self.is_connected():
+            return False
+
+        try:
+            self.collection.insert_one({
+                "word": word,
+                "translate": translate,
+                "transcript": transcript,
+                "traini": False,
+                "trainDate": None,
+                vocab_sampling.RANDOM_FIELD: vocab_sampling.random_key(),
+            })
+            self._increment_stats(total=1)
+            logger.info(f"➕ Added word '{word}'")
+            return True
+
+        except DuplicateKeyError:
+            logger.warning(f"⚠️ Word '{word}' already in vocabulary")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Failed to add word: {e}")
+            return False
+
     def search_word(self, word: str) -> Optional[Dict]:
         """
         Найти слово в словаре
@@ -139,7 +329,7 @@ class VocabularyClient:
             return None
 
         try:
-            word_data = self.collection.find_one({"word": word})
+            word_data = self.collection.find_one(vocab_queries.word_query(word))
 
             if word_data:
                 logger.info(f"🔍 Found word '{word}': {word_data.get('translate')}")
@@ -152,6 +342,26 @@ class VocabularyClient:
             logger.error(f"❌ Failed to search word: {e}")
             return None
 
+    def search_words(self, words: List[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Найти несколько слов одним запросом
+
+        Returns:
+            Dict[str, Optional[Dict]]: Слово → данные слова или None
+        """
+        result: Dict[str, Optional[Dict]] = {word: None for word in words}
+        if not self.is_connected() or not words:
+            return result
+
+        try:
+            for word_data in self.collection.find(vocab_queries.words_query(words)):
+                result[word_data["word"]] = word_data
+            return result
+
+        except Exception as e:
+            logger.error(f"❌ Failed to search words: {e}")
+            return result
+
     def get_word_count(self) -> Dict[str, int]:
         """
         Получить статистику словаря
@@ -160,25 +370,54 @@ class VocabularyClient:
             Dict[str, int]: {"total": X, "trained": Y, "untrained": Z}
         """
         if not self.is_connected():
-            return {"total": 0, "trained": 0, "untrained": 0}
+            return dict(vocab_stats.EMPTY_STATS)
 
         try:
-            total = self.collection.count_documents({})
-            trained = self.collection.count_documents({"traini": True})
-            untrained = total - trained
-
-            stats = {
-                "total": total,
-                "trained": trained,
-                "untrained": untrained
-            }
-
+            # Один поиск по _id; документ создаётся и сверяется полным подсчётом
+            stats = vocab_stats.read_stats(self.collection, self.stats_collection)
             logger.info(f"📊 Vocabulary stats: {stats}")
             return stats
 
         except Exception as e:
             logger.error(f"❌ Failed to get word count: {e}")
-            return {"total": 0, "trained": 0, "untrained": 0}
+            return dict(vocab_stats.EMPTY_STATS)
+
+    def get_estimated_total(self) -> int:
+        """Приблизительное число слов по метаданным коллекции (без подсчёта)"""
+        if not self.is_connected():
+            return 0
+
+        try:
+            return self.collection.estimated_document_count()
+        except Exception as e:
+            logger.error(f"❌ Failed to estimate word count: {e}")
+            return 0
+
+    def reconcile_stats(self) -> Dict[str, int]:
+        """Пересчитать счётчики словаря полным подсчётом (сверка)"""
+        if not self.is_connected():
+            return dict(vocab_stats.EMPTY_STATS)
+
+        try:
+            return vocab_stats.reconcile_stats(self.collection, self.stats_collection)
+        except Exception as e:
+            logger.error(f"❌ Failed to reconcile stats: {e}")
+            return dict(vocab_stats.EMPTY_STATS)
+
+    def _increment_stats(self, total: int = 0, trained: int = 0):
+        """
+        Атомарно изменить счётчики; при ошибке расхождение исправит сверка
+
+        Документ не создаётся здесь (upsert дал бы неполные счётчики):
+        его создаёт первый get_word_count полным подсчётом.
+        """
+        try:
+            self.stats_collection.update_one(
+                vocab_stats.stats_key(self.collection.name),
+                vocab_stats.increment_update(total, trained)
+            )
+        except Exception as e:
+            logger.error(f"❌ Failed to update stats: {e}")
 
     def format_word_for_lesson(self, word_data: Dict) -> str:
         """
@@ -190,24 +429,7 @@ class VocabularyClient:
         Returns:
             str: Отформатированный текст для урока
         """
-        word = word_data.get("word", "")
-        translate = word_data.get("translate", "")
-        transcript = word_data.get("transcript", "")
-
-        # Базовый формат
-        text = f"Let's practice the word '{word}'."
-
-        # Добавляем транскрипцию если есть
-        if transcript:
-            text += f" The pronunciation is [{transcript}]."
-
-        # Добавляем перевод
-        if translate:
-            text += f" In Russian, it means '{translate}'."
-
-        text += f" Can you use '{word}' in a sentence?"
-
-        return text
+        return format_word_for_lesson(word_data)
 
     def close(self):
         """Закрыть соединение с MongoDB"""
@@ -220,9 +442,9 @@ class VocabularyClient:
 _vocabulary_client = None
 
 
-def get_vocabulary_client() -> VocabularyClient:
-    """Получить глобальный instance VocabularyClient"""
+def get_vocabulary_client() -> CachedVocabularyClient:
+    """Получить глобальный instance VocabularyClient (с кэшем поиска слов)"""
     global _vocabulary_client
     if _vocabulary_client is None:
-        _vocabulary_client = VocabularyClient()
+        _vocabulary_client = CachedVocabularyClient(VocabularyClient())
     return _vocabulary_client
@@ -0,0 +1,274 @@
+"""
+Индексы коллекции словаря и проверка планов запросов
+
+Все горячие запросы клиентов словаря фильтруют по `word`, `traini` или `due`.
+Модуль создаёт нужные индексы, проверяет, что они на месте, и прогоняет
+explain для каждого такого запроса: план с COLLSCAN считается ошибкой.
+Проверяемые запросы строятся теми же функциями, что и запросы клиентов
+(vocab_queries, vocab_sampling, spaced_repetition, vocab_snapshot).
+
+Запуск:
+    python mongodb_indexes.py               # миграции (rand, состояние повторения), индексы, проверка планов
+    python mongodb_indexes.py --check-only  # только проверка (код выхода 1 при ошибке)
+"""
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+
+import spaced_repetition
+import vocab_queries
+import vocab_sampling
+import vocab_snapshot
+from spaced_repetition import DUE_FIELD, migrate_review_state
+from vocab_sampling import RANDOM_FIELD, backfill_random_keys
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    """Ожидаемый индекс коллекции"""
+    name: str
+    keys: List[tuple]
+    unique: bool = False
+
+
+# ========== ИНДЕКСЫ ==========
+INDEXES: List[IndexSpec] = [
+    # search_word, mark_word_as_trained: точный поиск слова
+    IndexSpec("word_unique", [("word", ASCENDING)], unique=True),
+    # get_untrained_words, get_random_words(trained=True), сверка счётчиков
+    IndexSpec("traini_trainDate", [("traini", ASCENDING), ("trainDate", ASCENDING)]),
+    # get_untrained_words: обход не тренированных слов по кругу (см. vocab_sampling)
+    IndexSpec("traini_rand", [("traini", ASCENDING), (RANDOM_FIELD, ASCENDING)]),
+    # get_due_words: ближайшие сроки повторения (см. spaced_repetition)
+    IndexSpec("due", [(DUE_FIELD, ASCENDING)]),
+    # Опрос снимка словаря: слова с новым trainDate (см. vocab_snapshot.poll_query)
+    IndexSpec("trainDate", [("trainDate", ASCENDING)]),
+]
+
+# Слова для explain: план не зависит от того, есть ли они в коллекции
+_PROBE_WORD = "__index_probe__"
+_PROBE_WORDS = [_PROBE_WORD, "__index_probe_2__"]
+# Документ для фильтра записи повторения (bulk_write review_words)
+_PROBE_DOCUMENT = {"_id": "__index_probe__", "word": _PROBE_WORD, "reps": 1}
+
+
+def ensure_indexes(collection: Collection) -> List[str]:
+    """
+    Создать недостающие индексы (create_indexes идемпотентен)
+
+    Returns:
+        List[str]: Имена индексов коллекции из INDEXES
+    """
+    models = [
+        IndexModel(spec.keys, name=spec.name, unique=spec.unique)
+        for spec in INDEXES
+    ]
+    try:
+        names = collection.create_indexes(models)
+    except OperationFailure as e:
+        # Дубликаты слов не дают построить уникальный индекс — показываем какие
+        duplicates = find_duplicate_words(collection)
+        if duplicates:
+            logger.error(f"❌ Duplicate words block the unique index: {duplicates[:10]}")
+        raise e
+
+    logger.info(f"✅ Indexes ensured: {names}")
+    return names
+
+
+def find_duplicate_words(collection: Collection, limit: int = 100) -> List[str]:
+    """Слова, встречающиеся в коллекции больше одного раза"""
+    pipeline = [
+        {"$group": {"_id": "$word", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [doc["_id"] for doc in collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+def validate_indexes(collection: Collection) -> List[str]:
+    """
+    Проверить, что индексы из INDEXES существуют с нужными ключами и опциями
+
+    Returns:
+        List[str]: Описание проблем (пустой список — всё в порядке)
+    """
+    existing = {
+        tuple((field, direction) for field, direction in info["key"]): info
+        for info in collection.index_information().values()
+    }
+
+    problems = []
+    for spec in INDEXES:
+        info = existing.get(tuple(spec.keys))
+        if info is None:
+            problems.append(f"missing index {spec.name} on {spec.keys}")
+        elif spec.unique and not info.get("unique", False):
+            problems.append(f"index on {spec.keys} is not unique")
+    return problems
+
+
+# ========== ПЛАНЫ ЗАПРОСОВ ==========
+def _explain_command(collection: Collection, command: Dict) -> Dict:
+    return collection.database.command("explain", command, verbosity="queryPlanner")
+
+
+def _explain_aggregate(collection: Collection, pipeline: List[Dict]) -> Dict:
+    return _explain_command(collection, {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}})
+
+
+def _explain_update(collection: Collection, query: Dict, update: Dict, multi: bool = False) -> Dict:
+    return _explain_command(collection, {
+        "update": collection.name,
+        "updates": [{"q": query, "u": update, "multi": multi}],
+    })
+
+
+def _explain_count(collection: Collection, query: Dict) -> Dict:
+    # count_documents выполняется как $match + $group
+    return _explain_aggregate(collection, [{"$match": query}, {"$group": {"_id": 1, "n": {"$sum": 1}}}])
+
+
+# Запросы клиентов словаря с фильтром (запросы без фильтра индекс не ускорит)
+QUERY_PLANS: Dict[str, Callable[[Collection], Dict]] = {
+    "search_word": lambda c: c.find(vocab_queries.word_query(_PROBE_WORD)).explain(),
+    # search_words, /words/lookup, чтение пачки в review_words
+    "search_words": lambda c: c.find(
+        vocab_queries.words_query(_PROBE_WORDS), spaced_repetition.REVIEW_PROJECTION
+    ).explain(),
+    "mark_word_as_trained": lambda c: _explain_update(
+        c, vocab_queries.word_untrained_query(_PROBE_WORD), vocab_queries.mark_trained_update(datetime.utcnow())
+    ),
+    "mark_word_as_trained(retrain)": lambda c: _explain_update(
+        c, vocab_queries.word_query(_PROBE_WORD), vocab_queries.retrain_update(datetime.utcnow())
+    ),
+    "mark_words_as_trained(retrain)": lambda c: _explain_update(
+        c, vocab_queries.words_trained_query(_PROBE_WORDS), vocab_queries.retrain_update(datetime.utcnow()),
+        multi=True,
+    ),
+    "mark_words_as_trained": lambda c: _explain_update(
+        c, vocab_queries.words_untrained_query(_PROBE_WORDS), vocab_queries.mark_trained_update(datetime.utcnow()),
+        multi=True,
+    ),
+    "review_words(update)": lambda c: _explain_update(
+        c,
+        spaced_repetition.review_filter(_PROBE_DOCUMENT),
+        spaced_repetition.review_update(spaced_repetition.ReviewState(), datetime.utcnow()),
+    ),
+    "get_untrained_words": lambda c: c.find(
+        vocab_sampling.rotation_queries(vocab_queries.UNTRAINED_QUERY, 0.5)[0]
+    ).sort(RANDOM_FIELD, 1).limit(10).explain(),
+    "get_due_words": lambda c: c.find(
+        spaced_repetition.due_query(datetime.utcnow())
+    ).sort(DUE_FIELD, 1).limit(5).explain(),
+    "get_random_words": lambda c: _explain_aggregate(
+        c, vocab_sampling.sample_pipeline(vocab_queries.random_query(False), 2)
+    ),
+    "get_random_words(trained=True)": lambda c: _explain_aggregate(
+        c, vocab_sampling.sample_pipeline(vocab_queries.random_query(True), 2)
+    ),
+    "snapshot_poll": lambda c: c.find(
+        vocab_snapshot.poll_query(datetime.utcnow() - timedelta(minutes=1))
+    ).explain(),
+    "reconcile_stats": lambda c: _explain_count(c, vocab_queries.TRAINED_QUERY),
+}
+
+
+def find_plan_stages(explain: Dict, stage: str) -> List[str]:
+    """
+    Пути до узлов выигравшего плана с заданной стадией
+
+    Обходит всё дерево explain (find, aggregate с $cursor, update, классический
+    и SBE планировщики), пропуская отвергнутые планы.
+    """
+    found = []
+
+    def walk(node, path):
+        if isinstance(node, dict):
+            if node.get("stage") == stage:
+                found.append(path or "/")
+            for key, value in node.items():
+                if key != "rejectedPlans":
+                    walk(value, f"{path}/{key}")
+        elif isinstance(node, list):
+            for i, value in enumerate(node):
+                walk(value, f"{path}[{i}]")
+
+    walk(explain, "")
+    return found
+
+
+def verify_query_plans(collection: Collection) -> Dict[str, List[str]]:
+    """
+    Прогнать explain для каждого запроса из QUERY_PLANS
+
+    Returns:
+        Dict[str, List[str]]: Запрос → найденные COLLSCAN (только проблемные запросы)
+    """
+    collscans = {}
+    for name, explain in QUERY_PLANS.items():
+        stages = find_plan_stages(explain(collection), "COLLSCAN")
+        if stages:
+            collscans[name] = stages
+            logger.error(f"❌ {name}: COLLSCAN at {stages}")
+        else:
+            logger.info(f"✅ {name}: uses index")
+    return collscans
+
+
+def check_collection(collection: Collection) -> bool:
+    """Индексы на месте и ни один запрос не сканирует коллекцию целиком"""
+    problems = validate_indexes(collection)
+    for problem in problems:
+        logger.error(f"❌ {problem}")
+    collscans = verify_query_plans(collection)
+    return not problems and not collscans
+
+
+def prepare_collection(collection: Collection) -> bool:
+    """
+    Миграции (ключи rand, состояние повторения), индексы и проверка планов
+
+    Returns:
+        bool: Индексы на месте и ни один запрос не делает COLLSCAN
+    """
+    backfilled = backfill_random_keys(collection)
+    if backfilled:
+        logger.info(f"🎲 Random keys assigned to {backfilled} words")
+    migrated = migrate_review_state(collection)
+    if migrated:
+        logger.info(f"🗓 Review state assigned to {migrated} trained words")
+    ensure_indexes(collection)
+    return check_collection(collection)
+
+
+def main(argv: List[str]) -> int:
+    from mongodb_client import VocabularyClient
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    vocab = VocabularyClient()
+    if not vocab.is_connected():
+        logger.error("❌ MONGODB_URI not set")
+        return 2
+
+    try:
+        if "--check-only" not in argv:
+            backfilled = backfill_random_keys(vocab.collection)
+            logger.info(f"🎲 Random keys assigned to {backfilled} words")
+            migrated = migrate_review_state(vocab.collection)
+            logger.info(f"🗓 Review state assigned to {migrated} trained words")
+            ensure_indexes(vocab.collection)
+        return 0 if check_collection(vocab.collection) else 1
+    finally:
+        vocab.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,289 @@
+"""
+Кэш новостей с TTL, stale-while-revalidate и фоновым обновлением
+
+Ключ — источник новости ("n8n", "rss:<url>"). Свежая запись отдаётся из
+памяти, устаревшая (в пределах stale окна) отдаётся сразу и обновляется в
+фоне, истёкшая загружается заново. Одновременные промахи по одному ключу
+делят один запрос к источнику (single-flight).
+
+Каждая задача LiveKit живёт в своём процессе, поэтому записи хранятся ещё и
+в JSON файле (как хранилище фидов): процесс читает его в prewarm и
+перечитывает, когда файл изменился, а после загрузки дописывает свою
+запись. Так новость, загруженная одной сессией, достаётся следующим, а
+недоступность источника (пустой ответ) не оплачивается таймаутом в каждой.
+
+Счётчики кэша (hit/miss/stale, обновления, чтения файла) попадают и в
+метрики процесса (tutor_news_cache_total), то есть в /metrics воркера.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ========== CACHE CONFIGURATION (секунды) ==========
+NEWS_CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", "900"))
+NEWS_CACHE_STALE_TTL = float(os.getenv("NEWS_CACHE_STALE_TTL", "3600"))
+NEWS_CACHE_NEGATIVE_TTL = float(os.getenv("NEWS_CACHE_NEGATIVE_TTL", "60"))
+NEWS_CACHE_REFRESH_INTERVAL = float(os.getenv("NEWS_CACHE_REFRESH_INTERVAL", "300"))
+# Файл, общий для процессов агента (пустая строка — только память процесса)
+NEWS_CACHE_PATH = os.getenv("NEWS_CACHE_PATH", os.path.join("data", "news_cache.json"))
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class _CacheEntry:
+    # fetched_at — время time.time(): записи сравниваются между процессами
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value: Any, fetched_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class NewsCache:
+    """Кэш новостей по источникам со счётчиками hit/miss/stale"""
+
+    def __init__(
+        self,
+        ttl: float = NEWS_CACHE_TTL,
+        stale_ttl: float = NEWS_CACHE_STALE_TTL,
+        negative_ttl: float = NEWS_CACHE_NEGATIVE_TTL,
+        refresh_interval: float = NEWS_CACHE_REFRESH_INTERVAL,
+        path: Optional[str] = NEWS_CACHE_PATH,
+        registry: Optional[metrics.MetricsRegistry] = None,
+    ):
+        """
+        Args:
+            registry: Метрики процесса, куда дублируются счётчики (None — только stats())
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self.path = path or None
+        self.registry = registry
+
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._loaders: Dict[str, Loader] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # mtime прочитанного файла: перечитываем, только если его изменил другой процесс
+        self._file_mtime = None
+
+        # Задачи asyncio привязаны к своему loop — храним их отдельно для каждого
+        self._inflight = weakref.WeakKeyDictionary()
+        self._refreshers = weakref.WeakKeyDictionary()
+
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "disk_loads": 0,
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+        if self.registry is not None:
+            self.registry.inc("tutor_news_cache_total", event=name)
+
+    def _entry_ttl(self, entry: _CacheEntry) -> float:
+        # Пустой ответ (источник недоступен) кэшируем коротко,
+        # чтобы не платить таймаут источника в каждой сессии
+        return self.ttl if entry.value is not None else self.negative_ttl
+
+    async def get(self, key: str, loader: Loader) -> Any:
+        """
+        Получить значение из кэша или загрузить его через loader
+
+        Args:
+            key: Ключ источника
+            loader: Корутина без аргументов, загружающая значение
+
+        Returns:
+            Значение из кэша, устаревшее значение (с фоновым обновлением) или свежезагруженное
+        """
+        self._loaders[key] = loader
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry.fetched_at >= self._entry_ttl(entry):
+            # Возможно, источник уже загрузил другой процесс (чтение файла — не в event loop)
+            await asyncio.to_thread(self.load)
+            entry = self._entries.get(key)
+
+        if entry is not None:
+            age = time.time() - entry.fetched_at
+            if age < self._entry_ttl(entry):
+                self._count("hits")
+                return entry.value
+
+            if entry.value is not None and age < self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                self._start_load(key, loader)
+                return entry.value
+
+        self._count("misses")
+        # shield: отмена ожидающей сессии не должна отменять общий запрос
+        return await asyncio.shield(self._start_load(key, loader))
+
+    def _start_load(self, key: str, loader: Loader) -> "asyncio.Task":
+        """Запустить загрузку ключа или присоединиться к уже идущей"""
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        task = inflight.get(key)
+        if task is None or task.done():
+            task = loop.create_task(self._load(key, loader))
+            inflight[key] = task
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+        return task
+
+    async def _load(self, key: str, loader: Loader) -> Any:
+        try:
+            value = await loader()
+        except Exception as e:
+            self._count("refresh_errors")
+            logger.error(f"News cache refresh failed for '{key}': {e}")
+            entry = self._entries.get(key)
+            return entry.value if entry is not None else None
+
+        previous = self._entries.get(key)
+        if value is None and previous is not None and previous.value is not None:
+            # Источник временно недоступен — оставляем последнюю удачную новость
+            # (она доживёт до конца stale окна)
+            self._count("refresh_errors")
+            return previous.value
+
+        with self._lock:
+            self._entries[key] = _CacheEntry(value, time.time())
+        self._count("refreshes")
+        if self.path is not None:
+            await asyncio.to_thread(self.save)
+        return value
+
+    # ---------- Файл ----------
+    def load(self) -> bool:
+        """
+        Прочитать записи из файла, если он изменился с прошлого чтения
+
+        Запись из файла заменяет свою, только если она новее.
+
+        Returns:
+            bool: Прочитан ли файл
+        """
+        if self.path is None:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._file_mtime:
+                return False
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Cannot read news cache {self.path}: {e}")
+            return False
+
+        with self._lock:
+            self._file_mtime = mtime
+            for key, record in data.items():
+                entry = self._entries.get(key)
+                if entry is None or record["fetched_at"] > entry.fetched_at:
+                    self._entries[key] = _CacheEntry(record["value"], record["fetched_at"])
+        self._count("disk_loads")
+        return True
+
+    def save(self):
+        """Дописать свои записи в файл атомарно (tmp + rename), сохранив более новые чужие"""
+        with self._save_lock:
+            # Записи других процессов, появившиеся после нашего чтения
+            self.load()
+            with self._lock:
+                data = {
+                    key: {"value": entry.value, "fetched_at": entry.fetched_at}
+                    for key, entry in self._entries.items()
+                }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, default=str)
+                os.replace(tmp_path, self.path)
+                with self._lock:
+                    self._file_mtime = os.stat(self.path).st_mtime_ns
+            except Exception as e:
+                logger.error(f"❌ Failed to save news cache {self.path}: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def ensure_refresher(self):
+        """Запустить фоновое обновление в текущем event loop (идемпотентно)"""
+        loop = asyncio.get_running_loop()
+        task = self._refreshers.get(loop)
+        if task is None or task.done():
+            self._refreshers[loop] = loop.create_task(self._refresh_loop())
+            logger.info(f"News cache refresher started (every {self.refresh_interval:.0f}s)")
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            # Не обновляем то, что уже обновил другой процесс
+            await asyncio.to_thread(self.load)
+            now = time.time()
+            for key, loader in list(self._loaders.items()):
+                entry = self._entries.get(key)
+                # Обновляем заранее, чтобы запись не успела устареть до следующего тика
+                if entry is None or now - entry.fetched_at >= self._entry_ttl(entry) - self.refresh_interval:
+                    await self._start_load(key, loader)
+
+    async def stop_refresher(self):
+        """Остановить фоновое обновление текущего event loop"""
+        task = self._refreshers.pop(asyncio.get_running_loop(), None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Счётчики кэша
+
+        Returns:
+            Dict: hits, misses, stale_hits, refreshes, refresh_errors, disk_loads, hit_rate, entries
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            now = time.time()
+            ages = {key: round(now - entry.fetched_at, 1) for key, entry in self._entries.items()}
+
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 3) if lookups else 0.0
+        stats["entries"] = ages
+        return stats
+
+
+# ========== SINGLETON INSTANCE ==========
+_news_cache = None
+
+
+def get_news_cache() -> NewsCache:
+    """Получить глобальный instance NewsCache"""
+    global _news_cache
+    if _news_cache is None:
+        _news_cache = NewsCache(registry=metrics.get_metrics())
+    return _news_cache
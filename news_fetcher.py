@@ -0,0 +1,430 @@
+"""
+Асинхронное получение новостей для уроков (сервис новостей / N8N webhook + RSS)
+
+Все сетевые вызовы идут через общий aiohttp.ClientSession и не блокируют
+event loop воркера LiveKit. Парсинг RSS (feedparser) выполняется в thread pool.
+"""
+import asyncio
+import calendar
+import logging
+import os
+import re
+import weakref
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import feedparser
+
+from feed_store import FeedStore, get_feed_store
+from metrics import get_metrics
+from news_cache import NewsCache, get_news_cache
+
+logger = logging.getLogger(__name__)
+
+# ========== NEWS SOURCE CONFIGURATION ==========
+# Основной источник: "service" — встроенный сервис новостей (news_service.py),
+# "n8n" — внешний N8N webhook; при неудаче — прямой RSS
+NEWS_SOURCE = os.getenv("NEWS_SOURCE", "service")
+N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL", "http://localhost:5678/webhook/get-news")
+
+# ========== RSS ИСТОЧНИКИ ==========
+RSS_FEEDS = [
+    "https://techcrunch.com/feed/",  # Technology news
+    "http://feeds.bbci.co.uk/news/technology/rss.xml",  # BBC Tech
+    "https://www.theverge.com/rss/index.xml",  # The Verge
+]
+
+# ========== ТАЙМАУТЫ (секунды) ==========
+N8N_TIMEOUT = float(os.getenv("N8N_TIMEOUT", "3"))
+RSS_TIMEOUT = float(os.getenv("RSS_TIMEOUT", "5"))
+NEWS_DEADLINE = float(os.getenv("NEWS_DEADLINE", "6"))
+
+# "first" — первый ответивший фид, "best" — объединение всех фидов с ранжированием
+RSS_MODE = os.getenv("RSS_MODE", "first")
+
+HTTP_USER_AGENT = "english-tutor-mvp/1.0 (+https://github.com/Sergey0703/english-tutor-mvp)"
+
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def _news_from_entry(entry, source: str = "") -> Dict:
+    """Преобразует запись feedparser в словарь новости"""
+    parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+    return {
+        'title': entry.get('title', 'No title'),
+        'summary': entry.get('summary', entry.get('description', 'No summary')),
+        'link': entry.get('link', ''),
+        'published': entry.get('published', 'Unknown date'),
+        'published_ts': calendar.timegm(parsed) if parsed else 0,
+        'source': source,
+    }
+
+
+def _normalize_n8n_news(news: Dict) -> Dict:
+    """
+    Приводит ответ N8N к формату RSS новости
+
+    N8N отдаёт текст в поле 'content', а format_lesson_from_news ждёт 'summary'.
+    """
+    return {
+        'title': news.get('title', 'No title'),
+        'summary': news.get('summary') or news.get('content') or 'No summary',
+        'link': news.get('link', ''),
+        'published': news.get('published', 'Unknown date')
+    }
+
+
+def _dedup_keys(news: Dict) -> List[str]:
+    """Ключи дубликата: ссылка без схемы/query/fragment и нормализованный заголовок"""
+    keys = []
+    link = news.get('link', '')
+    if link:
+        parts = urlsplit(link)
+        keys.append(f"link:{parts.netloc.lower()}{parts.path.rstrip('/')}")
+    title = _NON_WORD_RE.sub(" ", news.get('title', '').lower()).strip()
+    if title:
+        keys.append(f"title:{title}")
+    return keys
+
+
+def _rank_entries(entries: List[Dict]) -> List[Dict]:
+    """Удаляет дубликаты (совпала ссылка или заголовок) и сортирует от свежих к старым"""
+    unique = []
+    index = {}
+    for news in entries:
+        keys = _dedup_keys(news)
+        position = next((index[key] for key in keys if key in index), None)
+        if position is None:
+            position = len(unique)
+            unique.append(news)
+        elif news['published_ts'] > unique[position]['published_ts']:
+            unique[position] = news
+        for key in keys:
+            index.setdefault(key, position)
+    # sorted стабилен: записи без даты сохраняют порядок фидов
+    return sorted(unique, key=lambda news: news['published_ts'], reverse=True)
+
+
+class NewsFetcher:
+    """Неблокирующий загрузчик новостей с общими HTTP сессиями и дедлайнами"""
+
+    def __init__(
+        self,
+        n8n_url: str = N8N_WEBHOOK_URL,
+        n8n_timeout: float = N8N_TIMEOUT,
+        rss_timeout: float = RSS_TIMEOUT,
+        deadline: float = NEWS_DEADLINE,
+        cache: Optional[NewsCache] = None,
+        rss_mode: str = RSS_MODE,
+        store: Optional[FeedStore] = None,
+        service=None,
+    ):
+        self.n8n_url = n8n_url
+        self.n8n_timeout = n8n_timeout
+        self.rss_timeout = rss_timeout
+        self.deadline = deadline
+        self.cache = cache
+        self.rss_mode = rss_mode
+        self.store = store
+        # NewsService: случайная новость из подборки в памяти (вместо запроса к N8N)
+        self.service = service
+        self._pending_saves = set()
+        # Одна сессия на event loop: aiohttp сессию нельзя делить между loop'ами
+        # (thread executor LiveKit запускает каждую задачу в своём loop)
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая aiohttp сессия для текущего event loop"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+                headers={"User-Agent": HTTP_USER_AGENT},
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def fetch_news_from_n8n(self) -> Optional[Dict]:
+        """
+        Получает случайную обработанную новость из N8N webhook
+
+        Returns:
+            dict: News object или None если ошибка
+        """
+        try:
+            logger.info(f"Fetching news from N8N webhook: {self.n8n_url}")
+            session = self._get_session()
+            timeout = aiohttp.ClientTimeout(total=self.n8n_timeout)
+            async with session.get(self.n8n_url, timeout=timeout) as response:
+                if response.status != 200:
+                    logger.error(f"N8N webhook failed: HTTP {response.status}")
+                    return None
+                news = await response.json(content_type=None)
+
+            # Проверка на ошибку от N8N
+            if not isinstance(news, dict) or news.get('error') or news.get('fallback'):
+                error = news.get('error', 'No news available') if isinstance(news, dict) else 'Bad payload'
+                logger.warning(f"N8N returned error: {error}")
+                return None
+
+            logger.info(f"Got news from N8N: {news.get('title', '')[:50]}...")
+            return _normalize_n8n_news(news)
+
+        except asyncio.TimeoutError:
+            logger.error("N8N webhook timeout")
+            return None
+        except aiohttp.ClientConnectionError:
+            logger.error("Cannot connect to N8N webhook (N8N may not be ready yet)")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to fetch from N8N: {e}")
+            return None
+
+    async def fetch_feed_entries(self, feed_url: str) -> List[Dict]:
+        """
+        Получает все записи RSS фида
+
+        С подключённым FeedStore фид запрашивается условно (ETag / Last-Modified):
+        ответ 304 отдаёт сохранённые записи без скачивания и парсинга, а недавно
+        загруженный фид вообще не запрашивается. При ошибке сети используются
+        последние сохранённые записи.
+
+        Returns:
+            List[Dict]: Новости фида в порядке фида (с полями 'source' и 'published_ts')
+        """
+        store = self.store
+        if store is not None:
+            await self._load_store()
+            if store.is_fresh(feed_url):
+                logger.info(f"Using stored entries for {feed_url}")
+                return store.entries(feed_url)
+
+        try:
+            logger.info(f"Fetching news from: {feed_url}")
+            session = self._get_session()
+            timeout = aiohttp.ClientTimeout(total=self.rss_timeout)
+            headers = store.conditional_headers(feed_url) if store is not None else {}
+            async with session.get(feed_url, timeout=timeout, headers=headers) as response:
+                if response.status == 304 and store is not None:
+                    logger.info(f"RSS feed not modified: {feed_url}")
+                    store.touch(feed_url)
+                    self._schedule_store_save()
+                    return store.entries(feed_url)
+                if response.status != 200:
+                    logger.error(f"RSS feed failed: HTTP {response.status} ({feed_url})")
+                    return self._stored_entries(feed_url)
+                body = await response.read()
+                etag = response.headers.get("ETag")
+                modified = response.headers.get("Last-Modified")
+
+            # feedparser синхронный и нагружает CPU — уводим его с event loop
+            feed = await asyncio.to_thread(feedparser.parse, body)
+
+            if not feed.entries:
+                logger.warning(f"No entries found in RSS feed: {feed_url}")
+                return self._stored_entries(feed_url)
+
+            entries = [_news_from_entry(entry, feed_url) for entry in feed.entries]
+            if store is not None:
+                store.update(feed_url, entries, etag, modified)
+                self._schedule_store_save()
+            return entries
+
+        except asyncio.TimeoutError:
+            logger.error(f"RSS feed timeout: {feed_url}")
+            return self._stored_entries(feed_url)
+        except Exception as e:
+            logger.error(f"Failed to fetch RSS {feed_url}: {e}")
+            return self._stored_entries(feed_url)
+
+    def _stored_entries(self, feed_url: str) -> List[Dict]:
+        """Последние сохранённые записи фида (fallback при ошибке сети)"""
+        if self.store is None:
+            return []
+        entries = self.store.entries(feed_url)
+        if entries:
+            logger.info(f"Serving {len(entries)} stored entries for {feed_url}")
+        return entries
+
+    async def _load_store(self):
+        if not self.store.loaded:
+            await asyncio.to_thread(self.store.load)
+
+    def _schedule_store_save(self):
+        """Сохранить хранилище в фоне, не блокируя event loop"""
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(self.store.save))
+        self._pending_saves.add(task)
+        task.add_done_callback(self._pending_saves.discard)
+
+    async def fetch_latest_news(self, feed_url: str = None) -> Optional[Dict]:
+        """
+        Получает последнюю новость из RSS фида
+
+        Returns:
+            dict: {
+                'title': str,
+                'summary': str,
+                'link': str,
+                'published': str
+            }
+        """
+        if feed_url is None:
+            feed_url = RSS_FEEDS[0]  # По умолчанию TechCrunch
+
+        entries = await self.fetch_feed_entries(feed_url)
+        if not entries:
+            return None
+
+        # Берем первую (самую свежую) новость
+        news = entries[0]
+        logger.info(f"Got news: {news['title'][:50]}...")
+        return news
+
+    # ========== АГРЕГАЦИЯ НЕСКОЛЬКИХ ФИДОВ ==========
+    async def fetch_first_feed(self, feeds: List[str] = None, deadline: float = None) -> Optional[Dict]:
+        """
+        Режим "first": опрашивает все фиды параллельно и берёт первый ответивший
+
+        Медленные и мёртвые фиды не задерживают старт сессии: как только
+        один фид вернул записи, остальные запросы отменяются.
+
+        Returns:
+            dict: Самая свежая новость первого ответившего фида или None
+        """
+        feeds = feeds or RSS_FEEDS
+        deadline = self.rss_timeout if deadline is None else deadline
+
+        tasks = {asyncio.ensure_future(self.fetch_feed_entries(url)) for url in feeds}
+        try:
+            async with asyncio.timeout(deadline):
+                pending = tasks
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        entries = task.result()
+                        if entries:
+                            news = _rank_entries(entries)[0]
+                            logger.info(f"Got news from {news['source']}: {news['title'][:50]}...")
+                            return news
+        except TimeoutError:
+            logger.warning(f"No RSS feed answered within {deadline:.1f}s")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return None
+
+    async def fetch_best_news(self, feeds: List[str] = None, deadline: float = None) -> List[Dict]:
+        """
+        Режим "best": собирает все фиды, ответившие до дедлайна
+
+        Записи объединяются, дубликаты (по ссылке или нормализованному
+        заголовку) удаляются, результат сортируется по дате публикации.
+
+        Returns:
+            List[Dict]: Новости от самой свежей к самой старой
+        """
+        feeds = feeds or RSS_FEEDS
+        deadline = self.rss_timeout if deadline is None else deadline
+
+        tasks = [asyncio.ensure_future(self.fetch_feed_entries(url)) for url in feeds]
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} RSS feed(s) missed the {deadline:.1f}s deadline")
+
+        entries = []
+        for task in tasks:
+            if task in done:
+                entries.extend(task.result())
+
+        ranked = _rank_entries(entries)
+        logger.info(f"Aggregated {len(ranked)} unique news from {len(done)}/{len(feeds)} feeds")
+        return ranked
+
+    async def fetch_rss_news(self) -> Optional[Dict]:
+        """Новость из RSS в режиме RSS_MODE (first или best)"""
+        if self.rss_mode == "best":
+            ranked = await self._cached("rss:best", self._fetch_best_or_none)
+            return ranked[0] if ranked else None
+        return await self._cached("rss:first", self.fetch_first_feed)
+
+    async def _fetch_best_or_none(self) -> Optional[List[Dict]]:
+        # Пустой список кэшируем как недоступный источник (короткий TTL)
+        return await self.fetch_best_news() or None
+
+    async def _cached(self, key: str, loader) -> Optional[Dict]:
+        """Загрузка через кэш, если он подключён"""
+        if self.cache is None:
+            return await loader()
+        return await self.cache.get(key, loader)
+
+    async def fetch_news(self, deadline: float = None) -> Optional[Dict]:
+        """
+        Получает новость для урока: сервис новостей (или N8N), затем прямой RSS
+
+        Общий дедлайн ограничивает время до приветствия: по его истечении
+        незавершённые запросы отменяются и возвращается None (hardcoded урок).
+        С подключённым кэшем источники опрашиваются не чаще раза в TTL.
+        """
+        if deadline is None:
+            deadline = self.deadline
+
+        metrics = get_metrics()
+        news = None
+        try:
+            async with asyncio.timeout(deadline):
+                if self.service is not None:
+                    # Случайная новость из подборки сервиса — без сети и без кэша
+                    with metrics.timer(stage="news_service"):
+                        news = await self.service.get_news()
+                    if news:
+                        news = _normalize_n8n_news(news)
+                else:
+                    # Пытаемся получить новость из N8N сначала
+                    with metrics.timer(stage="news_n8n"):
+                        news = await self._cached("n8n", self.fetch_news_from_n8n)
+
+                # Если основной источник не ответил, используем прямой RSS парсинг
+                if not news:
+                    logger.info("Falling back to direct RSS fetch")
+                    metrics.inc("tutor_news_fallbacks_total", to="rss")
+                    with metrics.timer(stage="news_rss"):
+                        news = await self.fetch_rss_news()
+
+        except TimeoutError:
+            logger.warning(f"News fetch exceeded {deadline:.1f}s deadline, using fallback lesson")
+
+        if not news:
+            metrics.inc("tutor_news_fallbacks_total", to="hardcoded")
+        return news
+
+    async def close(self):
+        """Закрыть HTTP сессию текущего event loop"""
+        if self._pending_saves:
+            await asyncio.gather(*self._pending_saves, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        session = self._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+            logger.info("🔌 News HTTP session closed")
+
+
+# ========== SINGLETON INSTANCE ==========
+_news_fetcher = None
+
+
+def get_news_fetcher() -> NewsFetcher:
+    """Получить глобальный instance NewsFetcher"""
+    global _news_fetcher
+    if _news_fetcher is None:
+        _news_fetcher = NewsFetcher(cache=get_news_cache(), store=get_feed_store())
+        if NEWS_SOURCE == "service":
+            from news_service import NewsService
+
+            _news_fetcher.service = NewsService(_news_fetcher)
+    return _news_fetcher
@@ -0,0 +1,241 @@
+"""
+Встроенный сервис новостей (замена N8N workflows)
+
+Делает то же, что два workflow N8N (rss_news_scraper и get_random_news_api),
+но внутри процесса агента: фоновая задача по расписанию собирает RSS фиды,
+очищает текст (без HTML, до 500 символов) и сохраняет подборку на диск,
+а случайная новость выбирается прямым вызовом — без Node.js процесса и
+без HTTP запроса на localhost в каждой сессии.
+
+Для совместимости сервис может отдавать тот же контракт GET /webhook/get-news
+отдельным сервером: python news_service.py
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import weakref
+from typing import Dict, List, Optional
+
+from text_sanitizer import sanitize_for_speech
+
+logger = logging.getLogger(__name__)
+
+# ========== NEWS SERVICE CONFIGURATION ==========
+# Период сбора фидов (секунды); в N8N — раз в 6 часов
+NEWS_SERVICE_INTERVAL = float(os.getenv("NEWS_SERVICE_INTERVAL", "21600"))
+# Повтор сбора, если все фиды были недоступны (секунды)
+NEWS_SERVICE_RETRY_INTERVAL = float(os.getenv("NEWS_SERVICE_RETRY_INTERVAL", "300"))
+NEWS_SERVICE_MAX_ITEMS = int(os.getenv("NEWS_SERVICE_MAX_ITEMS", "100"))
+NEWS_SERVICE_CONTENT_CHARS = int(os.getenv("NEWS_SERVICE_CONTENT_CHARS", "500"))
+# Подборка на диске (аналог processed_news.json N8N): общая для процессов воркера
+NEWS_SERVICE_PATH = os.getenv("NEWS_SERVICE_PATH", os.path.join("data", "processed_news.json"))
+# Порт совместимого webhook (python news_service.py)
+NEWS_SERVICE_PORT = int(os.getenv("NEWS_SERVICE_PORT", "5678"))
+
+NO_NEWS = {"error": "No news available", "fallback": True}
+
+
+def process_entries(entries: List[Dict], max_items: int = NEWS_SERVICE_MAX_ITEMS,
+                    content_chars: int = NEWS_SERVICE_CONTENT_CHARS) -> List[Dict]:
+    """
+    Записи фидов → новости в формате webhook N8N
+
+    Как в workflow: записи без текста отбрасываются, HTML удаляется,
+    текст обрезается до content_chars. Порядок (от свежих) сохраняется.
+    """
+    items = []
+    for entry in entries:
+        title = sanitize_for_speech(entry.get('title', ''), 200)
+        content = sanitize_for_speech(entry.get('summary', ''), content_chars)
+        if not title or not content:
+            continue
+        items.append({
+            'title': title,
+            'content': content,
+            'link': entry.get('link', ''),
+            'published': entry.get('published', ''),
+        })
+        if len(items) >= max_items:
+            break
+    return items
+
+
+class NewsService:
+    """Сбор RSS по расписанию и выдача случайной новости"""
+
+    def __init__(
+        self,
+        fetcher,
+        feeds: List[str] = None,
+        interval: float = NEWS_SERVICE_INTERVAL,
+        path: str = NEWS_SERVICE_PATH,
+    ):
+        # NewsFetcher: общие HTTP сессии, хранилище фидов и ранжирование записей
+        self.fetcher = fetcher
+        self.feeds = feeds
+        self.interval = interval
+        self.path = path
+
+        self._items: List[Dict] = []
+        self._scraped_at = 0.0
+        # Задачи asyncio привязаны к своему loop — храним их отдельно для каждого
+        self._scrapes = weakref.WeakKeyDictionary()
+        self._schedulers = weakref.WeakKeyDictionary()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def is_stale(self) -> bool:
+        return time.time() - self._scraped_at >= self.interval
+
+    # ---------- Подборка на диске ----------
+    def load(self) -> bool:
+        """Прочитать подборку предыдущего сбора (в prewarm, до первой сессии)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Cannot read processed news {self.path}: {e}")
+            return False
+
+        if data.get("scraped_at", 0) > self._scraped_at:
+            self._items = data.get("items", [])
+            self._scraped_at = data["scraped_at"]
+            logger.info(f"📰 Loaded {len(self._items)} processed news from {self.path}")
+        return True
+
+    def save(self):
+        """Записать подборку атомарно (tmp + rename)"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"scraped_at": self._scraped_at, "items": self._items}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"❌ Failed to save processed news: {e}")
+
+    # ---------- Сбор ----------
+    async def scrape(self) -> int:
+        """
+        Собрать все фиды и заменить подборку
+
+        При пустом результате (все фиды недоступны) старая подборка остаётся.
+
+        Returns:
+            int: Количество новостей в подборке
+        """
+        started = time.perf_counter()
+        entries = await self.fetcher.fetch_best_news(self.feeds)
+        items = process_entries(entries)
+        if not items:
+            logger.warning("⚠️ News scrape returned nothing, keeping previous news")
+            return len(self._items)
+
+        self._items = items
+        self._scraped_at = time.time()
+        await asyncio.to_thread(self.save)
+        logger.info(f"📰 Scraped {len(items)} news in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return len(items)
+
+    def _start_scrape(self) -> "asyncio.Task":
+        """Один сбор на event loop: одновременные вызовы ждут одну задачу"""
+        loop = asyncio.get_running_loop()
+        task = self._scrapes.get(loop)
+        if task is None or task.done():
+            task = self._scrapes[loop] = loop.create_task(self.scrape())
+        return task
+
+    def random_news(self) -> Optional[Dict]:
+        """Случайная новость подборки (формат webhook N8N) или None"""
+        if not self._items:
+            return None
+        return random.choice(self._items)
+
+    async def get_news(self) -> Optional[Dict]:
+        """
+        Случайная новость для урока
+
+        Пустая подборка собирается на месте (первый запуск без файла); дедлайн
+        вызывающего отменяет только ожидание, сам сбор продолжается в фоне.
+        """
+        if not self._items:
+            await asyncio.to_thread(self.load)
+        if not self._items:
+            await asyncio.shield(self._start_scrape())
+        return self.random_news()
+
+    # ---------- Расписание ----------
+    def ensure_scheduler(self):
+        """Запустить сбор по расписанию в текущем event loop (идемпотентно)"""
+        loop = asyncio.get_running_loop()
+        task = self._schedulers.get(loop)
+        if task is None or task.done():
+            self._schedulers[loop] = loop.create_task(self._schedule_loop())
+            logger.info(f"News service scheduler started (every {self.interval:.0f}s)")
+
+    async def _schedule_loop(self):
+        while True:
+            # Подборку мог обновить другой процесс воркера
+            await asyncio.to_thread(self.load)
+            if self.is_stale():
+                try:
+                    await self._start_scrape()
+                except Exception as e:
+                    logger.error(f"❌ News scrape failed: {e}")
+            delay = self._scraped_at + self.interval - time.time()
+            await asyncio.sleep(delay if delay > 0 else NEWS_SERVICE_RETRY_INTERVAL)
+
+    async def stop_scheduler(self):
+        """Остановить сбор по расписанию текущего event loop"""
+        task = self._schedulers.pop(asyncio.get_running_loop(), None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict:
+        return {"items": len(self._items), "age": round(time.time() - self._scraped_at) if self._scraped_at else None}
+
+
+# ========== СОВМЕСТИМЫЙ WEBHOOK ==========
+def create_webhook_app(service: NewsService):
+    """aiohttp приложение с контрактом N8N: GET /webhook/get-news"""
+    from aiohttp import web
+
+    async def get_news(_request):
+        news = await service.get_news()
+        return web.json_response(news or NO_NEWS)
+
+    async def on_startup(_app):
+        service.ensure_scheduler()
+
+    async def on_cleanup(_app):
+        await service.stop_scheduler()
+        await service.fetcher.close()
+
+    app = web.Application()
+    app.add_routes([web.get("/webhook/get-news", get_news)])
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    from aiohttp import web
+
+    from feed_store import get_feed_store
+    from news_fetcher import NewsFetcher
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    fetcher = NewsFetcher(store=get_feed_store())
+    web.run_app(create_webhook_app(NewsService(fetcher)), port=NEWS_SERVICE_PORT)
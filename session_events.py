@@ -0,0 +1,246 @@
+"""
+Журнал событий сессий: транскрипты, реплики диалога и ошибки
+
+Обработчики событий AgentSession только кладут событие в ограниченную
+очередь в памяти (без ожидания и без I/O). Фоновая задача забирает события
+пачками и пишет их в sink: JSON-lines файл с ротацией (свой у каждого
+процесса) или MongoDB (insert_many). При переполнении очереди новые события отбрасываются
+и учитываются в счётчиках — realtime цикл никогда не ждёт записи.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import weakref
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ========== SESSION EVENTS CONFIGURATION ==========
+# "file" — JSON-lines с ротацией, "mongodb" — коллекция MongoDB, "off" — не сохранять
+SESSION_EVENTS_SINK = os.getenv("SESSION_EVENTS_SINK", "file")
+SESSION_EVENTS_QUEUE_SIZE = int(os.getenv("SESSION_EVENTS_QUEUE_SIZE", "1000"))
+SESSION_EVENTS_BATCH_SIZE = int(os.getenv("SESSION_EVENTS_BATCH_SIZE", "100"))
+SESSION_EVENTS_FLUSH_INTERVAL = float(os.getenv("SESSION_EVENTS_FLUSH_INTERVAL", "2"))
+SESSION_EVENTS_PATH = os.getenv("SESSION_EVENTS_PATH", os.path.join("data", "session_events.jsonl"))
+SESSION_EVENTS_MAX_BYTES = int(os.getenv("SESSION_EVENTS_MAX_BYTES", str(10 * 1024 * 1024)))
+SESSION_EVENTS_BACKUP_COUNT = int(os.getenv("SESSION_EVENTS_BACKUP_COUNT", "5"))
+MONGODB_EVENTS_COLLECTION = os.getenv("MONGODB_EVENTS_COLLECTION", "session_events")
+
+
+# ========== SINKS ==========
+class JsonlFileSink:
+    """
+    JSON-lines файл с ротацией по размеру (events.<pid>.jsonl → events.<pid>.jsonl.1 → ...)
+
+    Процессы задач LiveKit пишут каждый в свой файл: pid добавляется к
+    имени из `path`, поэтому запись и ротация не пересекаются между процессами.
+    """
+
+    def __init__(
+        self,
+        path: str = SESSION_EVENTS_PATH,
+        max_bytes: int = SESSION_EVENTS_MAX_BYTES,
+        backup_count: int = SESSION_EVENTS_BACKUP_COUNT,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    @property
+    def process_path(self) -> str:
+        """Файл текущего процесса (pid берётся при записи — sink переживает fork)"""
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{os.getpid()}{ext}"
+
+    def write(self, events: List[Dict]):
+        data = "".join(
+            json.dumps(event, ensure_ascii=False, default=_json_default) + "\n" for event in events
+        ).encode("utf-8")
+
+        path = self.process_path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.max_bytes and os.path.exists(path) and os.path.getsize(path) + len(data) > self.max_bytes:
+            self._rotate(path)
+        with open(path, "ab") as f:
+            f.write(data)
+
+    def _rotate(self, path: str):
+        if self.backup_count <= 0:
+            os.remove(path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{path}.{index + 1}")
+        os.replace(path, f"{path}.1")
+
+
+class MongoEventSink:
+    """Коллекция MongoDB: одна пачка событий — один insert_many"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def write(self, events: List[Dict]):
+        # insert_many добавляет _id в документы — пишем копии
+        self.collection.insert_many([dict(event) for event in events], ordered=False)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+# ========== EVENT LOG ==========
+class SessionEventLog:
+    """
+    Ограниченная очередь событий с пакетной записью в sink
+
+    record() вызывается из обработчиков событий и не блокирует; запись
+    выполняется фоновой задачей (sink синхронный — в thread pool).
+    """
+
+    def __init__(
+        self,
+        sink,
+        max_queue: int = SESSION_EVENTS_QUEUE_SIZE,
+        batch_size: int = SESSION_EVENTS_BATCH_SIZE,
+        flush_interval: float = SESSION_EVENTS_FLUSH_INTERVAL,
+    ):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        # Записи в sink идут строго по одной (порядок событий в файле)
+        self._write_lock = threading.Lock()
+
+        self._flushers = weakref.WeakKeyDictionary()
+        self._wakeups = weakref.WeakKeyDictionary()
+
+        self._counters = {"recorded": 0, "written": 0, "batches": 0, "dropped_overflow": 0, "dropped_errors": 0}
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def record(self, event_type: str, **fields):
+        """Добавить событие (без I/O); при полной очереди событие отбрасывается"""
+        event = {"ts": datetime.utcnow(), "type": event_type, **fields}
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self._counters["dropped_overflow"] += 1
+                return
+            self._queue.append(event)
+            self._counters["recorded"] += 1
+            full = len(self._queue) >= self.batch_size
+
+        if full:
+            self._wake()
+
+    def _wake(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        wakeup = self._wakeups.get(loop)
+        if wakeup is not None:
+            wakeup.set()
+
+    def start(self):
+        """Запустить фоновую запись в текущем event loop (идемпотентно)"""
+        loop = asyncio.get_running_loop()
+        task = self._flushers.get(loop)
+        if task is None or task.done():
+            self._wakeups[loop] = asyncio.Event()
+            self._flushers[loop] = loop.create_task(self._run(self._wakeups[loop]))
+
+    async def _run(self, wakeup: asyncio.Event):
+        while True:
+            try:
+                async with asyncio.timeout(self.flush_interval):
+                    await wakeup.wait()
+            except TimeoutError:
+                pass
+            wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Записать всё накопленное пачками"""
+        while self._queue:
+            await asyncio.to_thread(self._write_batch)
+
+    def _write_batch(self):
+        with self._write_lock:
+            with self._lock:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not batch:
+                return
+
+            try:
+                self.sink.write(batch)
+            except Exception as e:
+                # Журнал — не критичные данные: пачка теряется, но учитывается
+                with self._lock:
+                    self._counters["dropped_errors"] += len(batch)
+                logger.error(f"❌ Failed to write {len(batch)} session event(s): {e}")
+                return
+
+            with self._lock:
+                self._counters["written"] += len(batch)
+                self._counters["batches"] += 1
+
+    async def stop(self):
+        """Остановить фоновую запись текущего loop и записать остаток (shutdown)"""
+        task = self._flushers.pop(asyncio.get_running_loop(), None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики журнала: pending, recorded, written, batches, dropped_overflow, dropped_errors"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pending"] = len(self._queue)
+        return stats
+
+
+def build_sink(kind: str = SESSION_EVENTS_SINK):
+    """Sink по настройке SESSION_EVENTS_SINK (None — журнал отключён)"""
+    if kind == "off":
+        return None
+    if kind == "mongodb":
+        from mongodb_client import VocabularyClient
+
+        vocab = VocabularyClient()
+        if vocab.is_connected():
+            return MongoEventSink(vocab.db[MONGODB_EVENTS_COLLECTION])
+        logger.warning("⚠️ MongoDB not configured, session events go to file")
+    return JsonlFileSink()
+
+
+# ========== SINGLETON INSTANCE ==========
+_event_log = None
+
+
+def get_session_event_log() -> Optional[SessionEventLog]:
+    """Получить глобальный instance SessionEventLog (None, если журнал отключён)"""
+    global _event_log
+    if _event_log is None:
+        sink = build_sink()
+        if sink is None:
+            return None
+        _event_log = SessionEventLog(sink)
+    return _event_log
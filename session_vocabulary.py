@@ -0,0 +1,98 @@
+"""
+Рабочий набор слов одной сессии
+
+Слова загружаются одним запросом при сборке урока и дальше живут в памяти
+сессии: поиск слова и отметка "отработано" во время разговора не ходят
+ни в MongoDB, ни в HTTP API.
+"""
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SessionVocabulary:
+    """Целевые слова сессии с локальным поиском и учётом отработанных"""
+
+    def __init__(self, words: List[Dict]):
+        self._words: Dict[str, Dict] = {}
+        for word_data in words:
+            word = word_data.get("word")
+            if word:
+                self._words.setdefault(word.strip().lower(), word_data)
+        self._practiced: Dict[str, None] = {}  # dict сохраняет порядок отметок
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    @property
+    def words(self) -> List[Dict]:
+        """Данные слов сессии"""
+        return list(self._words.values())
+
+    @property
+    def practiced(self) -> List[str]:
+        """Слова, отработанные в этой сессии (в порядке отметки)"""
+        return [self._words[key]["word"] for key in self._practiced]
+
+    def lookup(self, word: str) -> Optional[Dict]:
+        """Найти слово в рабочем наборе (без обращения к словарю)"""
+        return self._words.get(word.strip().lower())
+
+    def mark_practiced(self, word: str) -> bool:
+        """
+        Отметить слово как отработанное в этой сессии
+
+        Returns:
+            bool: True, если слово из рабочего набора
+        """
+        key = word.strip().lower()
+        if key not in self._words:
+            return False
+        self._practiced[key] = None
+        logger.info(f"✅ Practiced word '{self._words[key]['word']}' ({len(self._practiced)}/{len(self._words)})")
+        return True
+
+    def remaining(self) -> List[str]:
+        """Слова, которые ещё не отработаны"""
+        return [data["word"] for key, data in self._words.items() if key not in self._practiced]
+
+
+def format_word_line(word_data: Dict) -> str:
+    """Строка слова для системного промпта: word [transcript] — translate"""
+    line = word_data.get("word", "")
+    if word_data.get("transcript"):
+        line += f" [{word_data['transcript']}]"
+    if word_data.get("translate"):
+        line += f" — {word_data['translate']}"
+    return line
+
+
+def format_word_for_lesson(word_data: Dict) -> str:
+    """
+    Форматировать слово для урока (общий формат клиентов словаря)
+
+    Args:
+        word_data: Данные слова (word, translate, transcript)
+
+    Returns:
+        str: Отформатированный текст для урока
+    """
+    word = word_data.get("word", "")
+    translate = word_data.get("translate", "")
+    transcript = word_data.get("transcript", "")
+
+    # Базовый формат
+    text = f"Let's practice the word '{word}'."
+
+    # Добавляем транскрипцию если есть
+    if transcript:
+        text += f" The pronunciation is [{transcript}]."
+
+    # Добавляем перевод
+    if translate:
+        text += f" In Russian, it means '{translate}'."
+
+    text += f" Can you use '{word}' in a sentence?"
+
+    return text
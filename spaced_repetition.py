@@ -0,0 +1,253 @@
+"""
+Интервальное повторение слов (SM-2)
+
+У слова вместо одного флага traini — состояние повторения: коэффициент
+лёгкости `ease`, текущий интервал `interval` (дни), число успешных
+повторений подряд `reps`, число забываний `lapses` и дата следующего
+повторения `due`. Каждое повторение пересчитывает состояние по SM-2,
+поэтому выученное слово возвращается в урок, когда подходит его срок.
+
+"Следующие N слов к повторению":
+    - в MongoDB — запрос по индексу `due` (O(k log n), без скана коллекции);
+    - в памяти (снимок словаря) — индексированная min-куча DueQueue.
+
+traini/trainDate продолжают обновляться (traini=True после первого
+повторения), поэтому статистика и прежние запросы работают как раньше.
+Слова без `due` — новые, их выдают get_untrained_words/get_random_words.
+"""
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pymongo import UpdateOne
+
+# ========== SPACED REPETITION CONFIGURATION ==========
+SRS_INITIAL_EASE = float(os.getenv("SRS_INITIAL_EASE", "2.5"))
+SRS_MIN_EASE = float(os.getenv("SRS_MIN_EASE", "1.3"))
+# Оценка (0-5) для "ученик правильно употребил слово" (mark_word_practiced)
+SRS_PRACTICED_QUALITY = int(os.getenv("SRS_PRACTICED_QUALITY", "4"))
+
+DUE_FIELD = "due"
+REVIEW_FIELDS = ("ease", "interval", "reps", "lapses", DUE_FIELD)
+# Поля, нужные для пересчёта состояния пачки слов
+REVIEW_PROJECTION = {"word": 1, "traini": 1, **{field: 1 for field in REVIEW_FIELDS}}
+
+
+class ReviewState(NamedTuple):
+    """Состояние повторения слова"""
+    ease: float = SRS_INITIAL_EASE
+    interval: float = 0
+    reps: int = 0
+    lapses: int = 0
+    due: Optional[datetime] = None
+
+
+def state_from_document(document: Dict) -> ReviewState:
+    """Состояние из документа словаря (новое слово — состояние по умолчанию)"""
+    return ReviewState(
+        ease=document.get("ease") or SRS_INITIAL_EASE,
+        interval=document.get("interval") or 0,
+        reps=document.get("reps") or 0,
+        lapses=document.get("lapses") or 0,
+        due=document.get(DUE_FIELD),
+    )
+
+
+def review(state: ReviewState, quality: int, now: datetime) -> ReviewState:
+    """
+    Следующее состояние по SM-2
+
+    Args:
+        quality: Оценка ответа 0-5 (3 и выше — слово вспомнено)
+    """
+    quality = max(0, min(5, quality))
+    if quality >= 3:
+        if state.reps == 0:
+            interval = 1
+        elif state.reps == 1:
+            interval = 6
+        else:
+            interval = round(state.interval * state.ease)
+        reps, lapses = state.reps + 1, state.lapses
+    else:
+        # Забыто: интервалы начинаются заново
+        interval, reps, lapses = 1, 0, state.lapses + 1
+
+    miss = 5 - quality
+    ease = max(SRS_MIN_EASE, state.ease + 0.1 - miss * (0.08 + miss * 0.02))
+    return ReviewState(ease, interval, reps, lapses, now + timedelta(days=interval))
+
+
+def review_update(state: ReviewState, now: datetime) -> Dict:
+    """$set для записи нового состояния (traini/trainDate — для совместимости)"""
+    return {"$set": {**state._asdict(), "traini": True, "trainDate": now}}
+
+
+def review_filter(document: Dict) -> Dict:
+    """
+    Фильтр записи повторения: документ по _id, если его `reps` и `traini` не изменились
+
+    Если слово за это время повторил или отметил другой процесс, запись не
+    совпадает: чужое состояние не перетирается и переход в traini=True не
+    учитывается дважды.
+    """
+    return {
+        "_id": document["_id"],
+        "reps": document.get("reps"),
+        "traini": True if document.get("traini") else {"$ne": True},
+    }
+
+
+def review_operations(
+    documents: Iterable[Dict],
+    quality: int,
+    now: datetime,
+    reviewed_at: Optional[Dict[str, datetime]] = None,
+) -> Tuple[List[UpdateOne], List[UpdateOne]]:
+    """
+    Операции bulk_write для пачки повторений
+
+    Каждое обновление условно (см. review_filter). Первые повторения
+    (слово становится traini=True) идут отдельным списком: их пишут
+    отдельным bulk_write, и прирост счётчика trained — его matched_count,
+    то есть только реально записанные переходы.
+
+    Args:
+        reviewed_at: Время повторения по словам (момент практики); для
+            остальных слов — now
+
+    Returns:
+        Tuple[List[UpdateOne], List[UpdateOne]]: Повторения тренированных слов и первые повторения
+    """
+    repeats = []
+    first_reviews = []
+    for document in documents:
+        when = reviewed_at.get(document.get("word"), now) if reviewed_at else now
+        state = review(state_from_document(document), quality, when)
+        operation = UpdateOne(review_filter(document), review_update(state, when))
+        (repeats if document.get("traini") else first_reviews).append(operation)
+    return repeats, first_reviews
+
+
+def due_query(now: datetime) -> Dict:
+    """Фильтр слов, срок повторения которых наступил (новые слова без due не попадают)"""
+    return {DUE_FIELD: {"$lte": now}}
+
+
+# ========== МИГРАЦИЯ ==========
+# Тренированные слова без состояния: одно успешное повторение в trainDate,
+# следующее — через день после него. Одна серверная операция, идемпотентно
+MIGRATION_FILTER = {"traini": True, DUE_FIELD: {"$exists": False}}
+MIGRATION_UPDATE = [{"$set": {
+    "ease": SRS_INITIAL_EASE,
+    "interval": 1,
+    "reps": 1,
+    "lapses": 0,
+    DUE_FIELD: {"$add": [{"$ifNull": ["$trainDate", "$$NOW"]}, 24 * 60 * 60 * 1000]},
+}}]
+
+
+def migrate_review_state(collection) -> int:
+    """
+    Миграция с traini/trainDate: выдать состояние повторения тренированным словам
+
+    Returns:
+        int: Сколько слов получили состояние
+    """
+    return collection.update_many(MIGRATION_FILTER, MIGRATION_UPDATE).modified_count
+
+
+# ========== ОЧЕРЕДЬ В ПАМЯТИ ==========
+class DueQueue:
+    """
+    Индексированная min-куча слов по дате повторения
+
+    Позиция каждого слова в куче хранится в словаре, поэтому изменение
+    срока и удаление слова — O(log n), а k ближайших сроков читаются
+    без изменения кучи за O(k log k).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._positions
+
+    def push(self, word: str, due: datetime):
+        """Добавить слово или изменить его срок"""
+        with self._lock:
+            position = self._positions.get(word)
+            if position is None:
+                self._heap.append((due, word))
+                self._positions[word] = len(self._heap) - 1
+                self._sift_up(len(self._heap) - 1)
+                return
+            old_due = self._heap[position][0]
+            self._heap[position] = (due, word)
+            if due < old_due:
+                self._sift_up(position)
+            else:
+                self._sift_down(position)
+
+    def remove(self, word: str):
+        """Убрать слово из очереди (если оно там есть)"""
+        with self._lock:
+            position = self._positions.pop(word, None)
+            if position is None:
+                return
+            last = self._heap.pop()
+            if position < len(self._heap):
+                self._heap[position] = last
+                self._positions[last[1]] = position
+                self._sift_up(position)
+                self._sift_down(self._positions[last[1]])
+
+    def due(self, count: int, now: datetime) -> List[str]:
+        """До `count` слов со сроком не позже `now`, от самых просроченных"""
+        words = []
+        with self._lock:
+            heap = self._heap
+            # Кандидаты — корень и дети уже выданных узлов
+            frontier = [(heap[0], 0)] if heap else []
+            while frontier and len(words) < count:
+                (due, word), position = heapq.heappop(frontier)
+                if due > now:
+                    break
+                words.append(word)
+                for child in (2 * position + 1, 2 * position + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child], child))
+        return words
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._positions[heap[i][1]] = i
+        self._positions[heap[j][1]] = j
+
+    def _sift_up(self, position: int):
+        while position > 0:
+            parent = (position - 1) // 2
+            if self._heap[parent] <= self._heap[position]:
+                break
+            self._swap(parent, position)
+            position = parent
+
+    def _sift_down(self, position: int):
+        size = len(self._heap)
+        while True:
+            smallest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self._heap[child] < self._heap[smallest]:
+                    smallest = child
+            if smallest == position:
+                return
+            self._swap(position, smallest)
+            position = smallest
@@ -0,0 +1,67 @@
+"""
+Очистка HTML для озвучивания: результат и совпадение быстрого и потокового путей
+
+Быстрый путь (_sanitize_fast) обязан давать ровно то же, что потоковый
+разбор (_sanitize_stream), для любого входа, который он берёт на себя.
+"""
+import random
+
+import pytest
+
+import text_sanitizer
+from text_sanitizer import sanitize_for_speech
+
+
+@pytest.mark.parametrize("html, expected", [
+    ("<p>Hello <b>world</b></p><p>Next</p>", "Hello world Next"),
+    ("Tom &amp; Jerry&#8217;s &nbsp;show", "Tom & Jerry’s show"),
+    ("before<script>var x = '<p>';</script>after", "before after"),
+    ("a<!-- comment -->b", "ab"),
+    ("&bogus; stays", "&bogus; stays"),
+    ("bad &#1; &#xD800; refs", "bad refs"),
+    # '<', который не начинает тег, остаётся текстом
+    ("if a<b then", "if a<b then"),
+    ("1 < 2 and 3 <= 4", "1 < 2 and 3 <= 4"),
+    # Тег, обрезанный фидом в конце, отбрасывается целиком
+    ('Read more <a href="http://example.com/very/lo', "Read more"),
+    ("text <!-- unclosed comment", "text"),
+])
+def test_sanitize_for_speech(html, expected):
+    assert sanitize_for_speech(html) == expected
+
+
+def test_truncates_at_sentence_end():
+    text = "First sentence here. " + "word " * 200
+    assert sanitize_for_speech(text, max_chars=40) == "First sentence here."
+
+
+# Куски, из которых собираются случайные входы: теги, entities, битая разметка
+_PIECES = [
+    "<p>", "</p>", "<P >", "<pre>", "<param>", "<b>", "</b>", "<br/>", "<a href='x'>", "</a>",
+    "&amp;", "&am", "p;", "&#39;", "&#1;", "&#10;", "&#55296;", "&nbsp;", "&bogus;", "&#X2019;",
+    "<", "<x", "<x ", "<unclosed words", " ", "  ", "\n", "word", "Hello.", "Sentence end. ",
+    "<!-- c -->", "<!--", "-->", "<script>", "</script>", "<SCRIPT>x</Script >", "<style>",
+    "</style>", "<div class=a>", "&#x2019;", ">", "&", "!--", "x" * 50, "\x00", "\x01", "<!",
+    '<a href="http', "a<b", " then ",
+]
+
+
+def _finish(result: str, max_chars: int) -> str:
+    return result if len(result) <= max_chars else text_sanitizer._truncate(result, max_chars, "...")
+
+
+def test_fast_path_matches_stream():
+    rng = random.Random(20260101)
+    fast_inputs = 0
+    for _ in range(20000):
+        text = "".join(rng.choice(_PIECES) for _ in range(rng.randint(0, 60)))
+        max_chars = rng.choice([20, 50, 100, 300])
+        end = min(len(text), text_sanitizer.MAX_SCAN_CHARS)
+        fast = text_sanitizer._sanitize_fast(text, end, max_chars)
+        if fast is None:
+            continue
+        fast_inputs += 1
+        stream = text_sanitizer._sanitize_stream(text, end, max_chars)
+        assert _finish(fast, max_chars) == _finish(stream, max_chars), (text, max_chars)
+    # Быстрый путь действительно проверен, а не всегда уступал потоковому
+    assert fast_inputs > 1000
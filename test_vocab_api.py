@@ -0,0 +1,209 @@
+"""
+Контракт ModalVocabularyClient ↔ vocab_api
+
+Запросы клиента (его пути, параметры и тела) уходят в FastAPI приложение
+сервера через транспорт requests → TestClient, словарь — в mongomock.
+Если маршрут клиента сервер не обслуживает, тест падает на 404.
+"""
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+import requests
+from fastapi.testclient import TestClient
+from requests.adapters import BaseAdapter
+
+import spaced_repetition
+import vocab_api
+import vocab_stats
+from modal_vocab_client import ModalVocabularyClient
+
+BASE_URL = "http://vocab-api.test"
+
+
+class ASGIAdapter(BaseAdapter):
+    """Транспорт requests, отправляющий запросы в ASGI приложение"""
+
+    def __init__(self, app):
+        super().__init__()
+        self.client = TestClient(app, base_url=BASE_URL)
+        self.paths = []
+
+    def send(self, request, **kwargs):
+        self.paths.append(request.path_url.split("?")[0])
+        reply = self.client.request(request.method, request.url, content=request.body, headers=dict(request.headers))
+        response = requests.Response()
+        response.status_code = reply.status_code
+        response.headers.update(reply.headers)
+        response._content = reply.content
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        self.client.close()
+
+
+class ProjectingCollection:
+    """
+    mongomock не вычисляет выражения в проекции find ({"$toString": "$_id"}),
+    MongoDB 4.4+ вычисляет — такой find выполняется как aggregate с $project
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def find(self, query=None, projection=None):
+        if projection is vocab_api.PUBLIC_PROJECTION:
+            return _Cursor(self._collection, query or {}, projection)
+        return self._collection.find(query, projection)
+
+    def find_one(self, query=None, projection=None):
+        return next(iter(self.find(query, projection).limit(1)), None)
+
+
+class _Cursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._stages = [{"$match": query}]
+        self._projection = projection
+
+    def sort(self, field, direction):
+        self._stages.append({"$sort": {field: direction}})
+        return self
+
+    def limit(self, count):
+        self._stages.append({"$limit": count})
+        return self
+
+    def __iter__(self):
+        return iter(self._collection.aggregate(self._stages + [{"$project": self._projection}]))
+
+
+@pytest.fixture
+def collections():
+    db = mongomock.MongoClient()["cluster0"]
+    now = datetime.utcnow()
+    db["words"].insert_many([
+        {"word": "apple", "translate": "яблоко", "transcript": "ˈæpl", "traini": False, "rand": 0.1},
+        {"word": "river", "translate": "река", "transcript": "ˈrɪvə", "traini": True, "rand": 0.5,
+         "trainDate": now, "due": now - timedelta(days=1), "ease": 2.5, "interval": 1, "reps": 1, "lapses": 0},
+        {"word": "cloud", "translate": "облако", "transcript": "klaʊd", "traini": False, "rand": 0.9},
+    ])
+    return ProjectingCollection(db["words"]), db["vocab_stats"]
+
+
+def make_client(get_collections):
+    adapter = ASGIAdapter(vocab_api.create_app(get_collections))
+    session = requests.Session()
+    session.mount(BASE_URL, adapter)
+    return ModalVocabularyClient(api_url=BASE_URL, session=session), adapter
+
+
+@pytest.fixture
+def api(collections):
+    client, adapter = make_client(lambda: collections)
+    yield client, adapter
+    client.close()
+
+
+def test_client_routes_are_served(api, collections):
+    client, adapter = api
+    words, _stats = collections
+
+    assert client.is_connected()
+    assert client.get_stats() == {"total": 3, "trained": 1, "untrained": 2}
+    assert len(client.get_random_words(count=1)) == 1
+    assert [word["word"] for word in client.get_untrained_words(count=1)] in (["apple"], ["cloud"])
+
+    assert client.search_word("apple")["translate"] == "яблоко"
+    assert client.search_word("missing") is None
+    found = client.search_words(["apple", "missing"])
+    assert found["apple"]["word"] == "apple" and found["missing"] is None
+
+    assert client.mark_word_as_trained("apple")
+    assert client.mark_words_as_trained(["cloud"])
+    assert client.get_stats()["trained"] == 3
+
+    assert [word["word"] for word in client.get_due_words(count=5)] == ["river"]
+    # Повторение записывается на время практики (write-behind буфер), а не запроса
+    practiced = datetime(2026, 1, 2, 3, 4, 5)
+    assert client.review_words(["river"], quality=5, reviewed_at={"river": practiced})
+    river = words.find_one({"word": "river"})
+    assert river["reps"] == 2 and river["trainDate"] == practiced
+    assert river["due"] == practiced + timedelta(days=river["interval"])
+
+    bootstrap = client.get_session_bootstrap(count=1, untrained_count=1)
+    assert bootstrap["stats"]["total"] == 3 and len(bootstrap["random_words"]) == 1
+
+    # Каждый вызов клиента попал в существующий маршрут
+    routes = {route.path for route in vocab_api.create_app(lambda: None).routes}
+    assert set(adapter.paths) <= routes
+
+
+def test_failed_review_is_reported(caplog):
+    # Сервер без MongoDB отвечает 503: клиент сообщает об ошибке (буфер повторит пачку),
+    # а не считает пачку записанной
+    client, _adapter = make_client(lambda: None)
+    assert not client.review_words(["apple", "river"])
+    assert "Review batch of 2 words rejected: HTTP 503" in caplog.text
+    client.close()
+
+
+def test_unconfigured_database_answers_503():
+    app = vocab_api.create_app(lambda: None)
+    with TestClient(app) as test_client:
+        assert test_client.get("/stats").status_code == 503
+        assert test_client.post("/words/review-batch", json={"words": ["apple"]}).status_code == 503
+
+
+def test_word_count_is_validated(collections):
+    app = vocab_api.create_app(lambda: collections)
+    with TestClient(app) as test_client:
+        for path in ("/words/random", "/words/untrained", "/words/due"):
+            assert test_client.get(path, params={"count": 0}).status_code == 400
+        # Больше MAX_BATCH_WORDS — ограничивается, а не падает
+        reply = test_client.get("/words/random", params={"count": 1000})
+        assert reply.status_code == 200 and reply.json()["count"] == 3
+
+
+def test_stale_stats_are_reconciled(collections):
+    words, stats = collections
+    stats.insert_one({"_id": words.name, "total": 10, "trained": 7, "reconciledAt": datetime(2020, 1, 1)})
+    app = vocab_api.create_app(lambda: collections)
+    with TestClient(app) as test_client:
+        assert test_client.get("/stats").json() == {"total": 3, "trained": 1, "untrained": 2}
+
+
+def test_concurrently_marked_word_is_not_counted_twice(collections):
+    words, stats = collections
+    vocab_stats.read_stats(words, stats)
+    # Пачка прочитана до того, как другой процесс отметил слово
+    stale = list(words.find({"word": "apple"}, spaced_repetition.REVIEW_PROJECTION))
+    vocab_api.mark_trained(words, stats, ["apple"])
+
+    class StaleRead:
+        name = words.name
+
+        def find(self, *_args):
+            return stale
+
+        def bulk_write(self, operations, ordered=True):
+            return words.bulk_write(operations, ordered=ordered)
+
+    result = vocab_api.review(StaleRead(), stats, ["apple"], quality=5)
+    assert result["newly_trained"] == 0
+    assert vocab_stats.read_stats(words, stats)["trained"] == 2
+
+
+def test_lesson_words_take_one_request(api):
+    from lesson_pool import LessonPool
+
+    client, adapter = api
+    words = LessonPool(news_fetcher=None, vocabulary=client, words_count=2)._get_words()
+    # Сначала слово, которое пора повторить, затем случайное
+    assert [word["word"] for word in words][:1] == ["river"] and len(words) == 2
+    assert adapter.paths == ["/session/bootstrap"]
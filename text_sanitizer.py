@@ -0,0 +1,262 @@
+"""
+Очистка HTML из RSS для озвучивания (TTS)
+
+Один линейный проход по входу: удаление тегов (вместе с содержимым
+script/style и комментариями), декодирование HTML entities, схлопывание
+пробелов и обрезка по границе предложения. Проход останавливается, как
+только набран лимит текста, поэтому стоимость не растёт с размером
+огромных summary.
+
+Обычный summary (теги без script/style/комментариев) очищается быстрым
+путём — несколькими проходами re.split по ограниченному окну входа с тем же
+результатом; всё остальное идёт через потоковый разбор.
+"""
+import re
+from functools import lru_cache
+from html.entities import html5
+
+# ========== SANITIZER CONFIGURATION ==========
+# Теги, после которых начинается новый блок текста (ставим пробел)
+_BLOCK_TAGS = frozenset({
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+    "figcaption", "figure", "footer", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "li", "ol", "p", "pre", "section", "table", "td", "th",
+    "tr", "ul",
+})
+# Теги, содержимое которых не читается вслух
+_SKIP_TAGS = frozenset({"script", "style", "noscript", "template"})
+_SKIP_CLOSE_RE = {
+    tag: re.compile(rf"</{tag}\s*>", re.IGNORECASE) for tag in _SKIP_TAGS
+}
+
+# Один токен за шаг: кусок текста, комментарий, тег, entity или одиночный '<'/'&'.
+# Длины ограничены, чтобы незакрытый тег или огромный текст не сканировались
+# повторно и работа останавливалась сразу по набору лимита
+_TOKEN_RE = re.compile(r"""
+    (?P<text>[^<&]{1,1024})
+  | (?P<comment><!--)
+  | <(?P<closing>/?)(?P<tag>[a-zA-Z][a-zA-Z0-9]{0,15})(?:[\s/][^<>]{0,2048})?>
+  | &(?P<entity>\#[0-9]{1,7}|\#[xX][0-9a-fA-F]{1,6}|[a-zA-Z][a-zA-Z0-9]{0,31});
+  | (?P<char>[<&])
+""", re.VERBOSE)
+# Остаток битого тега после '<': тег, который не разобрал _TOKEN_RE, но закрыт '>'
+_BROKEN_TAG_RE = re.compile(r"[a-zA-Z/!][^<>]{0,2048}>")
+# ...или тег, обрезанный фидом в конце входа: имя и, возможно, атрибуты с '='
+# ('<a href="http://...'); обычный текст после '<' так не выглядит
+_TRUNCATED_TAG_RE = re.compile(r"(?:/?[a-zA-Z][a-zA-Z0-9]{0,15}|!)(?:\s[^<>=]{0,2048}=[^<>]{0,2048})?\Z")
+
+# Управляющие символы, допустимые в числовых ссылках (\t, \n, \f, \r)
+_WHITESPACE_CODEPOINTS = frozenset({0x09, 0x0A, 0x0C, 0x0D})
+
+# Быстрый путь: проходы re.split без Python callback на каждый тег. Удалённая
+# разметка заменяется маркерами (\x00 — ничего, \x01 — пробел), которые не
+# входят ни в тег, ни в entity: соседние куски не склеиваются в новый тег
+# ('<' + 'b>' вокруг комментария), как и в потоковом разборе
+_NOTHING, _SPACE = "\x00", "\x01"
+_FAST_BLOCK_RE = re.compile(r"""
+    <!--.*?-->
+  | <(?P<skip_tag>(?i:script|style|noscript|template))(?:[\s/][^<>]{0,2048})?>.*?</(?i:(?P=skip_tag))\s*>
+""", re.VERBOSE | re.DOTALL)
+# Начало комментария или блока script/style (до прохода — есть ли что удалять, после — незакрытые)
+_FAST_UNCLOSED_RE = re.compile(r"<(?:!--|(?i:script|style|noscript|template)[\s/>])")
+_FAST_TAG_RE = re.compile(r"</?([a-zA-Z][a-zA-Z0-9]{0,15})(?:[\s/][^<>\x00\x01]{0,2048})?>")
+_FAST_ENTITY_RE = re.compile(r"&(\#[0-9]{1,7}|\#[xX][0-9a-fA-F]{1,6}|[a-zA-Z][a-zA-Z0-9]{0,31});")
+_SENTENCE_END_RE = re.compile(r"[.!?][\"')\]»”]?(?=\s|$)")
+
+# Обрезка по предложению, только если остаётся хотя бы такая доля лимита
+_MIN_SENTENCE_RATIO = 0.5
+# Жёсткий предел просмотра входа (защита от мегабайтов разметки без текста)
+MAX_SCAN_CHARS = 200_000
+# Окно быстрого пути: во столько раз больше лимита текста (плюс запас)
+_FAST_WINDOW_RATIO = 8
+_FAST_WINDOW_EXTRA = 1024
+# Запас текста за лимитом, когда окно обрезало вход: entity или тег на краю окна
+# не должны попасть в результат
+_FAST_WINDOW_MARGIN = 64
+
+
+def sanitize_for_speech(
+    text: str,
+    max_chars: int = 500,
+    ellipsis: str = "...",
+    max_scan: int = MAX_SCAN_CHARS,
+) -> str:
+    """
+    Превращает HTML фрагмент в текст для озвучивания
+
+    Args:
+        text: HTML или обычный текст
+        max_chars: Максимальная длина результата (без ellipsis)
+        ellipsis: Что добавить, если текст обрезан не по концу предложения
+        max_scan: Сколько символов входа просматривать максимум
+
+    Returns:
+        str: Чистый текст без тегов и entities, с одиночными пробелами
+    """
+    if not text:
+        return ""
+
+    end = min(len(text), max_scan)
+    result = _sanitize_fast(text, end, max_chars)
+    if result is None:
+        result = _sanitize_stream(text, end, max_chars)
+    if len(result) <= max_chars:
+        return result
+
+    return _truncate(result, max_chars, ellipsis)
+
+
+def _block_replace(match) -> str:
+    # Комментарий исчезает, блок script/style разделяет слова
+    return _SPACE if match.group("skip_tag") else _NOTHING
+
+
+def _sanitize_fast(text: str, end: int, max_chars: int):
+    """
+    Быстрый путь: тот же результат, что у _sanitize_stream, проходами re.split
+
+    Просматривает окно входа, пропорциональное лимиту текста. Возвращает None
+    (нужен потоковый разбор) для битых тегов, незакрытых комментариев и
+    блоков, а также если окна не хватило на лимит текста.
+    """
+    window_end = min(end, max_chars * _FAST_WINDOW_RATIO + _FAST_WINDOW_EXTRA)
+    window = text[:window_end]
+    if _NOTHING in window or _SPACE in window:
+        return None
+    marked = False
+    if "<" in window:
+        if _FAST_UNCLOSED_RE.search(window):
+            window = _FAST_BLOCK_RE.sub(_block_replace, window)
+            if _FAST_UNCLOSED_RE.search(window):
+                return None
+        # Нечётные элементы — имена тегов
+        parts = _FAST_TAG_RE.split(window)
+        parts[1::2] = [_SPACE if tag.lower() in _BLOCK_TAGS else _NOTHING for tag in parts[1::2]]
+        window = "".join(parts)
+        # Оставшийся '<' — битый тег или одиночный символ
+        if "<" in window:
+            return None
+        marked = True
+    if "&" in window:
+        # До снятия маркеров: '&am<b></b>p;' не становится entity
+        parts = _FAST_ENTITY_RE.split(window)
+        parts[1::2] = [_entity_text(entity) for entity in parts[1::2]]
+        window = "".join(parts)
+    if marked:
+        window = window.replace(_NOTHING, "").replace(_SPACE, " ")
+
+    result = " ".join(window.split())
+    if window_end < end and len(result) <= max_chars + _FAST_WINDOW_MARGIN:
+        return None
+    return result
+
+
+@lru_cache(maxsize=1024)
+def _entity_text(entity: str) -> str:
+    chunk = _decode_entity(entity)
+    # Неизвестная entity читается как есть
+    return f"&{entity};" if chunk is None else chunk
+
+
+def _sanitize_stream(text: str, end: int, max_chars: int) -> str:
+    """Потоковый разбор: останавливается, как только набран лимит текста"""
+    out = []
+    length = 0
+    pending_space = False
+    match_token = _TOKEN_RE.match
+
+    pos = 0
+    # Набираем на один символ больше лимита, чтобы знать, что текст обрезан
+    while pos < end and length <= max_chars:
+        token = match_token(text, pos, end)
+        pos = token.end()
+        kind = token.lastgroup
+
+        if kind == "text":
+            chunk = token.group(kind)
+        elif kind == "char":
+            chunk = token.group(kind)
+            if chunk == "<" and pos < end and (text[pos].isalpha() or text[pos] in "/!"):
+                broken = _BROKEN_TAG_RE.match(text, pos, end) or _TRUNCATED_TAG_RE.match(text, pos, end)
+                if broken is not None:
+                    pos = broken.end()
+                    pending_space = True
+                    continue
+                # Не тег ('if a<b then'): '<' читается как текст
+        elif kind == "entity":
+            chunk = _decode_entity(token.group("entity"))
+            if chunk is None:
+                # Неизвестная entity читается как есть
+                chunk = token.group()
+            elif not chunk:
+                continue
+        elif kind == "comment":
+            close = text.find("-->", pos, end)
+            pos = end if close == -1 else close + 3
+            continue
+        else:
+            name = token.group("tag").lower()
+            if name in _SKIP_TAGS and not token.group("closing"):
+                skip = _SKIP_CLOSE_RE[name].search(text, pos, end)
+                pos = end if skip is None else skip.end()
+                pending_space = True
+            elif name in _BLOCK_TAGS:
+                pending_space = True
+            continue
+
+        # Схлопываем пробелы; слово, разрезанное между токенами, склеивается
+        words = chunk.split()
+        if not words:
+            pending_space = True
+            continue
+        if out and (pending_space or chunk[0].isspace()):
+            out.append(" ")
+            length += 1
+        piece = " ".join(words) if len(words) > 1 else words[0]
+        out.append(piece)
+        length += len(piece)
+        pending_space = chunk[-1].isspace()
+
+    return "".join(out)
+
+
+def _decode_entity(entity: str):
+    """
+    'amp' / '#39' / '#x2019' → символ или None, если это не entity
+
+    Числовая ссылка на недопустимый символ (управляющий, суррогат,
+    non-character, вне Unicode) даёт пустую строку: одиночный суррогат
+    ломает UTF-8 и JSON.
+    """
+    if entity[0] != "#":
+        return html5.get(entity + ";")
+    if entity[1] in "xX":
+        codepoint = int(entity[2:], 16)
+    else:
+        codepoint = int(entity[1:])
+    if (
+        (codepoint < 0x20 and codepoint not in _WHITESPACE_CODEPOINTS)
+        or codepoint >= 0x110000
+        or 0xD800 <= codepoint <= 0xDFFF
+        or 0xFDD0 <= codepoint <= 0xFDEF
+        or codepoint & 0xFFFE == 0xFFFE
+    ):
+        return ""
+    return chr(codepoint)
+
+
+def _truncate(text: str, max_chars: int, ellipsis: str) -> str:
+    """Обрезка по концу предложения, иначе по границе слова"""
+    head = text[:max_chars + 1]
+
+    sentence_end = -1
+    for match in _SENTENCE_END_RE.finditer(head):
+        if match.end() <= max_chars:
+            sentence_end = match.end()
+    if sentence_end >= max_chars * _MIN_SENTENCE_RATIO:
+        return head[:sentence_end]
+
+    space = head.rfind(" ")
+    if space > 0:
+        return head[:space].rstrip(",;:-–—") + ellipsis
+    return head[:max_chars] + ellipsis
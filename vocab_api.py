@@ -0,0 +1,299 @@
+"""
+Vocabulary HTTP API - FastAPI application
+
+One app with every route ModalVocabularyClient calls (single base URL):
+
+    GET  /                          health check
+    GET  /stats                     vocabulary counters
+    GET  /words/random              random words (?count=&trained=)
+    GET  /words/untrained           random untrained words (?count=)
+    GET  /words/search              one word (?word=), 404 if missing
+    POST /words/mark-trained        mark one word (?word=)
+    GET  /words/lookup              many words (?words=a,b,c)
+    POST /words/mark-trained-batch  mark many words: {"words": [...]}
+    GET  /words/due                 words due for review (?count=)
+    POST /words/review-batch        SM-2 reviews: {"words": [...], "quality": 0-5,
+                                    "reviewed_at": {word: ISO time (UTC)}}
+    GET  /session/bootstrap         stats + due + random + untrained words for a lesson
+
+The app does not depend on Modal: modal_mongodb_simple.py serves it with
+@modal.asgi_app, the collections come from the container's MongoDB client.
+Errors are returned with real HTTP status codes, so clients can tell a
+failed write from a successful one. Every `count` must be at least 1 (the
+bootstrap counts may be 0) and is capped at MAX_BATCH_WORDS.
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+import spaced_repetition
+import vocab_queries
+import vocab_sampling
+import vocab_stats
+from vocab_serialization import PUBLIC_PROJECT_STAGE, PUBLIC_PROJECTION, dumps
+
+# Ограничение размера пачки в batch endpoints и числа слов в ответе (count)
+MAX_BATCH_WORDS = 200
+
+
+# ========== ЗАПРОСЫ К КОЛЛЕКЦИИ ==========
+def sample_words(collection, query: Dict, count: int) -> List[Dict]:
+    """
+    Равномерно случайные слова (см. vocab_sampling.sample_pipeline)
+
+    Слова приходят уже в виде ответа API: только публичные поля, _id строкой.
+    """
+    found = {}
+    for _ in range(vocab_sampling.SAMPLE_MAX_ROUNDS):
+        missing = count - len(found)
+        if missing <= 0:
+            break
+        vocab_sampling.merge_unique(found, collection.aggregate(
+            vocab_sampling.sample_pipeline(query, missing, PUBLIC_PROJECT_STAGE)
+        ))
+    return list(found.values())[:count]
+
+
+def find_due_words(collection, count: int) -> List[Dict]:
+    """Слова, которые пора повторить, от самых просроченных (по индексу due)"""
+    if count < 1:
+        return []
+    return list(collection.find(
+        spaced_repetition.due_query(datetime.utcnow()), PUBLIC_PROJECTION
+    ).sort(spaced_repetition.DUE_FIELD, 1).limit(count))
+
+
+def mark_trained(collection, stats_collection, words: List[str]) -> Dict:
+    """
+    Отметить слова как тренированные
+
+    Как в VocabularyClient.mark_words_as_trained: дата повторной тренировки,
+    затем переходы в traini=True (ровно прирост счётчика trained).
+    """
+    now = datetime.utcnow()
+    refreshed = collection.update_many(
+        vocab_queries.words_trained_query(words),
+        vocab_queries.retrain_update(now)
+    )
+    result = collection.update_many(
+        vocab_queries.words_untrained_query(words),
+        vocab_queries.mark_trained_update(now)
+    )
+    vocab_stats.record_trained(collection, stats_collection, result.modified_count)
+    return {
+        "success": True,
+        "matched": refreshed.matched_count + result.matched_count,
+        "newly_trained": result.modified_count,
+    }
+
+
+def review(
+    collection,
+    stats_collection,
+    words: List[str],
+    quality: int,
+    reviewed_at: Optional[Dict[str, datetime]] = None,
+) -> Dict:
+    """Повторения пачки слов (SM-2), как в VocabularyClient.review_words: один find и bulk_write"""
+    now = datetime.utcnow()
+    documents = collection.find(vocab_queries.words_query(words), spaced_repetition.REVIEW_PROJECTION)
+    repeats, first_reviews = spaced_repetition.review_operations(documents, quality, now, reviewed_at)
+    if repeats:
+        collection.bulk_write(repeats, ordered=False)
+    newly_trained = collection.bulk_write(first_reviews, ordered=False).matched_count if first_reviews else 0
+    vocab_stats.record_trained(collection, stats_collection, newly_trained)
+    return {"success": True, "reviewed": len(repeats) + len(first_reviews), "newly_trained": newly_trained}
+
+
+# ========== FASTAPI APP ==========
+def _batch_words(words) -> Optional[List[str]]:
+    """Слова пачки из тела запроса (None, если пачка больше MAX_BATCH_WORDS)"""
+    words = [word for word in words or [] if isinstance(word, str) and word]
+    return words if len(words) <= MAX_BATCH_WORDS else None
+
+
+def _word_count(count: int, minimum: int = 1) -> Optional[int]:
+    """Число слов из параметра count (None, если меньше minimum; не больше MAX_BATCH_WORDS)"""
+    return min(count, MAX_BATCH_WORDS) if count >= minimum else None
+
+
+@lru_cache(maxsize=None)
+def response_class():
+    """
+    JSON response of the API, encoded with vocab_serialization.dumps (orjson)
+
+    Created on first use, so the module imports without FastAPI installed.
+    """
+    from fastapi.responses import JSONResponse
+
+    class VocabJSONResponse(JSONResponse):
+        def render(self, content) -> bytes:
+            return dumps(content)
+
+    return VocabJSONResponse
+
+
+def create_app(get_collections: Callable[[], Optional[tuple]]):
+    """
+    FastAPI app of the vocabulary API
+
+    Args:
+        get_collections: Returns (words collection, stats collection),
+            or None when MongoDB is not configured (routes answer 503)
+    """
+    from fastapi import Body, FastAPI
+
+    JSONResponse = response_class()
+    api = FastAPI(title="Vocabulary API", default_response_class=JSONResponse)
+
+    def error(message: str, status_code: int) -> JSONResponse:
+        return JSONResponse({"error": message}, status_code=status_code)
+
+    def handle(operation: Callable[[object, object], object]) -> JSONResponse:
+        collections = get_collections()
+        if collections is None:
+            return error("MongoDB not configured", 503)
+        try:
+            return JSONResponse(operation(*collections))
+        except Exception as e:
+            return error(str(e), 500)
+
+    too_many = f"At most {MAX_BATCH_WORDS} words per request"
+    bad_count = "count must be at least 1"
+
+    @api.get("/")
+    def health():
+        """Health check endpoint"""
+        return {"status": "ok", "service": "vocabulary-api"}
+
+    @api.get("/stats")
+    def stats():
+        """Get vocabulary statistics (single lookup of the maintained counters)"""
+        return handle(vocab_stats.read_stats)
+
+    @api.get("/words/random")
+    def random_words(count: int = 5, trained: bool = False):
+        """Get random words from vocabulary"""
+        count = _word_count(count)
+        if count is None:
+            return error(bad_count, 400)
+        query = vocab_queries.random_query(trained)
+
+        def run(collection, _stats):
+            words = sample_words(collection, query, count)
+            return {"words": words, "count": len(words)}
+
+        return handle(run)
+
+    @api.get("/words/untrained")
+    def untrained_words(count: int = 10):
+        """Get random untrained words"""
+        count = _word_count(count)
+        if count is None:
+            return error(bad_count, 400)
+
+        def run(collection, _stats):
+            words = sample_words(collection, vocab_queries.UNTRAINED_QUERY, count)
+            return {"words": words, "count": len(words)}
+
+        return handle(run)
+
+    @api.get("/words/search")
+    def search_word(word: str):
+        """Look up one word (404 if it is not in the vocabulary)"""
+        collections = get_collections()
+        if collections is None:
+            return error("MongoDB not configured", 503)
+        try:
+            found = collections[0].find_one(vocab_queries.word_query(word), PUBLIC_PROJECTION)
+        except Exception as e:
+            return error(str(e), 500)
+        if found is None:
+            return error(f"Word '{word}' not found", 404)
+        return {"word": found}
+
+    @api.post("/words/mark-trained")
+    def mark_word_trained(word: str):
+        """Mark one word as trained"""
+        return handle(lambda collection, stats_collection: mark_trained(collection, stats_collection, [word]))
+
+    @api.get("/words/lookup")
+    def lookup_words(words: str = ""):
+        """Look up many words at once (?words=apple,river,...)"""
+        requested = [word.strip() for word in words.split(",") if word.strip()]
+        if len(requested) > MAX_BATCH_WORDS:
+            return error(too_many, 400)
+
+        def run(collection, _stats):
+            by_word = {word["word"]: word for word in collection.find(vocab_queries.words_query(requested), PUBLIC_PROJECTION)}
+            return {"words": by_word, "missing": [word for word in requested if word not in by_word]}
+
+        return handle(run)
+
+    @api.post("/words/mark-trained-batch")
+    def mark_trained_batch(request: Dict = Body(...)):
+        """Mark many words as trained: body {"words": [...]}"""
+        words = _batch_words(request.get("words"))
+        if words is None:
+            return error(too_many, 400)
+        if not words:
+            return {"success": True, "matched": 0, "newly_trained": 0}
+        return handle(lambda collection, stats_collection: mark_trained(collection, stats_collection, words))
+
+    @api.get("/words/due")
+    def due_words(count: int = 5):
+        """Words whose review is due, most overdue first (uses the due index)"""
+        count = _word_count(count)
+        if count is None:
+            return error(bad_count, 400)
+
+        def run(collection, _stats):
+            words = find_due_words(collection, count)
+            return {"words": words, "count": len(words)}
+
+        return handle(run)
+
+    @api.post("/words/review-batch")
+    def review_batch(request: Dict = Body(...)):
+        """Record reviews of many words (SM-2): body {"words": [...], "quality": 0-5, "reviewed_at": {...}}"""
+        words = _batch_words(request.get("words"))
+        if words is None:
+            return error(too_many, 400)
+        try:
+            quality = int(request.get("quality", spaced_repetition.SRS_PRACTICED_QUALITY))
+        except (TypeError, ValueError):
+            return error("quality must be an integer 0-5", 400)
+        try:
+            reviewed_at = {
+                word: datetime.fromisoformat(value)
+                for word, value in (request.get("reviewed_at") or {}).items()
+            }
+        except (AttributeError, TypeError, ValueError):
+            return error("reviewed_at must map words to ISO times", 400)
+        if not words:
+            return {"success": True, "reviewed": 0, "newly_trained": 0}
+        return handle(
+            lambda collection, stats_collection: review(collection, stats_collection, words, quality, reviewed_at)
+        )
+
+    @api.get("/session/bootstrap")
+    def session_bootstrap(count: int = 5, untrained_count: int = 10, trained: bool = False, due_count: int = 0):
+        """Everything a lesson needs in one call: stats, due, random and untrained words"""
+        counts = [_word_count(value, minimum=0) for value in (count, untrained_count, due_count)]
+        if None in counts:
+            return error("counts must not be negative", 400)
+        count, untrained_count, due_count = counts
+
+        def run(collection, stats_collection):
+            return {
+                "stats": vocab_stats.read_stats(collection, stats_collection),
+                "due_words": find_due_words(collection, due_count),
+                "random_words": sample_words(collection, vocab_queries.random_query(trained), count),
+                # Случайные (а не первые N) не тренированные: без состояния между вызовами
+                # ученик всё равно проходит весь словарь
+                "untrained_words": sample_words(collection, vocab_queries.UNTRAINED_QUERY, untrained_count),
+            }
+
+        return handle(run)
+
+    return api
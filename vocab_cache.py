@@ -0,0 +1,245 @@
+"""
+Кэш поиска слов в памяти процесса
+
+Ограниченный LRU с TTL перед search_word клиентов словаря (MongoDB, Motor и
+Modal API). Промахи ("слова нет") тоже кэшируются, но на короткое время.
+Запись о слове сбрасывается, когда слово отмечено тренированным, повторено или
+добавлено, поэтому повторный поиск видит свежие данные.
+
+Найденное слово кэшируется под нормализованным ключом (word.strip().lower()):
+"Monday" и "monday" — одна запись. Словарь ищет слово точно, поэтому клиенту
+уходит слово в том виде, в каком его передали, а промах кэшируется только для
+этого написания.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ========== CACHE CONFIGURATION ==========
+# VOCAB_CACHE_SIZE=0 фактически отключает кэш
+VOCAB_CACHE_SIZE = int(os.getenv("VOCAB_CACHE_SIZE", "1024"))
+VOCAB_CACHE_TTL = float(os.getenv("VOCAB_CACHE_TTL", "600"))
+VOCAB_CACHE_NEGATIVE_TTL = float(os.getenv("VOCAB_CACHE_NEGATIVE_TTL", "30"))
+
+
+class TTLCache:
+    """Потокобезопасный LRU кэш с TTL у каждой записи"""
+
+    def __init__(self, maxsize: int = VOCAB_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Any, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Any) -> Tuple[bool, Any]:
+        """
+        Returns:
+            Tuple[bool, Any]: (найдено ли, значение); значение None — закэшированный промах
+        """
+        return self.get_first((key,))
+
+    def get_first(self, keys: Iterable[Any]) -> Tuple[bool, Any]:
+        """Первая живая запись из нескольких ключей (считается одним обращением)"""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                item = self._items.get(key)
+                if item is None:
+                    continue
+                value, expires_at = item
+                if now >= expires_at:
+                    del self._items[key]
+                    self._counters["expired"] += 1
+                    continue
+                self._items.move_to_end(key)
+                self._counters["hits" if value is not None else "negative_hits"] += 1
+                return True, value
+            self._counters["misses"] += 1
+            return False, None
+
+    def put(self, key: Any, value: Any, ttl: float):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self._counters["evicted"] += 1
+
+    def invalidate(self, key: Any):
+        with self._lock:
+            if self._items.pop(key, None) is not None:
+                self._counters["invalidated"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики кэша и hit_rate (доля запросов без обращения к источнику)"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._items)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["negative_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def cache_key(word: str) -> str:
+    """Ключ найденного слова: нормализованное написание"""
+    return word.strip().lower()
+
+
+def _missing_key(word: str) -> Tuple[str, str]:
+    """Ключ промаха: точное написание (другое написание может быть в словаре)"""
+    return ("missing", word)
+
+
+class _WordCache:
+    """Кэш поиска слов поверх TTLCache (общая часть синхронной и асинхронной обёрток)"""
+
+    def __init__(
+        self,
+        client,
+        cache: Optional[TTLCache] = None,
+        ttl: float = VOCAB_CACHE_TTL,
+        negative_ttl: float = VOCAB_CACHE_NEGATIVE_TTL,
+    ):
+        self.client = client
+        self.cache = cache if cache is not None else TTLCache()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def _lookup(self, word: str) -> Tuple[bool, Optional[Dict]]:
+        return self.cache.get_first((cache_key(word), _missing_key(word)))
+
+    def _store(self, word: str, word_data: Optional[Dict]):
+        if word_data is not None:
+            self.cache.put(cache_key(word), word_data, self.ttl)
+        else:
+            # Промах (и недоступный словарь) кэшируется коротко
+            self.cache.put(_missing_key(word), None, self.negative_ttl)
+
+    def _lookup_many(self, words: List[str]) -> Tuple[Dict[str, Optional[Dict]], List[str]]:
+        """Найденные в кэше слова и слова (без повторов), которые нужно запросить"""
+        result = {}
+        missing = []
+        for word in dict.fromkeys(words):
+            found, word_data = self._lookup(word)
+            if found:
+                result[word] = word_data
+            else:
+                missing.append(word)
+        return result, missing
+
+    def _store_many(
+        self, words: List[str], result: Dict[str, Optional[Dict]], missing: List[str], fetched: Dict[str, Optional[Dict]]
+    ) -> Dict[str, Optional[Dict]]:
+        for word in missing:
+            word_data = fetched.get(word)
+            self._store(word, word_data)
+            result[word] = word_data
+        # В порядке запрошенных слов
+        return {word: result[word] for word in words}
+
+    def _invalidate(self, words: Iterable[str]):
+        for word in words:
+            self.cache.invalidate(cache_key(word))
+            self.cache.invalidate(_missing_key(word))
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Счётчики кэша поиска слов"""
+        return self.cache.stats()
+
+
+class CachedVocabularyClient(_WordCache):
+    """
+    Клиент словаря с кэшем search_word
+
+    Оборачивает VocabularyClient или ModalVocabularyClient; остальные
+    методы передаются клиенту как есть.
+    """
+
+    def search_word(self, word: str) -> Optional[Dict]:
+        """Найти слово: из кэша или у клиента (результат кэшируется, в том числе промах)"""
+        found, word_data = self._lookup(word)
+        if found:
+            return word_data
+
+        word_data = self.client.search_word(word)
+        self._store(word, word_data)
+        return word_data
+
+    def search_words(self, words: List[str]) -> Dict[str, Optional[Dict]]:
+        """Найти несколько слов: из кэша, остальные одним запросом клиента"""
+        result, missing = self._lookup_many(words)
+        return self._store_many(words, result, missing, self.client.search_words(missing) if missing else {})
+
+    def mark_word_as_trained(self, word: str) -> bool:
+        result = self.client.mark_word_as_trained(word)
+        self._invalidate([word])
+        return result
+
+    def mark_words_as_trained(self, words: List[str]) -> bool:
+        result = self.client.mark_words_as_trained(words)
+        self._invalidate(words)
+        return result
+
+    def review_words(self, words: List[str], *args, **kwargs) -> bool:
+        result = self.client.review_words(words, *args, **kwargs)
+        self._invalidate(words)
+        return result
+
+    def add_word(self, word: str, *args, **kwargs) -> bool:
+        result = self.client.add_word(word, *args, **kwargs)
+        # Сбрасываем закэшированный промах
+        self._invalidate([word])
+        return result
+
+
+class AsyncCachedVocabularyClient(_WordCache):
+    """То же для AsyncVocabularyClient (Motor): методы записи и поиска — корутины"""
+
+    async def search_word(self, word: str) -> Optional[Dict]:
+        found, word_data = self._lookup(word)
+        if found:
+            return word_data
+
+        word_data = await self.client.search_word(word)
+        self._store(word, word_data)
+        return word_data
+
+    async def search_words(self, words: List[str]) -> Dict[str, Optional[Dict]]:
+        result, missing = self._lookup_many(words)
+        return self._store_many(words, result, missing, await self.client.search_words(missing) if missing else {})
+
+    async def mark_word_as_trained(self, word: str) -> bool:
+        result = await self.client.mark_word_as_trained(word)
+        self._invalidate([word])
+        return result
+
+    async def mark_words_as_trained(self, words: List[str]) -> bool:
+        result = await self.client.mark_words_as_trained(words)
+        self._invalidate(words)
+        return result
+
+    async def review_words(self, words: List[str], *args, **kwargs) -> bool:
+        result = await self.client.review_words(words, *args, **kwargs)
+        self._invalidate(words)
+        return result
+
+    async def add_word(self, word: str, *args, **kwargs) -> bool:
+        result = await self.client.add_word(word, *args, **kwargs)
+        # Сбрасываем закэшированный промах
+        self._invalidate([word])
+        return result
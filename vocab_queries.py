@@ -0,0 +1,56 @@
+"""
+Фильтры и обновления запросов к коллекции словаря
+
+Одни и те же функции строят запросы клиентов словаря (VocabularyClient,
+AsyncVocabularyClient, vocab_api) и запросы, планы которых проверяет
+mongodb_indexes: проверяется ровно то, что выполняется в проде.
+
+Модуль без зависимостей: используется клиентами словаря и Modal API.
+"""
+from datetime import datetime
+from typing import Dict, List
+
+# ========== ФИЛЬТРЫ ==========
+TRAINED_QUERY = {"traini": True}
+UNTRAINED_QUERY = {"traini": False}
+
+
+def random_query(trained: bool = False) -> Dict:
+    """Фильтр случайной выборки: только тренированные или весь словарь"""
+    return dict(TRAINED_QUERY) if trained else {}
+
+
+def word_query(word: str) -> Dict:
+    """Одно слово (search_word)"""
+    return {"word": word}
+
+
+def words_query(words: List[str]) -> Dict:
+    """Пачка слов одним запросом (search_words, review_words)"""
+    return {"word": {"$in": words}}
+
+
+def word_untrained_query(word: str) -> Dict:
+    """Слово, ещё не отмеченное тренированным (переход, который учитывают счётчики)"""
+    return {"word": word, "traini": {"$ne": True}}
+
+
+def words_trained_query(words: List[str]) -> Dict:
+    """Уже тренированные слова пачки (обновляется только дата тренировки)"""
+    return {"word": {"$in": words}, "traini": True}
+
+
+def words_untrained_query(words: List[str]) -> Dict:
+    """Ещё не тренированные слова пачки (переходы в traini=True)"""
+    return {"word": {"$in": words}, "traini": {"$ne": True}}
+
+
+# ========== ОБНОВЛЕНИЯ ==========
+def mark_trained_update(now: datetime) -> Dict:
+    """Отметить слово тренированным"""
+    return {"$set": {"traini": True, "trainDate": now}}
+
+
+def retrain_update(now: datetime) -> Dict:
+    """Повторная тренировка уже тренированного слова"""
+    return {"$set": {"trainDate": now}}
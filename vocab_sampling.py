@@ -0,0 +1,84 @@
+"""
+Случайная выборка слов и обход словаря по кругу
+
+Случайные слова — $sample: равномерная выборка без повторов. Без фильтра
+(весь словарь) $sample — первая стадия, и MongoDB читает k документов
+случайным курсором, не сканируя коллекцию. С фильтром ($match по traini)
+подходящие слова берутся по индексу, а $sample выбирает k из них.
+
+Поле `rand` — случайное число из [0, 1), выданное слову один раз. Оно
+задаёт случайный, но стабильный порядок для обхода не тренированных слов
+по кругу страницами (rotation_queries). Для равномерной выборки ключ не
+годится: первое слово с rand >= r выпадает с вероятностью, равной
+промежутку перед ним, а не 1/n.
+
+Модуль без зависимостей: используется клиентами словаря и Modal API.
+"""
+import random
+from typing import Dict, List, Optional, Tuple
+
+# ========== SAMPLING CONFIGURATION ==========
+RANDOM_FIELD = "rand"
+# Случайный курсор $sample (без фильтра) может вернуть документ дважды —
+# недостающие слова добираются ещё максимум столько раз
+SAMPLE_MAX_ROUNDS = 3
+
+
+def random_key() -> float:
+    """Ключ для нового слова"""
+    return random.random()
+
+
+def sample_pipeline(match: Dict, count: int, project: Optional[Dict] = None) -> List[Dict]:
+    """
+    Pipeline равномерной выборки `count` слов, подходящих под `match`
+
+    Пустой `match` не добавляет стадию $match: тогда $sample идёт первым и
+    выполняется случайным курсором.
+
+    Args:
+        count: Сколько слов (не меньше 1; MongoDB не принимает $sample size 0)
+        project: Стадия $project для результата (необязательно)
+    """
+    if count < 1:
+        raise ValueError(f"sample size must be at least 1, got {count}")
+    pipeline = [{"$match": match}] if match else []
+    pipeline.append({"$sample": {"size": count}})
+    if project is not None:
+        pipeline.append(project)
+    return pipeline
+
+
+def merge_unique(found: Dict, words: List[Dict]):
+    """Добавить слова в выборку без повторов (по _id)"""
+    for word in words:
+        found.setdefault(word["_id"], word)
+
+
+def rotation_queries(match: Dict, after: float) -> Tuple[Dict, Dict]:
+    """
+    Фильтры страницы при обходе по кругу
+
+    Returns:
+        Tuple[Dict, Dict]: Слова после курсора и (для перехода через конец)
+            слова от начала до курсора включительно
+    """
+    return (
+        {**match, RANDOM_FIELD: {"$gt": after}},
+        {**match, RANDOM_FIELD: {"$lte": after}},
+    )
+
+
+# Одна серверная операция: ключ получают только слова без него
+BACKFILL_FILTER = {RANDOM_FIELD: {"$exists": False}}
+BACKFILL_UPDATE = [{"$set": {RANDOM_FIELD: {"$rand": {}}}}]
+
+
+def backfill_random_keys(collection) -> int:
+    """
+    Миграция: выдать ключ rand словам, у которых его нет (идемпотентно)
+
+    Returns:
+        int: Сколько слов получили ключ
+    """
+    return collection.update_many(BACKFILL_FILTER, BACKFILL_UPDATE).modified_count
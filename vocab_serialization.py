@@ -0,0 +1,33 @@
+"""
+Сериализация слов для vocabulary API
+
+Клиентам нужны только word, translate, transcript и traini. Проекция
+отбрасывает остальные поля (rand, trainDate) на стороне MongoDB и там же
+превращает ObjectId в строку, поэтому ответ собирается без прохода по
+документам в Python. JSON кодируется orjson (с откатом на json).
+
+Модуль без обязательных зависимостей: используется Modal API и бенчмарком.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson есть в образе Modal
+    orjson = None
+
+# ========== ПОЛЯ ОТВЕТА ==========
+PUBLIC_FIELDS = ("word", "translate", "transcript", "traini")
+
+# Для find (MongoDB 4.4+ принимает выражения в проекции) и для $project в aggregate
+PUBLIC_PROJECTION = {
+    "_id": {"$toString": "$_id"},
+    **{field: 1 for field in PUBLIC_FIELDS},
+}
+PUBLIC_PROJECT_STAGE = {"$project": PUBLIC_PROJECTION}
+
+
+def dumps(content) -> bytes:
+    """JSON в байтах: orjson, если установлен"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
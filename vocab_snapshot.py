@@ -0,0 +1,424 @@
+"""
+Снимок словаря в памяти процесса
+
+Документы словаря крошечные, а словарь одного ученика целиком помещается
+в память. Снимок загружает коллекцию один раз в параллельные массивы
+(по колонке на поле), строит хэш-индекс по `word` и битовые множества
+тренированных и удалённых слов, а сроки повторения держит в очереди
+DueQueue. Все чтения (поиск, случайные, не тренированные и подошедшие
+к повторению слова, статистика) — локальные операции без сети.
+
+Синхронизация: change stream (Atlas / replica set) или, если он
+недоступен, опрос изменений по `trainDate` и новых документов по `_id`.
+Записи идут в MongoDB через обёрнутый клиент и сразу применяются к снимку.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+import vocab_queries
+from spaced_repetition import DUE_FIELD, DueQueue
+
+logger = logging.getLogger(__name__)
+
+# ========== SNAPSHOT CONFIGURATION ==========
+# "change_stream" (с откатом на опрос), "poll" или "off" (только локальные записи)
+VOCAB_SNAPSHOT_SYNC = os.getenv("VOCAB_SNAPSHOT_SYNC", "change_stream")
+VOCAB_SNAPSHOT_POLL_INTERVAL = float(os.getenv("VOCAB_SNAPSHOT_POLL_INTERVAL", "30"))
+# Перекрытие окон опроса: покрывает расхождение часов писателей и задержку записи
+VOCAB_SNAPSHOT_POLL_OVERLAP = float(os.getenv("VOCAB_SNAPSHOT_POLL_OVERLAP", "60"))
+
+_FIELDS = ("word", "translate", "transcript", "traini", "trainDate", DUE_FIELD)
+_PROJECTION = {field: 1 for field in _FIELDS}
+
+
+def poll_query(since: datetime) -> Dict:
+    """
+    Фильтр опроса: слова с trainDate новее `since` и документы, созданные после него
+
+    Обе ветки $or идут по индексам (trainDate и _id, см. mongodb_indexes).
+    """
+    return {"$or": [
+        {"trainDate": {"$gt": since}},
+        {"_id": {"$gt": ObjectId.from_datetime(since)}},
+    ]}
+
+
+class Bitset:
+    """Битовое множество позиций на bytearray"""
+
+    __slots__ = ("_bits", "count")
+
+    def __init__(self):
+        self._bits = bytearray()
+        self.count = 0
+
+    def __contains__(self, position: int) -> bool:
+        byte = position >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (position & 7)))
+
+    def add(self, position: int):
+        byte = position >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte - len(self._bits) + 1))
+        mask = 1 << (position & 7)
+        if not self._bits[byte] & mask:
+            self._bits[byte] |= mask
+            self.count += 1
+
+    def discard(self, position: int):
+        byte = position >> 3
+        mask = 1 << (position & 7)
+        if byte < len(self._bits) and self._bits[byte] & mask:
+            self._bits[byte] &= ~mask
+            self.count -= 1
+
+
+class VocabularySnapshot:
+    """Словарь в параллельных массивах с индексом по слову"""
+
+    __slots__ = (
+        "ids", "words", "translates", "transcripts", "train_dates",
+        "_index", "_id_index", "trained", "deleted", "due_queue", "_lock", "_untrained_cursor",
+    )
+
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.words: List[str] = []
+        self.translates: List[str] = []
+        self.transcripts: List[str] = []
+        self.train_dates: List[Optional[datetime]] = []
+        self._index: Dict[str, int] = {}
+        self._id_index: Dict[Any, int] = {}
+        self.trained = Bitset()
+        self.deleted = Bitset()
+        self.due_queue = DueQueue()
+        self._lock = threading.Lock()
+        self._untrained_cursor = 0
+
+    def __len__(self) -> int:
+        return len(self.words) - self.deleted.count
+
+    # ---------- Изменения ----------
+    def apply(self, document: Dict):
+        """Вставить или обновить слово по документу MongoDB"""
+        with self._lock:
+            position = self._id_index.get(document["_id"])
+            if position is None:
+                position = len(self.words)
+                self.ids.append(document["_id"])
+                self.words.append(document.get("word", ""))
+                self.translates.append(document.get("translate", ""))
+                self.transcripts.append(document.get("transcript", ""))
+                self.train_dates.append(document.get("trainDate"))
+                self._id_index[document["_id"]] = position
+            else:
+                old_word = self.words[position]
+                if self._index.get(old_word) == position:
+                    del self._index[old_word]
+                    self.due_queue.remove(old_word)
+                self.words[position] = document.get("word", "")
+                self.translates[position] = document.get("translate", "")
+                self.transcripts[position] = document.get("transcript", "")
+                self.train_dates[position] = document.get("trainDate")
+                self.deleted.discard(position)
+
+            self._index[self.words[position]] = position
+            if document.get("traini"):
+                self.trained.add(position)
+            else:
+                self.trained.discard(position)
+            if document.get(DUE_FIELD) is not None:
+                self.due_queue.push(self.words[position], document[DUE_FIELD])
+            else:
+                self.due_queue.remove(self.words[position])
+
+    def remove(self, document_id: Any):
+        """Удалить слово по _id (позиция остаётся, помечается удалённой)"""
+        with self._lock:
+            position = self._id_index.get(document_id)
+            if position is None or position in self.deleted:
+                return
+            if self._index.get(self.words[position]) == position:
+                del self._index[self.words[position]]
+                self.due_queue.remove(self.words[position])
+            self.deleted.add(position)
+            self.trained.discard(position)
+
+    def mark_trained(self, word: str, train_date: datetime) -> bool:
+        with self._lock:
+            position = self._index.get(word)
+            if position is None:
+                return False
+            self.trained.add(position)
+            self.train_dates[position] = train_date
+            return True
+
+    # ---------- Чтение ----------
+    def _document(self, position: int) -> Dict:
+        return {
+            "_id": self.ids[position],
+            "word": self.words[position],
+            "translate": self.translates[position],
+            "transcript": self.transcripts[position],
+            "traini": position in self.trained,
+            "trainDate": self.train_dates[position],
+        }
+
+    def search_word(self, word: str) -> Optional[Dict]:
+        position = self._index.get(word)
+        return None if position is None else self._document(position)
+
+    def get_random_words(self, count: int = 5, trained: bool = False) -> List[Dict]:
+        size = len(self.words)
+        alive = len(self)
+        wanted = self.trained.count if trained else alive
+        count = min(count, wanted)
+        if not count:
+            return []
+
+        positions = set()
+        # Случайные позиции с отбраковкой: O(k), пока подходящих слов заметная доля
+        attempts = 0
+        while len(positions) < count and attempts < count * 20:
+            attempts += 1
+            position = random.randrange(size)
+            if position in self.deleted or (trained and position not in self.trained):
+                continue
+            positions.add(position)
+
+        if len(positions) < count:
+            candidates = [
+                position for position in range(size)
+                if position not in self.deleted and (not trained or position in self.trained)
+            ]
+            positions = random.sample(candidates, count)
+
+        return [self._document(position) for position in positions]
+
+    def get_due_words(self, count: int = 5) -> List[Dict]:
+        """Слова, которые пора повторить: k элементов кучи, без прохода по словарю"""
+        words = self.due_queue.due(count, datetime.utcnow())
+        return [self._document(self._index[word]) for word in words if word in self._index]
+
+    def get_untrained_words(self, count: int = 10) -> List[Dict]:
+        """Не тренированные слова по кругу: каждый вызов продолжает с места предыдущего"""
+        size = len(self.words)
+        words = []
+        with self._lock:
+            position = self._untrained_cursor
+            for _ in range(size):
+                if len(words) >= count:
+                    break
+                position = (position + 1) % size
+                if position not in self.trained and position not in self.deleted:
+                    words.append(position)
+            self._untrained_cursor = position
+        return [self._document(position) for position in words]
+
+    def get_word_count(self) -> Dict[str, int]:
+        total = len(self)
+        trained = self.trained.count
+        return {"total": total, "trained": trained, "untrained": total - trained}
+
+
+class SnapshotVocabularyClient:
+    """
+    VocabularyClient, читающий из снимка в памяти
+
+    Записи (mark_word_as_trained, mark_words_as_trained, review_words,
+    add_word) идут в MongoDB через обёрнутый клиент и применяются к снимку сразу.
+    """
+
+    def __init__(self, client, sync: str = VOCAB_SNAPSHOT_SYNC, poll_interval: float = VOCAB_SNAPSHOT_POLL_INTERVAL):
+        self.client = client
+        self.sync = sync
+        self.poll_interval = poll_interval
+        self.snapshot = VocabularySnapshot()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sync_thread: Optional[threading.Thread] = None
+        # Начало последней загрузки/опроса (часы процесса, UTC)
+        self._synced_at: Optional[datetime] = None
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    # ---------- Загрузка и синхронизация ----------
+    def load(self) -> bool:
+        """Загрузить коллекцию целиком (один проход курсора) и запустить синхронизацию"""
+        with self._load_lock:
+            if self._loaded:
+                return True
+            if not self.client.is_connected():
+                return False
+            try:
+                started = time.perf_counter()
+                synced_at = datetime.utcnow()
+                snapshot = VocabularySnapshot()
+                for document in self.client.collection.find({}, _PROJECTION):
+                    snapshot.apply(document)
+                self.snapshot = snapshot
+                self._synced_at = synced_at
+                self._loaded = True
+                logger.info(
+                    f"🗂 Vocabulary snapshot loaded: {len(snapshot)} words "
+                    f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+                )
+            except Exception as e:
+                logger.error(f"❌ Failed to load vocabulary snapshot: {e}")
+                return False
+
+        if self.sync != "off" and self._sync_thread is None:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="vocab-snapshot-sync", daemon=True)
+            self._sync_thread.start()
+        return True
+
+    def _sync_loop(self):
+        use_change_stream = self.sync == "change_stream"
+        while not self._stop.is_set():
+            if use_change_stream:
+                try:
+                    self._watch()
+                except OperationFailure as e:
+                    # Standalone сервер без change streams — переходим на опрос
+                    logger.warning(f"⚠️ Change streams unavailable ({e}), polling every {self.poll_interval:.0f}s")
+                    use_change_stream = False
+                except PyMongoError as e:
+                    logger.error(f"❌ Change stream failed: {e}")
+                    self._stop.wait(self.poll_interval)
+            else:
+                self._stop.wait(self.poll_interval)
+                if not self._stop.is_set():
+                    self._poll()
+
+    def _watch(self):
+        """Применять изменения из change stream, пока не попросят остановиться"""
+        with self.client.collection.watch(full_document="updateLookup", max_await_time_ms=1000) as stream:
+            logger.info("👀 Vocabulary snapshot follows change stream")
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                operation = change["operationType"]
+                if operation == "delete":
+                    self.snapshot.remove(change["documentKey"]["_id"])
+                elif change.get("fullDocument") is not None:
+                    self.snapshot.apply(change["fullDocument"])
+                elif operation in ("drop", "rename", "invalidate"):
+                    self._reload()
+                    return
+
+    def _poll(self):
+        """
+        Дельта с прошлого опроса: слова с новым trainDate и новые документы
+
+        Удаления опрос не видит — их применяет только change stream.
+        """
+        try:
+            started = datetime.utcnow()
+            since = self._synced_at - timedelta(seconds=VOCAB_SNAPSHOT_POLL_OVERLAP)
+            changed = 0
+            for document in self.client.collection.find(poll_query(since), _PROJECTION):
+                self.snapshot.apply(document)
+                changed += 1
+            self._synced_at = started
+            if changed:
+                logger.info(f"🔄 Vocabulary snapshot: {changed} change(s) applied")
+        except Exception as e:
+            logger.error(f"❌ Vocabulary snapshot poll failed: {e}")
+
+    def _reload(self):
+        with self._load_lock:
+            self._loaded = False
+        self.load()
+
+    def _ensure_loaded(self) -> bool:
+        return self._loaded or self.load()
+
+    def close(self):
+        """Остановить синхронизацию и закрыть клиент"""
+        self._stop.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join(timeout=2)
+        self.client.close()
+
+    # ---------- API VocabularyClient ----------
+    def is_connected(self) -> bool:
+        return self._loaded or self.client.is_connected()
+
+    def search_word(self, word: str) -> Optional[Dict]:
+        if not self._ensure_loaded():
+            return self.client.search_word(word)
+        return self.snapshot.search_word(word)
+
+    def get_random_words(self, count: int = 5, trained: bool = False) -> List[Dict]:
+        if not self._ensure_loaded():
+            return self.client.get_random_words(count, trained)
+        return self.snapshot.get_random_words(count, trained)
+
+    def get_untrained_words(self, count: int = 10) -> List[Dict]:
+        if not self._ensure_loaded():
+            return self.client.get_untrained_words(count)
+        return self.snapshot.get_untrained_words(count)
+
+    def get_due_words(self, count: int = 5) -> List[Dict]:
+        if not self._ensure_loaded():
+            return self.client.get_due_words(count)
+        return self.snapshot.get_due_words(count)
+
+    def get_word_count(self) -> Dict[str, int]:
+        if not self._ensure_loaded():
+            return self.client.get_word_count()
+        return self.snapshot.get_word_count()
+
+    def mark_word_as_trained(self, word: str) -> bool:
+        result = self.client.mark_word_as_trained(word)
+        if result:
+            self.snapshot.mark_trained(word, datetime.utcnow())
+        return result
+
+    def mark_words_as_trained(self, words: List[str]) -> bool:
+        result = self.client.mark_words_as_trained(words)
+        if result:
+            now = datetime.utcnow()
+            for word in words:
+                self.snapshot.mark_trained(word, now)
+        return result
+
+    def review_words(self, words: List[str], *args, **kwargs) -> bool:
+        result = self.client.review_words(words, *args, **kwargs)
+        if result and self._loaded and words:
+            # Новые сроки считает клиент — перечитываем пачку одним запросом
+            for document in self.client.collection.find(vocab_queries.words_query(words), _PROJECTION):
+                self.snapshot.apply(document)
+        return result
+
+    def add_word(self, word: str, *args, **kwargs) -> bool:
+        result = self.client.add_word(word, *args, **kwargs)
+        if result and self._loaded:
+            document = self.client.collection.find_one(vocab_queries.word_query(word), _PROJECTION)
+            if document:
+                self.snapshot.apply(document)
+        return result
+
+
+# ========== SINGLETON INSTANCE ==========
+_snapshot_client = None
+
+
+def get_snapshot_client() -> SnapshotVocabularyClient:
+    """Получить глобальный instance SnapshotVocabularyClient (загрузка — при первом чтении)"""
+    global _snapshot_client
+    if _snapshot_client is None:
+        from mongodb_client import VocabularyClient
+        _snapshot_client = SnapshotVocabularyClient(VocabularyClient())
+    return _snapshot_client
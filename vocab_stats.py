@@ -0,0 +1,116 @@
+"""
+Счётчики словаря в отдельном документе
+
+Вместо двух count_documents на каждый запрос статистики держим документ
+{_id: <коллекция>, total, trained}, который атомарно ($inc) обновляется
+при добавлении слова и при переходе слова в traini=True. Чтение
+статистики — один поиск по _id. Расхождения (ручные правки базы, сбой
+между записью слова и $inc) исправляет сверка: чтение статистики
+пересчитывает счётчики, если последней сверке больше STATS_RECONCILE_HOURS
+(так сверяются все бэкенды; Modal API дополнительно сверяет по расписанию).
+
+Функции для pymongo используются VocabularyClient и Modal API;
+AsyncVocabularyClient использует фильтры и обновления отсюда же.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import vocab_queries
+
+logger = logging.getLogger(__name__)
+
+# ========== STATS CONFIGURATION ==========
+MONGODB_STATS_COLLECTION = os.getenv("MONGODB_STATS_COLLECTION", "vocab_stats")
+# Как часто пересчитывать счётчики полным подсчётом
+STATS_RECONCILE_HOURS = float(os.getenv("STATS_RECONCILE_HOURS", "6"))
+
+EMPTY_STATS = {"total": 0, "trained": 0, "untrained": 0}
+
+
+def stats_key(collection_name: str) -> Dict:
+    """Фильтр документа счётчиков для коллекции слов"""
+    return {"_id": collection_name}
+
+
+def increment_update(total: int = 0, trained: int = 0) -> Dict:
+    """
+    Атомарное изменение счётчиков (update_one без upsert)
+
+    Пока документа счётчиков нет, изменять нечего: его создаёт полным
+    подсчётом первое чтение статистики (upsert дал бы неполные счётчики).
+    """
+    return {
+        "$inc": {"total": total, "trained": trained},
+        "$set": {"updatedAt": datetime.utcnow()},
+    }
+
+
+def reconcile_update(total: int, trained: int) -> Dict:
+    """Перезапись счётчиков точными значениями"""
+    now = datetime.utcnow()
+    return {"$set": {"total": total, "trained": trained, "updatedAt": now, "reconciledAt": now}}
+
+
+def stats_from_document(document: Optional[Dict]) -> Optional[Dict[str, int]]:
+    """{"total", "trained", "untrained"} из документа счётчиков или None"""
+    if not document:
+        return None
+    total = document.get("total", 0)
+    trained = document.get("trained", 0)
+    return {"total": total, "trained": trained, "untrained": total - trained}
+
+
+def needs_reconcile(document: Optional[Dict], now: Optional[datetime] = None) -> bool:
+    """Нужна ли сверка: документа нет или последняя сверка старше STATS_RECONCILE_HOURS"""
+    if not document:
+        return True
+    reconciled_at = document.get("reconciledAt")
+    if reconciled_at is None:
+        return True
+    now = now or datetime.utcnow()
+    return now - reconciled_at >= timedelta(hours=STATS_RECONCILE_HOURS)
+
+
+def read_stats(collection, stats_collection) -> Dict[str, int]:
+    """
+    Статистика из документа счётчиков (один поиск по _id)
+
+    Документ создаётся и периодически исправляется полным подсчётом (см. needs_reconcile).
+    """
+    document = stats_collection.find_one(stats_key(collection.name))
+    if needs_reconcile(document):
+        return reconcile_stats(collection, stats_collection)
+    return stats_from_document(document)
+
+
+def record_trained(collection, stats_collection, trained: int):
+    """Учесть слова, впервые ставшие traini=True"""
+    if trained:
+        stats_collection.update_one(stats_key(collection.name), increment_update(trained=trained))
+
+
+def reconcile_stats(collection, stats_collection) -> Dict[str, int]:
+    """
+    Пересчитать счётчики полным подсчётом и исправить документ
+
+    Args:
+        collection: Коллекция слов (pymongo)
+        stats_collection: Коллекция счётчиков
+
+    Returns:
+        Dict[str, int]: Точная статистика
+    """
+    total = collection.count_documents({})
+    trained = collection.count_documents(vocab_queries.TRAINED_QUERY)
+
+    previous = stats_from_document(stats_collection.find_one(stats_key(collection.name)))
+    stats_collection.update_one(stats_key(collection.name), reconcile_update(total, trained), upsert=True)
+
+    stats = {"total": total, "trained": trained, "untrained": total - trained}
+    if previous is not None and previous != stats:
+        logger.warning(f"⚠️ Vocabulary stats drift fixed: {previous} → {stats}")
+    else:
+        logger.info(f"📊 Vocabulary stats reconciled: {stats}")
+    return stats
@@ -0,0 +1,270 @@
+"""
+Write-behind буфер для записи в словарь
+
+События сессий (например, "слово отработано") складываются в память без
+ожидания и сбрасываются одной пачкой (bulk_write / один вызов API) по размеру
+или по таймеру. Голосовой цикл никогда не ждёт записи в базу. Вместе с
+пачкой передаётся время каждого события: повторение записывается на момент
+практики, а не сброса. Пока хранилище недоступно, события копятся в буфере
+и сбрасываются, когда оно вернётся; отбрасываются они только при остановке.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# ========== WRITE-BEHIND CONFIGURATION ==========
+VOCAB_WRITE_BATCH_SIZE = int(os.getenv("VOCAB_WRITE_BATCH_SIZE", "50"))
+VOCAB_WRITE_FLUSH_INTERVAL = float(os.getenv("VOCAB_WRITE_FLUSH_INTERVAL", "5"))
+VOCAB_WRITE_MAX_RETRIES = int(os.getenv("VOCAB_WRITE_MAX_RETRIES", "3"))
+VOCAB_WRITE_RETRY_BACKOFF = float(os.getenv("VOCAB_WRITE_RETRY_BACKOFF", "0.5"))
+
+
+class WriteBehindBuffer:
+    """
+    Буфер событий по ключу (слову) с пакетным сбросом
+
+    Несколько событий одного ключа до сброса схлопываются в последнее.
+    Пачки сбрасываются строго по одной (асинхронная запись — по одной
+    на event loop), поэтому записи одного слова попадают в базу в порядке событий.
+    """
+
+    def __init__(
+        self,
+        flush_fnc: Callable[..., Any],
+        max_batch: int = VOCAB_WRITE_BATCH_SIZE,
+        flush_interval: float = VOCAB_WRITE_FLUSH_INTERVAL,
+        max_retries: int = VOCAB_WRITE_MAX_RETRIES,
+        retry_backoff: float = VOCAB_WRITE_RETRY_BACKOFF,
+        is_connected: Optional[Callable[[], bool]] = None,
+    ):
+        """
+        Args:
+            flush_fnc: Функция записи пачки ключей, True при успехе: синхронная
+                (VocabularyClient.review_words) или корутина
+                (AsyncVocabularyClient.review_words). Вызывается как
+                flush_fnc(keys, reviewed_at={key: datetime UTC события})
+            is_connected: Проверка хранилища перед сбросом (False — сброс
+                откладывается); по умолчанию is_connected клиента, чей метод
+                передан в flush_fnc
+        """
+        self.flush_fnc = flush_fnc
+        if is_connected is None:
+            is_connected = getattr(getattr(flush_fnc, "__self__", None), "is_connected", None)
+        self.is_connected = is_connected
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._pending: Dict[Any, float] = {}
+        self._lock = threading.Lock()
+        # Сериализует сбросы из разных loop'ов/потоков
+        self._flush_lock = threading.Lock()
+
+        self._flushers = weakref.WeakKeyDictionary()
+        self._wakeups = weakref.WeakKeyDictionary()
+        self._async_locks = weakref.WeakKeyDictionary()
+
+        self._counters = {"recorded": 0, "flushed": 0, "batches": 0, "retries": 0, "deferred": 0, "dropped": 0}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, key: Any):
+        """Добавить событие (не блокирует и не ходит в сеть)"""
+        with self._lock:
+            # Переставляем ключ в конец: порядок пачки = порядок последних событий
+            self._pending.pop(key, None)
+            self._pending[key] = time.time()
+            self._counters["recorded"] += 1
+            full = len(self._pending) >= self.max_batch
+
+        if full:
+            self._wake()
+
+    def _wake(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        wakeup = self._wakeups.get(loop)
+        if wakeup is not None:
+            wakeup.set()
+
+    def start(self):
+        """Запустить фоновый сброс в текущем event loop (идемпотентно)"""
+        loop = asyncio.get_running_loop()
+        task = self._flushers.get(loop)
+        if task is None or task.done():
+            self._wakeups[loop] = asyncio.Event()
+            self._flushers[loop] = loop.create_task(self._run(self._wakeups[loop]))
+
+    async def _run(self, wakeup: asyncio.Event):
+        while True:
+            try:
+                async with asyncio.timeout(self.flush_interval):
+                    await wakeup.wait()
+            except TimeoutError:
+                pass
+            wakeup.clear()
+            await self.flush()
+
+    async def flush(self, final: bool = False):
+        """
+        Сбросить всё накопленное (синхронная запись выполняется в thread pool)
+
+        Args:
+            final: Сброс при остановке — пишем, даже если хранилище считается
+                недоступным (последняя попытка перед отбрасыванием)
+        """
+        if not final and not self._storage_available():
+            return
+
+        if asyncio.iscoroutinefunction(self.flush_fnc):
+            async with self._get_async_lock():
+                while self._pending:
+                    if not await self._flush_batch_async():
+                        break
+            return
+
+        while self._pending:
+            if not await asyncio.to_thread(self._flush_batch):
+                break
+
+    def _get_async_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock = self._async_locks.get(loop)
+        if lock is None:
+            lock = self._async_locks[loop] = asyncio.Lock()
+        return lock
+
+    def _take_batch(self) -> Dict[Any, float]:
+        with self._lock:
+            keys = list(self._pending)[:self.max_batch]
+            return {key: self._pending.pop(key) for key in keys}
+
+    def _complete(self, batch: Dict[Any, float]):
+        with self._lock:
+            self._counters["flushed"] += len(batch)
+            self._counters["batches"] += 1
+
+    def _reviewed_at(self, batch: Dict[Any, float]) -> Dict[Any, datetime]:
+        # Время событий в формате записей словаря (naive UTC, как datetime.utcnow())
+        return {key: datetime.utcfromtimestamp(ts) for key, ts in batch.items()}
+
+    def _storage_available(self) -> bool:
+        """Хранилище не подключено: сброс откладывается, события остаются в буфере"""
+        if self.is_connected is None:
+            return True
+        try:
+            connected = self.is_connected()
+        except Exception as e:
+            logger.error(f"❌ Write-behind connection check failed: {e}")
+            connected = False
+        if connected:
+            return True
+        with self._lock:
+            self._counters["deferred"] += 1
+            pending = len(self._pending)
+        logger.warning(f"⚠️ Vocabulary storage not connected, write-behind flush of {pending} event(s) deferred")
+        return False
+
+    def _retry_delay(self, attempt: int) -> Optional[float]:
+        """Пауза перед следующей попыткой или None, если попытки кончились"""
+        if attempt >= self.max_retries:
+            return None
+        with self._lock:
+            self._counters["retries"] += 1
+        # Экспоненциальный backoff с jitter
+        return self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _requeue(self, batch: Dict[Any, float]):
+        with self._lock:
+            # Более новые события тех же ключей уже в буфере — их не трогаем,
+            # остальные возвращаем, чтобы попробовать на следующем сбросе
+            requeued = {key: ts for key, ts in batch.items() if key not in self._pending}
+            self._pending = {**requeued, **self._pending}
+        logger.error(f"❌ Write-behind batch of {len(batch)} failed after {self.max_retries} retries, requeued")
+
+    def _flush_batch(self) -> bool:
+        """Записать одну пачку с повторами; False, если пачку записать не удалось"""
+        with self._flush_lock:
+            batch = self._take_batch()
+            if not batch:
+                return True
+
+            reviewed_at = self._reviewed_at(batch)
+            attempt = 0
+            while True:
+                try:
+                    ok = self.flush_fnc(list(batch), reviewed_at=reviewed_at)
+                except Exception as e:
+                    logger.error(f"❌ Write-behind flush failed: {e}")
+                    ok = False
+                if ok:
+                    self._complete(batch)
+                    return True
+
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    self._requeue(batch)
+                    return False
+                time.sleep(delay)
+                attempt += 1
+
+    async def _flush_batch_async(self) -> bool:
+        """То же для асинхронной функции записи (например, AsyncVocabularyClient)"""
+        batch = self._take_batch()
+        if not batch:
+            return True
+
+        reviewed_at = self._reviewed_at(batch)
+        attempt = 0
+        while True:
+            try:
+                ok = await self.flush_fnc(list(batch), reviewed_at=reviewed_at)
+            except Exception as e:
+                logger.error(f"❌ Write-behind flush failed: {e}")
+                ok = False
+            if ok:
+                self._complete(batch)
+                return True
+
+            delay = self._retry_delay(attempt)
+            if delay is None:
+                self._requeue(batch)
+                return False
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stop(self):
+        """Остановить фоновый сброс текущего loop и сбросить остаток (shutdown)"""
+        task = self._flushers.pop(asyncio.get_running_loop(), None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush(final=True)
+        if self._pending:
+            with self._lock:
+                dropped = list(self._pending)
+                self._counters["dropped"] += len(dropped)
+                self._pending.clear()
+            logger.error(f"❌ Write-behind buffer not flushed on shutdown, {len(dropped)} event(s) dropped: {dropped[:20]}")
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики буфера: pending, recorded, flushed, batches, retries, deferred, dropped"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pending"] = len(self._pending)
+        return stats